@@ -1,8 +1,10 @@
 import os
-from typing import Optional
+import threading
+from typing import Iterator, Optional
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 from dotenv import load_dotenv
+from ads.providers.google import CachedGoogleAdsClient
 import logging
 
 load_dotenv()
@@ -15,19 +17,23 @@ class GoogleAdsClientFactory:
     
     _instance = None
     _client = None
+    _lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def get_client(self) -> GoogleAdsClient:
+    def get_client(self) -> CachedGoogleAdsClient:
         """Get or create a Google Ads client."""
         if self._client is None:
-            self._client = self._create_client()
+            # Concurrent sync stages may ask for the client at the same time
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
         return self._client
     
-    def _create_client(self) -> GoogleAdsClient:
+    def _create_client(self) -> CachedGoogleAdsClient:
         """Create a Google Ads client from environment variables."""
         credentials = {
             "developer_token": os.getenv("GOOGLE_ADS_DEVELOPER_TOKEN"),
@@ -43,7 +49,8 @@ class GoogleAdsClientFactory:
             raise ValueError(f"Missing Google Ads credentials: {missing}")
         
         try:
-            client = GoogleAdsClient.load_from_dict(credentials)
+            # Services are reused across queries so they share one gRPC channel
+            client = CachedGoogleAdsClient(GoogleAdsClient.load_from_dict(credentials))
             logger.info("Google Ads client created successfully")
             return client
         except Exception as e:
@@ -60,10 +67,23 @@ class GoogleAdsClientFactory:
     
     def execute_query(self, query: str, customer_id: Optional[str] = None) -> list:
         """Execute a GAQL query and return results."""
+        results = list(self.iter_query(query, customer_id))
+        logger.info(f"Query executed successfully. Returned {len(results)} rows")
+        return results
+    
+    def iter_query(self, query: str, customer_id: Optional[str] = None,
+                   batches: bool = False, client: Optional[CachedGoogleAdsClient] = None) -> Iterator:
+        """
+        Stream a GAQL query, yielding rows as each search_stream batch arrives.
+        
+        Only the batch currently being consumed is held in memory. With
+        batches=True each yielded item is the list of rows from one batch.
+        Pass client to query a connected account with its own credentials.
+        """
         if not customer_id:
             customer_id = self.customer_id
             
-        client = self.get_client()
+        client = client or self.get_client()
         ga_service = client.get_service("GoogleAdsService")
         
         try:
@@ -72,13 +92,15 @@ class GoogleAdsClientFactory:
                 query=query
             )
             
-            results = []
+            row_count = 0
             for batch in response:
-                for row in batch.results:
-                    results.append(row)
+                row_count += len(batch.results)
+                if batches:
+                    yield list(batch.results)
+                else:
+                    yield from batch.results
             
-            logger.info(f"Query executed successfully. Returned {len(results)} rows")
-            return results
+            logger.debug(f"Query stream finished after {row_count} rows")
             
         except GoogleAdsException as ex:
             logger.error(f"Request failed with status {ex.error.code().name}")
@@ -37,6 +37,18 @@ class ProviderManager:
             raise ValueError(f"Unknown platform: {platform}")
         return provider
     
+    @classmethod
+    async def startup(cls):
+        """Open each provider's pooled HTTP client."""
+        for provider in cls._providers.values():
+            await provider.open_http()
+    
+    @classmethod
+    async def shutdown(cls):
+        """Close each provider's pooled HTTP client."""
+        for provider in cls._providers.values():
+            await provider.close_http()
+    
     @classmethod
     def list_platforms(cls) -> list:
         """List all available platform names."""
@@ -3,6 +3,28 @@ from dataclasses import dataclass
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
+import importlib.util
+import os
+import httpx
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); fall back to HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build a pooled AsyncClient configured from PROVIDER_HTTP_* environment variables."""
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("PROVIDER_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("PROVIDER_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("PROVIDER_HTTP_KEEPALIVE_EXPIRY", "30")),
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("PROVIDER_HTTP_TIMEOUT", "30")),
+            connect=float(os.getenv("PROVIDER_HTTP_CONNECT_TIMEOUT", "10")),
+        ),
+    )
 
 
 class ProviderCapability(str, Enum):
@@ -63,6 +85,26 @@ class MutateResult:
 class IProvider(ABC):
     """Base interface for ad platform providers."""
     
+    _http_client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Shared connection pool for this provider's HTTP calls, created on first use outside the app."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = create_http_client()
+        return self._http_client
+    
+    async def open_http(self):
+        """Create the connection pool (called at app startup)."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = create_http_client()
+    
+    async def close_http(self):
+        """Close the connection pool (called at app shutdown)."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
     @property
     @abstractmethod
     def platform_name(self) -> str:
@@ -1,6 +1,13 @@
-from typing import List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlencode
-import httpx
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import time
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 import logging
@@ -16,6 +23,88 @@ from .base import (
 
 logger = logging.getLogger(__name__)
 
+# gRPC deadline for each SDK call; the awaiting coroutine gives up shortly after
+RPC_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_ADS_RPC_TIMEOUT", "60"))
+RPC_TIMEOUT_SLACK_SECONDS = 5
+
+# The Google Ads SDK is synchronous, so its calls run here instead of on the event loop
+SDK_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GOOGLE_ADS_SDK_WORKERS", "8")),
+    thread_name_prefix="google-ads-sdk",
+)
+
+
+class CachedGoogleAdsClient:
+    """
+    GoogleAdsClient wrapper that keeps the services it hands out.
+
+    GoogleAdsClient.get_service opens a new gRPC channel on every call, so
+    reusing the service objects is what lets calls share a channel.
+    """
+    
+    def __init__(self, client: GoogleAdsClient):
+        self._client = client
+        self._services: Dict[Tuple[str, Optional[str]], object] = {}
+        self._lock = threading.Lock()
+    
+    def get_service(self, name: str, version: Optional[str] = None):
+        key = (name, version)
+        service = self._services.get(key)
+        if service is None:
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    kwargs = {"version": version} if version else {}
+                    service = self._client.get_service(name, **kwargs)
+                    self._services[key] = service
+        return service
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class GoogleAdsClientCache:
+    """
+    TTL + LRU cache of Google Ads clients.
+    
+    Keyed by (developer_token, client_id, login_customer_id, token fingerprint),
+    so a refreshed token gets a fresh client and the stale one ages out.
+    """
+    
+    def __init__(self, max_size: int = 64, ttl_seconds: int = 3000):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, Tuple[float, CachedGoogleAdsClient]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(access_token: str, app_cred: OAuthAppCredentials) -> tuple:
+        fingerprint = hashlib.sha256(access_token.encode()).hexdigest()[:16]
+        return (app_cred.developer_token, app_cred.client_id, app_cred.login_customer_id, fingerprint)
+    
+    def get(self, key: tuple) -> Optional[CachedGoogleAdsClient]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, client = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return client
+    
+    def put(self, key: tuple, client: CachedGoogleAdsClient):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, client)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
 class GoogleAdsProvider(IProvider):
     """Google Ads API provider implementation."""
@@ -25,6 +114,12 @@ class GoogleAdsProvider(IProvider):
     OAUTH_REVOKE_URL = "https://oauth2.googleapis.com/revoke"
     OAUTH_SCOPE = "https://www.googleapis.com/auth/adwords"
     
+    def __init__(self):
+        self._clients = GoogleAdsClientCache(
+            max_size=int(os.getenv("GOOGLE_ADS_CLIENT_CACHE_SIZE", "64")),
+            ttl_seconds=int(os.getenv("GOOGLE_ADS_CLIENT_CACHE_TTL", "3000")),
+        )
+    
     @property
     def platform_name(self) -> str:
         return "google_ads"
@@ -79,10 +174,9 @@ class GoogleAdsProvider(IProvider):
         if pkce_verifier:
             data["code_verifier"] = pkce_verifier
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.OAUTH_TOKEN_URL, data=data)
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(self.OAUTH_TOKEN_URL, data=data)
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -104,10 +198,9 @@ class GoogleAdsProvider(IProvider):
             "grant_type": "refresh_token",
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.OAUTH_TOKEN_URL, data=data)
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(self.OAUTH_TOKEN_URL, data=data)
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -124,11 +217,76 @@ class GoogleAdsProvider(IProvider):
     ) -> bool:
         params = {"token": token}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.OAUTH_REVOKE_URL, params=params)
-            return response.status_code == 200
+        response = await self.http.post(self.OAUTH_REVOKE_URL, params=params)
+        return response.status_code == 200
+    
+    def build_client(
+        self,
+        access_token: str,
+        app_cred: OAuthAppCredentials
+    ) -> CachedGoogleAdsClient:
+        """
+        Get a cached Google Ads client for these credentials, building it on a miss.
+        
+        Building a client blocks, so call this off the event loop (sync
+        workers do; async callers go through _get_client).
+        """
+        key = GoogleAdsClientCache.make_key(access_token, app_cred)
+        client = self._clients.get(key)
+        if client is None:
+            client = CachedGoogleAdsClient(self._create_client(access_token, app_cred))
+            self._clients.put(key, client)
+        return client
+    
+    async def _run_sdk(self, fn, *args, **kwargs):
+        """
+        Run a blocking SDK call on the bounded SDK pool.
+        
+        Cancelling or timing out the await releases the caller right away; the
+        worker thread is freed when the call's gRPC deadline expires.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(SDK_EXECUTOR, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, RPC_TIMEOUT_SECONDS + RPC_TIMEOUT_SLACK_SECONDS)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Google Ads call timed out after {RPC_TIMEOUT_SECONDS}s")
+    
+    async def _get_client(
+        self,
+        access_token: str,
+        app_cred: OAuthAppCredentials
+    ) -> CachedGoogleAdsClient:
+        """Get a client without blocking the event loop on a cache miss."""
+        return await self._run_sdk(self.build_client, access_token, app_cred)
+    
+    async def _search(self, client: CachedGoogleAdsClient, customer_id: str, query: str) -> list:
+        """
+        Run a GAQL search off the event loop, paging through all results.
+        
+        Each page is a separate SDK call with its own deadline and timeout, so
+        a long but healthy paginated search never times out as a whole, and a
+        timed-out page stops the paging.
+        """
+        ga_service = client.get_service("GoogleAdsService")
+        pager = await self._run_sdk(
+            ga_service.search, customer_id=customer_id, query=query, timeout=RPC_TIMEOUT_SECONDS
+        )
+        pages = iter(pager.pages)
+        rows = []
+        while True:
+            page = await self._run_sdk(next, pages, None)
+            if page is None:
+                return rows
+            rows.extend(page.results)
+    
+    async def _mutate(self, method, customer_id: str, operations: list):
+        """Run a mutate RPC off the event loop."""
+        return await self._run_sdk(
+            method, customer_id=customer_id, operations=operations, timeout=RPC_TIMEOUT_SECONDS
+        )
     
-    def _build_client(
+    def _create_client(
         self,
         access_token: str,
         app_cred: OAuthAppCredentials
@@ -147,6 +305,34 @@ class GoogleAdsProvider(IProvider):
         
         return GoogleAdsClient.load_from_dict(credentials)
     
+    async def get_account_info(self, access_token: str, app_cred: OAuthAppCredentials) -> dict:
+        """
+        Identify the first Google Ads account the credentials can access.
+        
+        Returns:
+            dict with 'account_id', 'account_name' and 'manager_customer_id'
+        """
+        client = await self._get_client(access_token, app_cred)
+        customer_service = client.get_service("CustomerService")
+        
+        accessible_customers = await self._run_sdk(
+            customer_service.list_accessible_customers, timeout=RPC_TIMEOUT_SECONDS
+        )
+        if accessible_customers.resource_names:
+            customer_id = accessible_customers.resource_names[0].split('/')[-1]
+            
+            query = "SELECT customer.id, customer.descriptive_name FROM customer LIMIT 1"
+            response = await self._search(client, customer_id, query)
+            
+            for row in response:
+                return {
+                    "account_id": str(row.customer.id),
+                    "account_name": row.customer.descriptive_name or f"Account {row.customer.id}",
+                    "manager_customer_id": app_cred.login_customer_id,
+                }
+        
+        raise ValueError("No accessible Google Ads accounts found")
+    
     async def list_campaigns(
         self,
         access_token: str,
@@ -156,8 +342,7 @@ class GoogleAdsProvider(IProvider):
         if not app_cred:
             raise ValueError("app_cred required for Google Ads")
         
-        client = self._build_client(access_token, app_cred)
-        ga_service = client.get_service("GoogleAdsService")
+        client = await self._get_client(access_token, app_cred)
         
         query = """
             SELECT
@@ -173,7 +358,7 @@ class GoogleAdsProvider(IProvider):
         customer_id = account_id.replace("-", "")
         
         try:
-            response = ga_service.search(customer_id=customer_id, query=query)
+            response = await self._search(client, customer_id, query)
             
             campaigns = []
             for row in response:
@@ -204,11 +389,10 @@ class GoogleAdsProvider(IProvider):
         if not app_cred:
             raise ValueError("app_cred required for Google Ads")
         
-        client = self._build_client(access_token, app_cred)
+        client = await self._get_client(access_token, app_cred)
         customer_id = account_id.replace("-", "")
         
         budget_service = client.get_service("CampaignBudgetService")
-        campaign_service = client.get_service("CampaignService")
         
         query = f"""
             SELECT campaign.campaign_budget
@@ -216,8 +400,7 @@ class GoogleAdsProvider(IProvider):
             WHERE campaign.id = {campaign_id}
         """
         
-        ga_service = client.get_service("GoogleAdsService")
-        response = ga_service.search(customer_id=customer_id, query=query)
+        response = await self._search(client, customer_id, query)
         
         budget_resource_name = None
         for row in response:
@@ -243,9 +426,8 @@ class GoogleAdsProvider(IProvider):
         
         try:
             with client.configure().operation_settings(validate_only=validate_only):
-                response = budget_service.mutate_campaign_budgets(
-                    customer_id=customer_id,
-                    operations=[budget_operation]
+                response = await self._mutate(
+                    budget_service.mutate_campaign_budgets, customer_id, [budget_operation]
                 )
             
             return MutateResult(
@@ -276,7 +458,7 @@ class GoogleAdsProvider(IProvider):
         if not app_cred:
             raise ValueError("app_cred required for Google Ads")
         
-        client = self._build_client(access_token, app_cred)
+        client = await self._get_client(access_token, app_cred)
         customer_id = account_id.replace("-", "")
         campaign_service = client.get_service("CampaignService")
         
@@ -291,9 +473,8 @@ class GoogleAdsProvider(IProvider):
         
         try:
             with client.configure().operation_settings(validate_only=validate_only):
-                response = campaign_service.mutate_campaigns(
-                    customer_id=customer_id,
-                    operations=[campaign_operation]
+                response = await self._mutate(
+                    campaign_service.mutate_campaigns, customer_id, [campaign_operation]
                 )
             
             return MutateResult(
@@ -324,7 +505,7 @@ class GoogleAdsProvider(IProvider):
         if not app_cred:
             raise ValueError("app_cred required for Google Ads")
         
-        client = self._build_client(access_token, app_cred)
+        client = await self._get_client(access_token, app_cred)
         customer_id = account_id.replace("-", "")
         ad_group_service = client.get_service("AdGroupService")
         
@@ -339,9 +520,8 @@ class GoogleAdsProvider(IProvider):
         
         try:
             with client.configure().operation_settings(validate_only=validate_only):
-                response = ad_group_service.mutate_ad_groups(
-                    customer_id=customer_id,
-                    operations=[ad_group_operation]
+                response = await self._mutate(
+                    ad_group_service.mutate_ad_groups, customer_id, [ad_group_operation]
                 )
             
             return MutateResult(
@@ -374,7 +554,7 @@ class GoogleAdsProvider(IProvider):
         if not app_cred:
             raise ValueError("app_cred required for Google Ads")
         
-        client = self._build_client(access_token, app_cred)
+        client = await self._get_client(access_token, app_cred)
         customer_id = account_id.replace("-", "")
         campaign_criterion_service = client.get_service("CampaignCriterionService")
         
@@ -401,9 +581,8 @@ class GoogleAdsProvider(IProvider):
         
         try:
             with client.configure().operation_settings(validate_only=validate_only):
-                response = campaign_criterion_service.mutate_campaign_criteria(
-                    customer_id=customer_id,
-                    operations=[campaign_criterion_operation]
+                response = await self._mutate(
+                    campaign_criterion_service.mutate_campaign_criteria, customer_id, [campaign_criterion_operation]
                 )
             
             return MutateResult(
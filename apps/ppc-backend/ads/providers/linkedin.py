@@ -65,14 +65,13 @@ class LinkedInAdsProvider(IProvider):
             "redirect_uri": app_cred.redirect_uri,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.OAUTH_TOKEN_URL,
-                data=data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(
+            self.OAUTH_TOKEN_URL,
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -94,14 +93,13 @@ class LinkedInAdsProvider(IProvider):
             "client_secret": app_cred.client_secret,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.OAUTH_TOKEN_URL,
-                data=data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(
+            self.OAUTH_TOKEN_URL,
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -138,10 +136,9 @@ class LinkedInAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
+            response = await self.http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            data = response.json()
             
             campaigns = []
             for element in data.get("elements", []):
@@ -203,10 +200,9 @@ class LinkedInAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
@@ -259,10 +255,9 @@ class LinkedInAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
@@ -315,10 +310,9 @@ class LinkedInAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
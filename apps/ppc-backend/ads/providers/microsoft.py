@@ -1,6 +1,5 @@
 from typing import List, Optional
 from urllib.parse import urlencode
-import httpx
 import logging
 
 from .base import (
@@ -74,10 +73,9 @@ class MicrosoftAdsProvider(IProvider):
         if pkce_verifier:
             data["code_verifier"] = pkce_verifier
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.OAUTH_TOKEN_URL, data=data)
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(self.OAUTH_TOKEN_URL, data=data)
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -99,10 +97,9 @@ class MicrosoftAdsProvider(IProvider):
             "grant_type": "refresh_token",
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.OAUTH_TOKEN_URL, data=data)
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(self.OAUTH_TOKEN_URL, data=data)
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -66,15 +66,14 @@ class RedditAdsProvider(IProvider):
         
         auth = (app_cred.client_id, app_cred.client_secret)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.OAUTH_TOKEN_URL,
-                data=data,
-                auth=auth,
-                headers={"User-Agent": "Synter-PPC/1.0"}
-            )
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(
+            self.OAUTH_TOKEN_URL,
+            data=data,
+            auth=auth,
+            headers={"User-Agent": "Synter-PPC/1.0"}
+        )
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -96,15 +95,14 @@ class RedditAdsProvider(IProvider):
         
         auth = (app_cred.client_id, app_cred.client_secret)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.OAUTH_TOKEN_URL,
-                data=data,
-                auth=auth,
-                headers={"User-Agent": "Synter-PPC/1.0"}
-            )
-            response.raise_for_status()
-            token_data = response.json()
+        response = await self.http.post(
+            self.OAUTH_TOKEN_URL,
+            data=data,
+            auth=auth,
+            headers={"User-Agent": "Synter-PPC/1.0"}
+        )
+        response.raise_for_status()
+        token_data = response.json()
         
         return TokenBundle(
             access_token=token_data["access_token"],
@@ -126,14 +124,13 @@ class RedditAdsProvider(IProvider):
         
         auth = (app_cred.client_id, app_cred.client_secret)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://www.reddit.com/api/v1/revoke_token",
-                data=data,
-                auth=auth,
-                headers={"User-Agent": "Synter-PPC/1.0"}
-            )
-            return response.status_code == 204
+        response = await self.http.post(
+            "https://www.reddit.com/api/v1/revoke_token",
+            data=data,
+            auth=auth,
+            headers={"User-Agent": "Synter-PPC/1.0"}
+        )
+        return response.status_code == 204
     
     async def list_campaigns(
         self,
@@ -148,10 +145,9 @@ class RedditAdsProvider(IProvider):
         
         url = f"{self.API_BASE_URL}/accounts/{account_id}/campaigns"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        response = await self.http.get(url, headers=headers)
+        response.raise_for_status()
+        data = response.json()
         
         campaigns = []
         for campaign_data in data.get("data", []):
@@ -199,10 +195,9 @@ class RedditAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.patch(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
@@ -250,10 +245,9 @@ class RedditAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.patch(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
@@ -301,10 +295,9 @@ class RedditAdsProvider(IProvider):
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            response = await self.http.patch(url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
             
             return MutateResult(
                 success=True,
@@ -0,0 +1,92 @@
+"""Key daily_metrics by (level, ref_id, date)
+
+Revision ID: 002_daily_metrics_composite_key
+Revises: 001_credential_vault
+Create Date: 2026-10-16
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+revision = '002_daily_metrics_composite_key'
+down_revision = '001_credential_vault'
+branch_labels = None
+depends_on = None
+
+METRIC_COLUMNS = (
+    "impressions, clicks, cost_micros, conversions, conversions_value, "
+    "ctr, cpc_micros, conversion_rate, created_at"
+)
+
+
+def _partitioned() -> bool:
+    return (
+        op.get_bind().dialect.name == 'postgresql'
+        and os.getenv('DAILY_METRICS_PARTITIONING', '').lower() == 'monthly'
+    )
+
+
+def upgrade():
+    op.rename_table('daily_metrics', 'daily_metrics_legacy')
+
+    table_kwargs = {'postgresql_partition_by': 'RANGE (date)'} if _partitioned() else {}
+    op.create_table(
+        'daily_metrics',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('level', sa.String(20), nullable=False),
+        sa.Column('ref_id', sa.String(50), nullable=False),
+        sa.Column('impressions', sa.Integer(), default=0),
+        sa.Column('clicks', sa.Integer(), default=0),
+        sa.Column('cost_micros', sa.BigInteger(), default=0),
+        sa.Column('conversions', sa.Float(), default=0.0),
+        sa.Column('conversions_value', sa.Float(), default=0.0),
+        sa.Column('ctr', sa.Float()),
+        sa.Column('cpc_micros', sa.Integer()),
+        sa.Column('conversion_rate', sa.Float()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('level', 'ref_id', 'date', name='pk_daily_metrics'),
+        **table_kwargs,
+    )
+    op.create_index('ix_daily_metrics_level_date', 'daily_metrics', ['level', 'date'])
+
+    if _partitioned():
+        op.execute('CREATE TABLE daily_metrics_default PARTITION OF daily_metrics DEFAULT')
+
+    # The old per-keyword "aggregated_*" rows carried a fake date and are dropped;
+    # the next sync re-ingests keyword metrics per day.
+    op.execute(
+        f"INSERT INTO daily_metrics (date, level, ref_id, {METRIC_COLUMNS}) "
+        f"SELECT date, level, ref_id, {METRIC_COLUMNS} FROM daily_metrics_legacy "
+        f"WHERE id NOT LIKE 'aggregated_%'"
+    )
+    op.drop_table('daily_metrics_legacy')
+
+
+def downgrade():
+    # ref_id is wider than the legacy String(20): search term ids are 32-character
+    # md5 hashes, and every v2 row must survive the round trip. cost_micros stays
+    # BigInteger for the same reason: a day's spend can pass 2**31 micros ($2,147)
+    op.rename_table('daily_metrics', 'daily_metrics_v2')
+    op.create_table(
+        'daily_metrics',
+        sa.Column('id', sa.String(100), primary_key=True),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('level', sa.String(20), nullable=False),
+        sa.Column('ref_id', sa.String(50), nullable=False),
+        sa.Column('impressions', sa.Integer(), default=0),
+        sa.Column('clicks', sa.Integer(), default=0),
+        sa.Column('cost_micros', sa.BigInteger(), default=0),
+        sa.Column('conversions', sa.Float(), default=0.0),
+        sa.Column('conversions_value', sa.Float(), default=0.0),
+        sa.Column('ctr', sa.Float()),
+        sa.Column('cpc_micros', sa.Integer()),
+        sa.Column('conversion_rate', sa.Float()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP')),
+    )
+    op.execute(
+        f"INSERT INTO daily_metrics (id, date, level, ref_id, {METRIC_COLUMNS}) "
+        f"SELECT date || '_' || level || '_' || ref_id, date, level, ref_id, {METRIC_COLUMNS} "
+        f"FROM daily_metrics_v2"
+    )
+    op.drop_table('daily_metrics_v2')
@@ -0,0 +1,30 @@
+"""Record the lexicon version each ICP score was computed with
+
+Revision ID: 003_icp_lexicon_version
+Revises: 002_daily_metrics_composite_key
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003_icp_lexicon_version'
+down_revision = '002_daily_metrics_composite_key'
+branch_labels = None
+depends_on = None
+
+SCORED_TABLES = ('keywords', 'search_terms')
+
+
+def upgrade():
+    # Existing scores keep a NULL version and are all redone by the next re-score
+    for table in SCORED_TABLES:
+        op.add_column(table, sa.Column('icp_lexicon_version', sa.String(64), nullable=True))
+        op.create_index(f'ix_{table}_icp_lexicon_version', table, ['icp_lexicon_version'])
+
+
+def downgrade():
+    for table in SCORED_TABLES:
+        op.drop_index(f'ix_{table}_icp_lexicon_version', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('icp_lexicon_version')
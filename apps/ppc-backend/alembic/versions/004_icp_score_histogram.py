@@ -0,0 +1,31 @@
+"""Index unscored keywords and search terms for the ICP score histogram
+
+Revision ID: 004_icp_score_histogram
+Revises: 003_icp_lexicon_version
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '004_icp_score_histogram'
+down_revision = '003_icp_lexicon_version'
+branch_labels = None
+depends_on = None
+
+SCORED_TABLES = ('keywords', 'search_terms')
+
+
+def upgrade():
+    # icp_score_histogram itself is created by init_db and filled on first use
+    for table in SCORED_TABLES:
+        op.create_index(
+            f'ix_{table}_unscored', table, ['id'],
+            postgresql_where=sa.text('icp_score IS NULL'),
+            sqlite_where=sa.text('icp_score IS NULL'),
+        )
+
+
+def downgrade():
+    for table in SCORED_TABLES:
+        op.drop_index(f'ix_{table}_unscored', table_name=table)
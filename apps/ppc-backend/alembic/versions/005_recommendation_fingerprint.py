@@ -0,0 +1,26 @@
+"""Key recommendations by a deterministic fingerprint
+
+Revision ID: 005_recommendation_fingerprint
+Revises: 004_icp_score_histogram
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '005_recommendation_fingerprint'
+down_revision = '004_icp_score_histogram'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep a NULL fingerprint, which the unique index allows any number of
+    op.add_column('recommendations', sa.Column('fingerprint', sa.String(64), nullable=True))
+    op.create_index('ix_recommendations_fingerprint', 'recommendations', ['fingerprint'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_recommendations_fingerprint', table_name='recommendations')
+    with op.batch_alter_table('recommendations') as batch_op:
+        batch_op.drop_column('fingerprint')
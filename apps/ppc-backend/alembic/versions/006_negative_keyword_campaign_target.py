@@ -0,0 +1,26 @@
+"""Drop negative keyword proposals that targeted ad groups
+
+Revision ID: 006_negative_keyword_campaign_target
+Revises: 005_recommendation_fingerprint
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+revision = '006_negative_keyword_campaign_target'
+down_revision = '005_recommendation_fingerprint'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Open proposals carried the ad group id as their campaign target (and in
+    # their fingerprint); the next generation run re-proposes them per campaign.
+    # Applied, dismissed and dry-run rows are history and stay.
+    op.execute(
+        "DELETE FROM recommendations WHERE type = 'negative_keyword' AND status = 'proposed'"
+    )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,36 @@
+"""Lease background jobs to the process running them
+
+Revision ID: 007_job_leases
+Revises: 006_negative_keyword_campaign_target
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007_job_leases'
+down_revision = '006_negative_keyword_campaign_target'
+branch_labels = None
+depends_on = None
+
+JOB_TABLES = ('sync_jobs', 'score_jobs')
+
+
+def upgrade():
+    # Job tables are created by init_db; ones it hasn't created yet get the columns then
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    for table in JOB_TABLES:
+        if table not in tables:
+            continue
+        op.add_column(table, sa.Column('lease_owner', sa.String(100), nullable=True))
+        op.add_column(table, sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    for table in JOB_TABLES:
+        if table not in tables:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('heartbeat_at')
+            batch_op.drop_column('lease_owner')
@@ -1,8 +1,9 @@
 import os
-from sqlalchemy import create_engine
+from datetime import date
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
-from models import Base
+from models import Base, DAILY_METRICS_PARTITIONED
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,6 +24,37 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def init_db():
     """Initialize the database by creating all tables."""
     Base.metadata.create_all(bind=engine)
+    ensure_daily_metric_partitions()
+
+
+def _add_months(month_start: date, months: int) -> date:
+    """Shift the first day of a month by a number of months."""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_daily_metric_partitions(months_back: int = 3, months_ahead: int = 3):
+    """
+    Create monthly daily_metrics partitions around the current month.
+
+    Only applies to Postgres with DAILY_METRICS_PARTITIONING=monthly. Dates
+    outside the managed range land in a DEFAULT partition.
+    """
+    if not DAILY_METRICS_PARTITIONED or engine.dialect.name != "postgresql":
+        return
+
+    current = date.today().replace(day=1)
+    with engine.begin() as conn:
+        for offset in range(-months_back, months_ahead + 1):
+            start = _add_months(current, offset)
+            end = _add_months(start, 1)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS daily_metrics_{start:%Y_%m} "
+                f"PARTITION OF daily_metrics FOR VALUES FROM ('{start}') TO ('{end}')"
+            ))
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS daily_metrics_default PARTITION OF daily_metrics DEFAULT"
+        ))
 
 
 def get_db():
@@ -7,6 +7,7 @@ from contextlib import asynccontextmanager
 from routers import sync, score, recommend, apply, audit, auth, integrations, oauth_callbacks, scheduler_status
 from database import engine, init_db
 from scheduler import start_scheduler, stop_scheduler
+from ads.providers import ProviderManager
 
 
 security = HTTPBasic()
@@ -31,11 +32,13 @@ def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database and start scheduler on startup."""
+    """Initialize database, provider connection pools and scheduler on startup."""
     init_db()
+    await ProviderManager.startup()
     await start_scheduler()
     yield
     await stop_scheduler()
+    await ProviderManager.shutdown()
 
 
 app = FastAPI(
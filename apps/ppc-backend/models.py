@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Boolean, Text, ForeignKey
+import os
+from sqlalchemy import Column, String, Integer, BigInteger, Float, Date, DateTime, Boolean, Text, ForeignKey, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -6,6 +7,9 @@ from datetime import datetime, date
 
 Base = declarative_base()
 
+# Postgres only: range-partition daily_metrics by month (see database.ensure_daily_metric_partitions)
+DAILY_METRICS_PARTITIONED = os.getenv("DAILY_METRICS_PARTITIONING", "").lower() == "monthly"
+
 
 class Campaign(Base):
     __tablename__ = "campaigns"
@@ -20,7 +24,10 @@ class Campaign(Base):
 
     # Relationships
     ad_groups = relationship("AdGroup", back_populates="campaign")
-    daily_metrics = relationship("DailyMetric", back_populates="campaign")
+    daily_metrics = relationship(
+        "DailyMetric", viewonly=True,
+        primaryjoin="and_(Campaign.id == foreign(DailyMetric.ref_id), DailyMetric.level == 'campaign')"
+    )
 
 
 class AdGroup(Base):
@@ -53,6 +60,7 @@ class Keyword(Base):
     icp_score = Column(Integer)  # 0-100
     icp_rationale = Column(Text)
     icp_confidence = Column(Float)  # 0-1
+    icp_lexicon_version = Column(String(64), index=True)  # Lexicons and matcher the score was computed with; NULL = unversioned
     
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -60,6 +68,11 @@ class Keyword(Base):
     # Relationships
     ad_group = relationship("AdGroup", back_populates="keywords")
 
+    __table_args__ = (
+        # Only unscored rows; serves scoring reads and unscored counts
+        Index("ix_keywords_unscored", "id", postgresql_where=icp_score.is_(None), sqlite_where=icp_score.is_(None)),
+    )
+
 
 class SearchTerm(Base):
     __tablename__ = "search_terms"
@@ -74,6 +87,7 @@ class SearchTerm(Base):
     icp_score = Column(Integer)  # 0-100
     icp_rationale = Column(Text)
     icp_confidence = Column(Float)  # 0-1
+    icp_lexicon_version = Column(String(64), index=True)  # Lexicons and matcher the score was computed with; NULL = unversioned
     
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -81,19 +95,30 @@ class SearchTerm(Base):
     # Relationships
     ad_group = relationship("AdGroup", back_populates="search_terms")
 
+    __table_args__ = (
+        # Only unscored rows; serves scoring reads and unscored counts
+        Index("ix_search_terms_unscored", "id", postgresql_where=icp_score.is_(None), sqlite_where=icp_score.is_(None)),
+    )
+
 
 class DailyMetric(Base):
     __tablename__ = "daily_metrics"
+    __table_args__ = (
+        # (level, ref_id, date) serves per-entity date-window scans directly
+        PrimaryKeyConstraint("level", "ref_id", "date", name="pk_daily_metrics"),
+        # Account-wide windows, e.g. "all keyword rows in the last 30 days"
+        Index("ix_daily_metrics_level_date", "level", "date"),
+        {"postgresql_partition_by": "RANGE (date)"} if DAILY_METRICS_PARTITIONED else {},
+    )
 
-    id = Column(String(100), primary_key=True)  # date_level_ref_id composite key
     date = Column(Date, nullable=False)
     level = Column(String(20), nullable=False)  # campaign, ad_group, keyword, search_term
-    ref_id = Column(String(20), nullable=False)  # ID of the entity being measured
+    ref_id = Column(String(50), nullable=False)  # ID of the entity being measured
     
     # Core metrics
     impressions = Column(Integer, default=0)
     clicks = Column(Integer, default=0)
-    cost_micros = Column(Integer, default=0)
+    cost_micros = Column(BigInteger, default=0)
     conversions = Column(Float, default=0.0)
     conversions_value = Column(Float, default=0.0)
     
@@ -105,8 +130,10 @@ class DailyMetric(Base):
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
-    campaign = relationship("Campaign", back_populates="daily_metrics", 
-                          foreign_keys=[ref_id], primaryjoin="and_(DailyMetric.ref_id==Campaign.id, DailyMetric.level=='campaign')")
+    campaign = relationship(
+        "Campaign", viewonly=True,
+        primaryjoin="and_(foreign(DailyMetric.ref_id) == Campaign.id, DailyMetric.level == 'campaign')"
+    )
 
 
 class Recommendation(Base):
@@ -126,6 +153,9 @@ class Recommendation(Base):
     # Status tracking
     status = Column(String(20), default="proposed")  # proposed, dry_run_ok, applied, dismissed
     
+    # Hash of (type, target, rule key); regenerating the same recommendation updates it in place
+    fingerprint = Column(String(64), unique=True, index=True)
+    
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -157,3 +187,106 @@ class OAuthToken(Base):
     token_expires_at = Column(DateTime)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class SyncState(Base):
+    """High-water mark of the last successful sync per account and report."""
+    __tablename__ = "sync_state"
+
+    customer_id = Column(String(20), primary_key=True)
+    report_type = Column(String(50), primary_key=True)  # campaigns, keywords, search_terms
+    last_synced_date = Column(Date, nullable=False)  # Last date fully ingested
+    rows_ingested = Column(Integer, default=0)  # Rows processed by the last run
+    last_run_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class SyncJob(Base):
+    """Background sync run with progress and per-stage resume checkpoints."""
+    __tablename__ = "sync_jobs"
+
+    id = Column(String(36), primary_key=True)
+    customer_id = Column(String(20), nullable=False)
+    stages_json = Column(Text, nullable=False)  # {"campaigns": 30, ...} stage -> days
+    full_refresh = Column(Boolean, default=False)
+    
+    status = Column(String(20), default="queued")  # queued, running, succeeded, failed
+    current_stage = Column(String(50))
+    rows_processed = Column(Integer, default=0)
+    rows_expected = Column(Integer)  # From the previous run of the same stages
+    checkpoint_json = Column(Text)  # {stage: {"through": date, "rows": n}} per committed slice
+    result_json = Column(Text)
+    error_message = Column(Text)
+    lease_owner = Column(String(100))  # Process running the job (services.job_lease)
+    heartbeat_at = Column(DateTime)  # Owner's last progress; stale leases are taken over
+    
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class ScoreJob(Base):
+    """Background ICP scoring run over every unscored row, resumable from its keyset cursor."""
+    __tablename__ = "score_jobs"
+
+    id = Column(String(36), primary_key=True)
+    level = Column(String(20), nullable=False)  # keyword, term, rescore (a lexicon publish)
+    tenant = Column(String(50), default="default")
+    lexicon_version = Column(String(64), nullable=False)  # Pinned at creation so resumes score alike
+    metrics_days = Column(Integer, default=30)
+    
+    status = Column(String(20), default="queued")  # queued, running, succeeded, failed, resuming
+    last_id = Column(String(50))  # Highest id committed; the next chunk starts after it
+    rows_processed = Column(Integer, default=0)
+    rows_expected = Column(Integer)  # Unscored rows when the job was created
+    error_message = Column(Text)
+    lease_owner = Column(String(100))  # Process running the job (services.job_lease)
+    heartbeat_at = Column(DateTime)  # Owner's last progress; stale leases are taken over
+    
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class DirtyEntity(Base):
+    """Entity changed by a sync or score write since recommendations were last regenerated for it."""
+    __tablename__ = "dirty_entities"
+
+    level = Column(String(20), primary_key=True)  # campaign, keyword, search_term
+    ref_id = Column(String(50), primary_key=True)  # Entity id, or "*" for every entity of the level
+    marked_at = Column(DateTime, nullable=False)  # Latest mark; regeneration only clears the mark it read
+
+
+class IcpScoreHistogram(Base):
+    """Row count per level and ICP score (-1 = unscored), maintained as scores are written."""
+    __tablename__ = "icp_score_histogram"
+
+    level = Column(String(20), primary_key=True)  # keyword, term
+    score = Column(Integer, primary_key=True)  # 0-100, or -1 for unscored
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class IcpScoreCache(Base):
+    """Text-dependent ICP score parts, shared by every keyword and search term with the same text."""
+    __tablename__ = "icp_score_cache"
+
+    text_hash = Column(String(64), primary_key=True)  # sha256 of text.lower().strip()
+    lexicon_version = Column(String(64), primary_key=True)
+    icp_score = Column(Integer, nullable=False)
+    icp_rationale = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+
+
+class IcpLexiconVersion(Base):
+    """A published version of the ICP term lists; one active version per tenant."""
+    __tablename__ = "icp_lexicons"
+
+    tenant = Column(String(50), primary_key=True, default="default")
+    version = Column(String(64), primary_key=True)  # services.icp_service.lexicon_version of the terms
+    brand_terms_json = Column(Text, nullable=False)
+    include_terms_json = Column(Text, nullable=False)
+    exclude_terms_json = Column(Text, nullable=False)
+    is_active = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=func.now())
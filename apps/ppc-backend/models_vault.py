@@ -55,7 +55,7 @@ class OAuthAppCredential(Base):
     
     is_active = Column(Boolean, default=True)
     rotation_group = Column(String(100))
-    metadata = Column(JSON)
+    extra_metadata = Column("metadata", JSON)
     
     created_by = Column(String(100))
     created_at = Column(DateTime, default=func.now())
@@ -125,7 +125,7 @@ class CredentialAccessAudit(Base):
     resource_type = Column(String(50), nullable=False)
     resource_id = Column(String(36), nullable=False)
     success = Column(Boolean, nullable=False)
-    metadata = Column(JSON)
+    extra_metadata = Column("metadata", JSON)
     ip_address = Column(String(64))
     user_agent = Column(String(500))
     created_at = Column(DateTime, default=func.now())
@@ -412,7 +412,7 @@ def dry_run_all_recommendations(
                 
                 if rec.type == "negative_keyword":
                     request = NegativeKeywordRequest(
-                        campaign_id=details.get("ad_group_id"),  # This should be campaign_id in practice
+                        campaign_id=rec.target_id,
                         keyword_text=details.get("search_term"),
                         validate_only=True,
                         reason="Bulk dry-run",
@@ -31,97 +31,62 @@ async def _get_account_info(platform: str, access_token: str, app_cred: OAuthApp
     provider = ProviderManager.get_provider(platform)
     
     if platform == "google_ads":
-        from google.ads.googleads.client import GoogleAdsClient
-        
-        credentials = {
-            "developer_token": app_cred.developer_token,
-            "client_id": app_cred.client_id,
-            "client_secret": app_cred.client_secret,
-            "refresh_token": access_token,
-            "use_proto_plus": True,
-        }
-        
-        if app_cred.login_customer_id:
-            credentials["login_customer_id"] = app_cred.login_customer_id
-        
-        client = GoogleAdsClient.load_from_dict(credentials)
-        customer_service = client.get_service("CustomerService")
-        
-        accessible_customers = customer_service.list_accessible_customers()
-        if accessible_customers.resource_names:
-            customer_id = accessible_customers.resource_names[0].split('/')[-1]
-            
-            ga_service = client.get_service("GoogleAdsService")
-            query = "SELECT customer.id, customer.descriptive_name FROM customer LIMIT 1"
-            response = ga_service.search(customer_id=customer_id, query=query)
-            
-            for row in response:
-                return {
-                    "account_id": str(row.customer.id),
-                    "account_name": row.customer.descriptive_name or f"Account {row.customer.id}",
-                    "manager_customer_id": app_cred.login_customer_id,
-                }
-        
-        raise ValueError("No accessible Google Ads accounts found")
+        return await provider.get_account_info(access_token, app_cred)
     
     elif platform == "reddit_ads":
-        import httpx
-        
         headers = {
             "Authorization": f"Bearer {access_token}",
             "User-Agent": "Synter-PPC/1.0"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://oauth.reddit.com/api/v1/me", headers=headers)
-            response.raise_for_status()
-            user_data = response.json()
-            
-            accounts_response = await client.get(
-                "https://ads-api.reddit.com/api/v2.0/accounts",
-                headers=headers
-            )
-            accounts_response.raise_for_status()
-            accounts = accounts_response.json()
-            
-            if accounts.get("data") and len(accounts["data"]) > 0:
-                account = accounts["data"][0]
-                return {
-                    "account_id": account["id"],
-                    "account_name": account.get("name", f"Reddit Account {account['id']}"),
-                }
-            
-            raise ValueError("No Reddit Ads accounts found")
+        client = ProviderManager.get_provider(platform).http
+        response = await client.get("https://oauth.reddit.com/api/v1/me", headers=headers)
+        response.raise_for_status()
+        user_data = response.json()
+        
+        accounts_response = await client.get(
+            "https://ads-api.reddit.com/api/v2.0/accounts",
+            headers=headers
+        )
+        accounts_response.raise_for_status()
+        accounts = accounts_response.json()
+        
+        if accounts.get("data") and len(accounts["data"]) > 0:
+            account = accounts["data"][0]
+            return {
+                "account_id": account["id"],
+                "account_name": account.get("name", f"Reddit Account {account['id']}"),
+            }
+        
+        raise ValueError("No Reddit Ads accounts found")
     
     elif platform == "linkedin_ads":
-        import httpx
-        
         headers = {
             "Authorization": f"Bearer {access_token}",
             "LinkedIn-Version": "202401",
             "X-Restli-Protocol-Version": "2.0.0"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.linkedin.com/rest/adAccounts?q=search&search.type.values[0]=BUSINESS",
-                headers=headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("elements") and len(data["elements"]) > 0:
-                account = data["elements"][0]
-                account_id = account["id"]
-                account_name = account.get("name", f"LinkedIn Account {account_id}")
-                
-                return {
-                    "account_id": account_id,
-                    "account_name": account_name,
-                    "organization_id": account.get("reference"),
-                }
+        client = ProviderManager.get_provider(platform).http
+        response = await client.get(
+            "https://api.linkedin.com/rest/adAccounts?q=search&search.type.values[0]=BUSINESS",
+            headers=headers
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        if data.get("elements") and len(data["elements"]) > 0:
+            account = data["elements"][0]
+            account_id = account["id"]
+            account_name = account.get("name", f"LinkedIn Account {account_id}")
             
-            raise ValueError("No LinkedIn Ads accounts found")
+            return {
+                "account_id": account_id,
+                "account_name": account_name,
+                "organization_id": account.get("reference"),
+            }
+        
+        raise ValueError("No LinkedIn Ads accounts found")
     
     elif platform == "microsoft_ads":
         return {
@@ -1,35 +1,86 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, or_
 from database import get_db
-from models import Recommendation, Keyword, SearchTerm, DailyMetric, Campaign, AdGroup
-from datetime import datetime, date, timedelta
+from models import Recommendation
+from services.account_snapshot import AccountSnapshot, build_snapshot, dirty_scope
+from services.bulk_upsert import UpsertBuffer
+from services.dirty_set_service import DirtySetService
+from datetime import datetime
+import hashlib
 import json
 import uuid
 import logging
-from typing import List, Dict, Any
+from typing import List
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Columns regeneration refreshes on an existing proposal
+REFRESHED_COLUMNS = ["details_json", "projected_impact", "risk", "priority"]
+
+# Fingerprints per IN (...) lookup of existing recommendations
+LOOKUP_CHUNK_SIZE = 500
+
 
 def generate_recommendation_id() -> str:
     """Generate a unique recommendation ID."""
     return str(uuid.uuid4())
 
 
-def calculate_percentile(values: List[float], percentile: int) -> float:
-    """Calculate percentile of a list of values."""
-    if not values:
-        return 0.0
-    sorted_values = sorted(values)
-    index = (percentile / 100) * (len(sorted_values) - 1)
-    if index.is_integer():
-        return sorted_values[int(index)]
-    else:
-        lower = sorted_values[int(index)]
-        upper = sorted_values[int(index) + 1]
-        return lower + (upper - lower) * (index - int(index))
+def recommendation_fingerprint(rec_type: str, target_level: str, target_id: str, rule_key: str = "") -> str:
+    """Deterministic identity of a recommendation: its type, target and the rule subject that fired."""
+    return hashlib.sha256(json.dumps([rec_type, target_level, target_id, rule_key]).encode()).hexdigest()
+
+
+def save_recommendations(db: Session, recommendations: List[Recommendation]) -> int:
+    """
+    Upsert generated recommendations by fingerprint (not committed).
+
+    New fingerprints are inserted as proposals. Existing proposals get their
+    details, impact, risk and priority refreshed, and are only written when
+    one of those changed; applied, dismissed and dry-run rows are left alone.
+
+    Returns:
+        Number of recommendations that didn't exist yet
+    """
+    if not recommendations:
+        return 0
+
+    fingerprints = list({rec.fingerprint for rec in recommendations})
+    existing = set()
+    for start in range(0, len(fingerprints), LOOKUP_CHUNK_SIZE):
+        existing.update(fingerprint for (fingerprint,) in db.query(Recommendation.fingerprint).filter(
+            Recommendation.fingerprint.in_(fingerprints[start:start + LOOKUP_CHUNK_SIZE])
+        ))
+
+    upserts = UpsertBuffer(db).register(
+        Recommendation,
+        update_columns=REFRESHED_COLUMNS,
+        key_columns=["fingerprint"],
+        update_where=lambda current, incoming: and_(
+            current.status == "proposed",
+            or_(*[current[column].is_distinct_from(incoming[column]) for column in REFRESHED_COLUMNS])
+        ),
+    )
+    for rec in recommendations:
+        upserts.add(Recommendation, {
+            "id": rec.id,
+            "type": rec.type,
+            "target_level": rec.target_level,
+            "target_id": rec.target_id,
+            "details_json": rec.details_json,
+            "projected_impact": float(rec.projected_impact),
+            "risk": float(rec.risk),
+            "priority": rec.priority,
+            "status": "proposed",
+            "fingerprint": rec.fingerprint,
+        })
+    upserts.flush()
+
+    return len(fingerprints) - len(existing)
 
 
 @router.get("/")
@@ -96,47 +147,64 @@ def get_recommendations(
 def generate_recommendations(
     types: str = Query(default="neg,pause,budget", description="Comma-separated list: neg,pause,budget"),
     force_refresh: bool = Query(default=False, description="Clear existing and regenerate"),
+    incremental: bool = Query(default=False, description="Only re-evaluate entities changed since the last run"),
     db: Session = Depends(get_db)
 ):
     """Generate new recommendations based on current data."""
     try:
         type_list = [t.strip() for t in types.split(",")]
+        incremental = incremental and not force_refresh
+        
+        # Marks read now are cleared after this run; ones renewed meanwhile stay dirty
+        marks = DirtySetService.pending(db)
+        if incremental and not marks:
+            return {
+                "status": "success",
+                "recommendations_created": 0,
+                "recommendations_generated": 0,
+                "types_processed": type_list,
+                "force_refresh": force_refresh,
+                "incremental": True,
+                "entities_evaluated": 0
+            }
         
         if force_refresh:
             # Clear existing proposed recommendations
             db.query(Recommendation).filter(Recommendation.status == "proposed").delete()
             db.commit()
         
-        recommendations_created = 0
+        recommendations = []
+        
+        # Every generator reads the same columnar snapshot, limited to dirty entities when incremental
+        scope = dirty_scope(db, DirtySetService.by_level(marks)) if incremental else None
+        snapshot = build_snapshot(db, scope=scope)
         
         # 1. NEGATIVE KEYWORD recommendations
         if "neg" in type_list:
-            negative_recs = _generate_negative_keyword_recommendations(db)
-            recommendations_created += len(negative_recs)
-            for rec in negative_recs:
-                db.add(rec)
+            recommendations.extend(_generate_negative_keyword_recommendations(snapshot))
         
         # 2. PAUSE KEYWORD recommendations  
         if "pause" in type_list:
-            pause_recs = _generate_pause_keyword_recommendations(db)
-            recommendations_created += len(pause_recs)
-            for rec in pause_recs:
-                db.add(rec)
+            recommendations.extend(_generate_pause_keyword_recommendations(snapshot))
         
         # 3. BUDGET SHIFT recommendations
         if "budget" in type_list:
-            budget_recs = _generate_budget_shift_recommendations(db)
-            recommendations_created += len(budget_recs)
-            for rec in budget_recs:
-                db.add(rec)
+            recommendations.extend(_generate_budget_shift_recommendations(snapshot))
         
+        # Regenerated recommendations update their existing rows instead of piling up
+        recommendations_created = save_recommendations(db, recommendations)
+        if all(t in type_list for t in ("neg", "pause", "budget")):
+            DirtySetService.clear(db, marks)
         db.commit()
         
         return {
             "status": "success",
             "recommendations_created": recommendations_created,
+            "recommendations_generated": len(recommendations),
             "types_processed": type_list,
-            "force_refresh": force_refresh
+            "force_refresh": force_refresh,
+            "incremental": snapshot.scoped,
+            "entities_evaluated": len(snapshot.campaigns) + len(snapshot.keywords) + len(snapshot.search_terms)
         }
         
     except Exception as e:
@@ -144,218 +212,188 @@ def generate_recommendations(
         raise HTTPException(status_code=500, detail=f"Failed to generate recommendations: {str(e)}")
 
 
-def _generate_negative_keyword_recommendations(db: Session) -> List[Recommendation]:
+def _generate_negative_keyword_recommendations(snapshot: AccountSnapshot) -> List[Recommendation]:
     """Generate negative keyword recommendations based on search terms."""
     recommendations = []
+    terms = snapshot.search_terms
+    campaign_ids = snapshot.search_term_campaign_ids()
     
-    # Find search terms with low ICP score, high spend, no conversions
-    cutoff_date = date.today() - timedelta(days=7)
-    
-    # This is a simplified query - in reality you'd need to aggregate metrics by search term
-    problematic_terms = db.query(SearchTerm).filter(
-        and_(
-            SearchTerm.icp_score < 40,
-            SearchTerm.icp_score.isnot(None),
-            SearchTerm.last_seen >= cutoff_date
-        )
-    ).limit(20).all()  # Limit to avoid too many recommendations
+    # Search terms with low ICP score, high spend, no conversions over the last 7 days
+    cost = terms["cost_micros_7d"]
+    problematic = (
+        (terms["icp_score"] < 40)  # NaN (unscored) compares False
+        & (cost >= 300 * 1_000_000)  # Meet the spend threshold
+        & (terms["conversions_7d"] == 0)
+        & np.not_equal(campaign_ids, None)  # Negatives are added to the term's campaign
+    )
+    rows = np.flatnonzero(problematic)
+    rows = rows[np.argsort(-cost[rows], kind="stable")]
     
-    for term in problematic_terms:
-        # In a real implementation, you'd calculate actual spend for this term
-        # For MVP, we'll simulate based on ICP score
-        estimated_spend = max(100, (40 - term.icp_score) * 20)  # Lower score = higher simulated spend
+    # Negatives are added per campaign; a term in several of its ad groups is
+    # proposed once, from the ad group spending the most
+    proposed = set()
+    for row in rows.tolist():
+        campaign_id = campaign_ids[row]
+        if (campaign_id, terms["text"][row]) in proposed:
+            continue
+        proposed.add((campaign_id, terms["text"][row]))
+        
+        icp_score = int(terms["icp_score"][row])
+        confidence = terms["icp_confidence"][row]
+        spend_7d = cost[row] / 1_000_000
+        details = {
+            "search_term": terms["text"][row],
+            "icp_score": icp_score,
+            "rationale": terms["icp_rationale"][row],
+            "estimated_spend_7d": spend_7d,
+            "campaign_id": campaign_id,
+            "ad_group_id": terms["ad_group_id"][row],
+            "match_type": "EXACT",
+            "impact_explanation": f"Prevent spend on low-fit term (ICP: {icp_score})"
+        }
         
-        if estimated_spend >= 300:  # Meet the spend threshold
-            details = {
-                "search_term": term.text,
-                "icp_score": term.icp_score,
-                "rationale": term.icp_rationale,
-                "estimated_spend_7d": estimated_spend,
-                "ad_group_id": term.ad_group_id,
-                "match_type": "EXACT",
-                "impact_explanation": f"Prevent spend on low-fit term (ICP: {term.icp_score})"
-            }
-            
-            recommendation = Recommendation(
-                id=generate_recommendation_id(),
-                type="negative_keyword",
-                target_level="campaign",
-                target_id=term.ad_group_id,  # We'd need to get campaign_id in practice
-                details_json=json.dumps(details),
-                projected_impact=estimated_spend * 0.8,  # Assume 80% of spend would be saved
-                risk=1 - (term.icp_confidence or 0.5),
-                priority="high" if term.icp_score < 20 else "medium"
-            )
-            recommendations.append(recommendation)
+        recommendation = Recommendation(
+            id=generate_recommendation_id(),
+            type="negative_keyword",
+            target_level="campaign",
+            target_id=campaign_id,
+            details_json=json.dumps(details),
+            fingerprint=recommendation_fingerprint("negative_keyword", "campaign", campaign_id, terms["text"][row]),
+            projected_impact=spend_7d * 0.8,  # Assume 80% of spend would be saved
+            risk=1 - (0.5 if np.isnan(confidence) or not confidence else confidence),
+            priority="high" if icp_score < 20 else "medium"
+        )
+        recommendations.append(recommendation)
     
     return recommendations
 
 
-def _generate_pause_keyword_recommendations(db: Session) -> List[Recommendation]:
+def _generate_pause_keyword_recommendations(snapshot: AccountSnapshot) -> List[Recommendation]:
     """Generate pause keyword recommendations."""
     recommendations = []
+    keywords = snapshot.keywords
     
-    # Get account-wide conversion rate percentiles
-    all_metrics = db.query(DailyMetric).filter(
-        and_(
-            DailyMetric.level == "keyword",
-            DailyMetric.conversions > 0,
-            DailyMetric.clicks > 0
-        )
-    ).all()
-    
-    conversion_rates = [
-        (metric.conversions / metric.clicks * 100) 
-        for metric in all_metrics 
-        if metric.clicks > 0
-    ]
+    # Account-wide p25 of 30-day keyword conversion rates
+    p25_conv_rate = snapshot.keyword_p25_conv_rate
     
-    if not conversion_rates:
+    if p25_conv_rate is None:
         return recommendations  # No data to work with
     
-    p25_conv_rate = calculate_percentile(conversion_rates, 25)
+    # Keywords with poor ICP fit, high spend and a bottom-quartile conversion rate over 14 days
+    cost = keywords["cost_micros_14d"]
+    conv_rates = keywords["conversions_14d"] / np.maximum(keywords["clicks_14d"], 1) * 100
+    poor = (
+        (keywords["icp_score"] < 50)
+        & (cost >= 500 * 1_000_000)
+        & (conv_rates < p25_conv_rate)
+    )
+    rows = np.flatnonzero(poor)
+    rows = rows[np.argsort(-cost[rows], kind="stable")]
     
-    # Find keywords with poor performance
-    poor_keywords = db.query(Keyword).filter(
-        and_(
-            Keyword.icp_score < 50,
-            Keyword.icp_score.isnot(None)
-        )
-    ).limit(15).all()  # Limit for MVP
-    
-    for keyword in poor_keywords:
-        # Get metrics for this keyword
-        metrics = db.query(DailyMetric).filter(
-            and_(
-                DailyMetric.level == "keyword",
-                DailyMetric.ref_id == keyword.id,
-                DailyMetric.date >= date.today() - timedelta(days=14)
-            )
-        ).first()
-        
-        if not metrics:
-            continue
-        
-        # Simulate spend check and performance
-        estimated_spend = max(200, (50 - keyword.icp_score) * 25)
-        conv_rate = (metrics.conversions / max(metrics.clicks, 1)) * 100
+    for row in rows.tolist():
+        icp_score = int(keywords["icp_score"][row])
+        spend_14d = cost[row] / 1_000_000
+        conv_rate = float(conv_rates[row])
+        details = {
+            "keyword_text": keywords["text"][row],
+            "match_type": keywords["match_type"][row],
+            "icp_score": icp_score,
+            "estimated_spend_14d": spend_14d,
+            "conversion_rate": conv_rate,
+            "account_p25_conv_rate": p25_conv_rate,
+            "rationale": f"Low ICP ({icp_score}) + poor conversion rate ({conv_rate:.2f}% vs {p25_conv_rate:.2f}% p25)"
+        }
         
-        if estimated_spend >= 500 and conv_rate < p25_conv_rate:
-            details = {
-                "keyword_text": keyword.text,
-                "match_type": keyword.match_type,
-                "icp_score": keyword.icp_score,
-                "estimated_spend_14d": estimated_spend,
-                "conversion_rate": conv_rate,
-                "account_p25_conv_rate": p25_conv_rate,
-                "rationale": f"Low ICP ({keyword.icp_score}) + poor conversion rate ({conv_rate:.2f}% vs {p25_conv_rate:.2f}% p25)"
-            }
-            
-            recommendation = Recommendation(
-                id=generate_recommendation_id(),
-                type="pause_keyword",
-                target_level="keyword",
-                target_id=keyword.id,
-                details_json=json.dumps(details),
-                projected_impact=estimated_spend * 0.7,  # Assume 70% savings
-                risk=0.3,  # Moderate risk of losing some good traffic
-                priority="high" if keyword.icp_score < 30 else "medium"
-            )
-            recommendations.append(recommendation)
+        recommendation = Recommendation(
+            id=generate_recommendation_id(),
+            type="pause_keyword",
+            target_level="keyword",
+            target_id=keywords.ids[row],
+            details_json=json.dumps(details),
+            fingerprint=recommendation_fingerprint("pause_keyword", "keyword", keywords.ids[row]),
+            projected_impact=spend_14d * 0.7,  # Assume 70% savings
+            risk=0.3,  # Moderate risk of losing some good traffic
+            priority="high" if icp_score < 30 else "medium"
+        )
+        recommendations.append(recommendation)
     
     return recommendations
 
 
-def _generate_budget_shift_recommendations(db: Session) -> List[Recommendation]:
+def _generate_budget_shift_recommendations(snapshot: AccountSnapshot) -> List[Recommendation]:
     """Generate budget shift recommendations."""
     recommendations = []
+    campaigns = snapshot.campaigns
     
     # Policy gate: check if account has enough conversions
-    recent_conversions = db.query(func.sum(DailyMetric.conversions)).filter(
-        and_(
-            DailyMetric.date >= date.today() - timedelta(days=30),
-            DailyMetric.level == "campaign"
-        )
-    ).scalar() or 0
+    recent_conversions = snapshot.campaign_conversions_30d
     
     if recent_conversions < 20:
         logger.info("Skipping budget recommendations: insufficient conversions (<20 in last 30 days)")
         return recommendations
     
-    # Find campaigns with different ICP performance
-    campaigns = db.query(Campaign).limit(10).all()  # Limit for MVP
+    avg_icp = campaigns["avg_icp"]
     
-    for campaign in campaigns:
-        # Get average ICP score for this campaign's keywords
-        avg_icp = db.query(func.avg(Keyword.icp_score)).filter(
-            and_(
-                Keyword.ad_group_id.in_(
-                    db.query(AdGroup.id).filter(AdGroup.campaign_id == campaign.id)
-                ),
-                Keyword.icp_score.isnot(None)
-            )
-        ).scalar()
-        
-        if not avg_icp:
-            continue
-        
-        # Get campaign metrics
-        campaign_metrics = db.query(func.sum(DailyMetric.cost_micros)).filter(
-            and_(
-                DailyMetric.level == "campaign",
-                DailyMetric.ref_id == campaign.id,
-                DailyMetric.date >= date.today() - timedelta(days=7)
-            )
-        ).scalar() or 0
-        
-        daily_budget = campaign.daily_budget_micros or 0
+    weekly_spend = campaigns["cost_micros_7d"]
+    daily_budget = np.nan_to_num(campaigns["daily_budget_micros"])
+    
+    # Logic: if high-fit campaign is constrained by budget, recommend increase
+    # if low-fit campaign is overspending, recommend decrease
+    increase = (avg_icp >= 80) & (weekly_spend > daily_budget * 6)  # Spending close to weekly budget
+    decrease = (avg_icp > 0) & (avg_icp < 40) & (daily_budget >= 10000000)  # At least $100/day minimum
+    
+    for row in np.flatnonzero(increase | decrease).tolist():
+        campaign_icp = float(avg_icp[row])
+        budget = int(daily_budget[row])
         
-        # Logic: if high-fit campaign is constrained by budget, recommend increase
-        # if low-fit campaign is overspending, recommend decrease
-        if avg_icp >= 80 and campaign_metrics > daily_budget * 6:  # Spending close to weekly budget
+        if increase[row]:
             details = {
-                "campaign_name": campaign.name,
-                "current_daily_budget_micros": daily_budget,
-                "avg_icp_score": float(avg_icp),
-                "weekly_spend_micros": int(campaign_metrics),
+                "campaign_name": campaigns["name"][row],
+                "current_daily_budget_micros": budget,
+                "avg_icp_score": campaign_icp,
+                "weekly_spend_micros": int(weekly_spend[row]),
                 "recommendation": "increase",
                 "suggested_change_pct": 15,
-                "rationale": f"High-fit campaign (ICP: {avg_icp:.1f}) appears budget-constrained"
+                "rationale": f"High-fit campaign (ICP: {campaign_icp:.1f}) appears budget-constrained"
             }
             
             recommendation = Recommendation(
                 id=generate_recommendation_id(),
                 type="budget_shift",
                 target_level="campaign",
-                target_id=campaign.id,
+                target_id=campaigns.ids[row],
                 details_json=json.dumps(details),
-                projected_impact=daily_budget * 0.15 * 0.3,  # Assume 30% incremental return
+                fingerprint=recommendation_fingerprint(
+                    "budget_shift", "campaign", campaigns.ids[row], details["recommendation"]
+                ),
+                projected_impact=budget * 0.15 * 0.3,  # Assume 30% incremental return
                 risk=0.2,  # Low risk for high-fit campaigns
                 priority="medium"
             )
-            recommendations.append(recommendation)
-            
-        elif avg_icp < 40 and daily_budget >= 10000000:  # At least $100/day minimum
+        else:
             details = {
-                "campaign_name": campaign.name,
-                "current_daily_budget_micros": daily_budget,
-                "avg_icp_score": float(avg_icp),
+                "campaign_name": campaigns["name"][row],
+                "current_daily_budget_micros": budget,
+                "avg_icp_score": campaign_icp,
                 "recommendation": "decrease",
                 "suggested_change_pct": -20,
-                "rationale": f"Low-fit campaign (ICP: {avg_icp:.1f}) may be overspending"
+                "rationale": f"Low-fit campaign (ICP: {campaign_icp:.1f}) may be overspending"
             }
             
             recommendation = Recommendation(
                 id=generate_recommendation_id(),
                 type="budget_shift",
                 target_level="campaign",
-                target_id=campaign.id,
+                target_id=campaigns.ids[row],
                 details_json=json.dumps(details),
-                projected_impact=daily_budget * 0.20 * 0.8,  # Assume 80% of cut is waste
+                fingerprint=recommendation_fingerprint(
+                    "budget_shift", "campaign", campaigns.ids[row], details["recommendation"]
+                ),
+                projected_impact=budget * 0.20 * 0.8,  # Assume 80% of cut is waste
                 risk=0.1,  # Low risk to reduce low-fit spend
                 priority="low"
             )
-            recommendations.append(recommendation)
+        recommendations.append(recommendation)
     
     return recommendations
 
@@ -50,3 +50,15 @@ async def trigger_health_check_now():
     except Exception as e:
         logger.error(f"Error triggering health check: {e}")
         return {"status": "error", "message": str(e)}
+
+
+@router.post("/sync-accounts-now")
+async def trigger_account_sync_now():
+    """Queue a sync of all connected ad accounts; it runs in the background."""
+    try:
+        scheduler = get_scheduler()
+        scheduler.schedule_account_sync()
+        return {"status": "success", "message": "Account sync queued"}
+    except Exception as e:
+        logger.error(f"Error triggering account sync: {e}")
+        return {"status": "error", "message": str(e)}
@@ -1,123 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Keyword, SearchTerm
-import re
-import math
+from models import Keyword, SearchTerm, ScoreJob
+from services.icp_service import write_icp_scores, fetch_unscored, clear_icp_scores
+from services.icp_cache_service import IcpCacheService
+from services.icp_lexicon_service import IcpLexiconService, DEFAULT_TENANT
+from services.score_job_service import ScoreJobService
+from services.icp_stats_service import IcpStatsService
+from scheduler import get_scheduler
 import logging
-from typing import List, Tuple
+from pydantic import BaseModel
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# ICP Lexicons from the spec
-BRAND_TERMS = [
-    "sourcegraph", "sourcegraph enterprise", "sourcegraph ai", "sourcegraph code search"
-]
-
-INCLUDE_TERMS = [
-    "semantic code search", "enterprise code search", "codebase search",
-    "code discovery", "code navigation", "code intelligence", "ai code assistant",
-    "repo search", "monorepo search", "code indexing", "search in code",
-    "large codebase", "semantic search code", "code understanding"
-]
-
-EXCLUDE_TERMS = [
-    "homework", "assignment", "tutorial", "course", "learn", "leetcode",
-    "job", "salary", "interview", "pdf", "definition", "free download",
-    "torrent", "crack", "cheat", "student"
-]
-
-
-def fuzzy_match(text: str, pattern: str, max_edits: int = 1) -> bool:
-    """Simple fuzzy matching with edit distance."""
-    text = text.lower().strip()
-    pattern = pattern.lower().strip()
-    
-    # Exact match first
-    if pattern in text:
-        return True
-    
-    # For simplicity, just check if most words are present
-    pattern_words = pattern.split()
-    text_words = text.split()
-    
-    matches = 0
-    for p_word in pattern_words:
-        for t_word in text_words:
-            if p_word in t_word or t_word in p_word:
-                matches += 1
-                break
-    
-    # Consider it a match if most words are found
-    return matches >= len(pattern_words) - max_edits
-
-
-def calculate_icp_score(text: str, impressions: int = 0, clicks: int = 0) -> Tuple[int, str, float]:
-    """
-    Calculate ICP score for a keyword or search term.
-    Returns (score, rationale, confidence)
-    """
-    text_lower = text.lower().strip()
-    score = 50  # Start at neutral
-    rationale_parts = []
-    
-    # Brand match check (+40)
-    brand_match = False
-    for brand_term in BRAND_TERMS:
-        if fuzzy_match(text_lower, brand_term):
-            score += 40
-            brand_match = True
-            rationale_parts.append(f"Brand match: '{brand_term}' (+40)")
-            break
-    
-    if not brand_match:
-        rationale_parts.append("Brand: no")
-    
-    # Include terms check (+25)
-    include_match = False
-    for include_term in INCLUDE_TERMS:
-        if fuzzy_match(text_lower, include_term):
-            score += 25
-            include_match = True
-            rationale_parts.append(f"Include match: '{include_term}' (+25)")
-            break
-    
-    if not include_match:
-        rationale_parts.append("Include: none")
-    
-    # Exclude terms check (-30)
-    exclude_match = False
-    for exclude_term in EXCLUDE_TERMS:
-        if fuzzy_match(text_lower, exclude_term):
-            score -= 30
-            exclude_match = True
-            rationale_parts.append(f"Exclude match: '{exclude_term}' (-30)")
-            break
-    
-    if not exclude_match:
-        rationale_parts.append("Exclude: none")
-    
-    # Free/open source without enterprise check (-15)
-    if ("free" in text_lower or "open source" in text_lower) and "enterprise" not in text_lower:
-        score -= 15
-        rationale_parts.append("Free/open source without enterprise (-15)")
-    
-    # Clamp score to [0, 100]
-    score = max(0, min(100, score))
-    
-    # Calculate confidence based on clicks (more clicks = higher confidence)
-    confidence = min(1.0, math.log10(clicks + 10) / 2) if clicks > 0 else 0.5
-    
-    rationale = "; ".join(rationale_parts)
-    
-    return score, rationale, confidence
 
+class PublishLexiconRequest(BaseModel):
+    brand_terms: List[str]
+    include_terms: List[str]
+    exclude_terms: List[str]
+    tenant: str = DEFAULT_TENANT
+    rescore: bool = True  # Queue a background re-score of affected items
 
 @router.post("/icp")
 def score_icp(
     level: str = Query(..., description="Level to score: 'keyword' or 'term'"),
     limit: int = Query(default=1000, description="Maximum items to score"),
+    tenant: str = Query(default=DEFAULT_TENANT, description="Tenant whose active lexicon to score with"),
+    metrics_days: int = Query(default=30, description="Days of metrics behind confidence; 0 for all history"),
     db: Session = Depends(get_db)
 ):
     """Compute and save ICP scores for keywords or search terms."""
@@ -125,45 +36,16 @@ def score_icp(
         if level not in ["keyword", "term"]:
             raise HTTPException(status_code=400, detail="Level must be 'keyword' or 'term'")
         
-        scored_count = 0
+        lexicon = IcpLexiconService.get_active(db, tenant)
         
-        if level == "keyword":
-            # Score keywords that don't have scores yet
-            keywords = db.query(Keyword).filter(Keyword.icp_score.is_(None)).limit(limit).all()
-            
-            for keyword in keywords:
-                # Get metrics for this keyword to inform confidence
-                from models import DailyMetric
-                metrics = db.query(DailyMetric).filter(
-                    DailyMetric.level == "keyword",
-                    DailyMetric.ref_id == keyword.id
-                ).first()
-                
-                clicks = metrics.clicks if metrics else 0
-                impressions = metrics.impressions if metrics else 0
-                
-                score, rationale, confidence = calculate_icp_score(
-                    keyword.text, impressions, clicks
-                )
-                
-                keyword.icp_score = score
-                keyword.icp_rationale = rationale
-                keyword.icp_confidence = confidence
-                scored_count += 1
+        # Unscored items, keywords with their metrics summed in the same query
+        model = Keyword if level == "keyword" else SearchTerm
+        items, clicks, impressions = fetch_unscored(db, model, limit, metrics_days=metrics_days)
         
-        elif level == "term":
-            # Score search terms that don't have scores yet
-            search_terms = db.query(SearchTerm).filter(SearchTerm.icp_score.is_(None)).limit(limit).all()
-            
-            for search_term in search_terms:
-                # For search terms, we use simplified metrics
-                # In a real implementation, you'd aggregate metrics by search term
-                score, rationale, confidence = calculate_icp_score(search_term.text, 10, 1)
-                
-                search_term.icp_score = score
-                search_term.icp_rationale = rationale
-                search_term.icp_confidence = confidence
-                scored_count += 1
+        # Duplicate and previously seen texts are resolved from the score cache
+        results = IcpCacheService.score_texts(db, [item.text for item in items], clicks, lexicon)
+        write_icp_scores(db, model, [item.id for item in items], results, version=lexicon.version)
+        scored_count = len(results)
         
         db.commit()
         
@@ -171,7 +53,8 @@ def score_icp(
             "status": "success",
             "level": level,
             "items_scored": scored_count,
-            "total_requested": limit
+            "total_requested": limit,
+            "lexicon_version": lexicon.version
         }
         
     except Exception as e:
@@ -179,61 +62,167 @@ def score_icp(
         raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
 
 
-@router.get("/icp/stats")
-def get_icp_stats(db: Session = Depends(get_db)):
-    """Get ICP scoring statistics."""
+@router.delete("/icp")
+def clear_icp(
+    level: str = Query(..., description="Level to clear: 'keyword' or 'term'"),
+    db: Session = Depends(get_db)
+):
+    """Clear all ICP scores at a level so they are scored again."""
+    if level not in ["keyword", "term"]:
+        raise HTTPException(status_code=400, detail="Level must be 'keyword' or 'term'")
+    
     try:
-        # Keyword stats
-        keyword_stats = db.query(
-            Keyword.icp_score,
-            db.func.count(Keyword.id).label('count')
-        ).filter(
-            Keyword.icp_score.isnot(None)
-        ).group_by(Keyword.icp_score).all()
+        clear_icp_scores(db, Keyword if level == "keyword" else SearchTerm)
+        db.commit()
+        return {"status": "success", "level": level}
         
-        # Search term stats
-        term_stats = db.query(
-            SearchTerm.icp_score,
-            db.func.count(SearchTerm.id).label('count')
-        ).filter(
-            SearchTerm.icp_score.isnot(None)
-        ).group_by(SearchTerm.icp_score).all()
+    except Exception as e:
+        logger.error(f"Clearing ICP scores failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Clearing scores failed: {str(e)}")
+
+
+@router.post("/jobs")
+def create_score_job(
+    level: str = Query(..., description="Level to score: 'keyword' or 'term'"),
+    tenant: str = Query(default=DEFAULT_TENANT, description="Tenant whose active lexicon to score with"),
+    metrics_days: int = Query(default=30, description="Days of metrics behind confidence; 0 for all history"),
+    db: Session = Depends(get_db)
+):
+    """Queue a background job scoring every unscored item at a level and return its id for polling."""
+    if level not in ["keyword", "term"]:
+        raise HTTPException(status_code=400, detail="Level must be 'keyword' or 'term'")
+    
+    try:
+        job = ScoreJobService.create_job(db, level, tenant, metrics_days)
+        get_scheduler().schedule_score_job(job.id)
         
-        # Create score distribution buckets
-        keyword_buckets = {"high": 0, "medium": 0, "low": 0, "unscored": 0}
-        term_buckets = {"high": 0, "medium": 0, "low": 0, "unscored": 0}
+        return {"job_id": job.id, "status": job.status, "rows_expected": job.rows_expected}
         
-        for score, count in keyword_stats:
-            if score >= 70:
-                keyword_buckets["high"] += count
-            elif score >= 40:
-                keyword_buckets["medium"] += count
-            else:
-                keyword_buckets["low"] += count
+    except Exception as e:
+        logger.error(f"Failed to queue score job: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue score job: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+def get_score_job(job_id: str, db: Session = Depends(get_db)):
+    """Get progress of a background scoring job."""
+    job = db.query(ScoreJob).filter(ScoreJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Score job not found")
+    
+    return ScoreJobService.get_progress(job)
+
+
+@router.post("/jobs/{job_id}/resume")
+def resume_score_job(job_id: str, db: Session = Depends(get_db)):
+    """Resume a failed scoring job after its last committed chunk."""
+    job = db.query(ScoreJob).filter(ScoreJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Score job not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Score job is {job.status}")
+    
+    get_scheduler().schedule_score_job(job.id)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/icp/lexicons")
+def get_lexicons(
+    tenant: str = Query(default=DEFAULT_TENANT, description="Tenant whose lexicon to show"),
+    db: Session = Depends(get_db)
+):
+    """Get the active ICP lexicon version and its terms."""
+    try:
+        return IcpLexiconService.to_dict(IcpLexiconService.get_active(db, tenant))
         
-        for score, count in term_stats:
-            if score >= 70:
-                term_buckets["high"] += count
-            elif score >= 40:
-                term_buckets["medium"] += count
-            else:
-                term_buckets["low"] += count
+    except Exception as e:
+        logger.error(f"Getting ICP lexicons failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Lexicon retrieval failed: {str(e)}")
+
+
+@router.post("/icp/lexicons")
+def publish_lexicons(request: PublishLexiconRequest, db: Session = Depends(get_db)):
+    """Publish a new ICP lexicon version and queue a re-score of the items it affects."""
+    try:
+        lexicon = IcpLexiconService.publish(
+            db, request.brand_terms, request.include_terms, request.exclude_terms, request.tenant
+        )
+        
+        result = {"status": "success", **IcpLexiconService.to_dict(lexicon)}
+        if request.rescore:
+            job = ScoreJobService.create_rescore_job(db, request.tenant)
+            get_scheduler().schedule_score_job(job.id)
+            result["rescore_job_id"] = job.id
+        return result
+        
+    except Exception as e:
+        logger.error(f"Publishing ICP lexicons failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Lexicon publish failed: {str(e)}")
+
+
+@router.post("/icp/rescore")
+def rescore_icp(
+    tenant: str = Query(default=DEFAULT_TENANT, description="Tenant whose active lexicon to re-score to"),
+    db: Session = Depends(get_db)
+):
+    """Queue a job moving every scored item to the active lexicon, re-scoring only items whose score can change."""
+    try:
+        job = ScoreJobService.create_rescore_job(db, tenant)
+        get_scheduler().schedule_score_job(job.id)
+        
+        return {"job_id": job.id, "status": job.status, "rows_expected": job.rows_expected}
         
-        # Count unscored items
-        unscored_keywords = db.query(Keyword).filter(Keyword.icp_score.is_(None)).count()
-        unscored_terms = db.query(SearchTerm).filter(SearchTerm.icp_score.is_(None)).count()
+    except Exception as e:
+        logger.error(f"ICP re-scoring failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Re-scoring failed: {str(e)}")
+
+
+@router.get("/icp/stats")
+def get_icp_stats(
+    boundaries: Optional[str] = Query(default=None, description="Comma-separated bucket lower bounds, e.g. '40,70'"),
+    db: Session = Depends(get_db)
+):
+    """Get ICP scoring statistics from the maintained score histogram."""
+    try:
+        bounds = sorted({int(bound) for bound in boundaries.split(",")}) if boundaries else [40, 70]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Boundaries must be comma-separated integers")
+    
+    starts = [0] + [bound for bound in bounds if 0 < bound <= 100]
+    ends = [start - 1 for start in starts[1:]] + [100]
+    ranges = [f"{start}-{end}" for start, end in zip(starts, ends)]
+    
+    if boundaries:
+        scoring_criteria = {f"bucket_{i + 1}": label for i, label in enumerate(ranges)}
+    else:
+        low, medium, high = ranges
+        scoring_criteria = {
+            "high_fit": f"{high} (strong ICP match)",
+            "medium_fit": f"{medium} (moderate ICP match)",
+            "low_fit": f"{low} (poor ICP match)"
+        }
+    
+    try:
+        def buckets(level: str) -> dict:
+            histogram = IcpStatsService.get_histogram(db, level)
+            counts = IcpStatsService.bucket_counts(histogram, bounds)
+            if boundaries:
+                result = dict(zip(ranges, counts))
+            else:
+                low, medium, high = counts
+                result = {"high": high, "medium": medium, "low": low}
+            result["unscored"] = int(histogram[-1])
+            return result
         
-        keyword_buckets["unscored"] = unscored_keywords
-        term_buckets["unscored"] = unscored_terms
+        keyword_buckets = buckets("keyword")
+        term_buckets = buckets("term")
+        # Histograms built on first use
+        db.commit()
         
         return {
             "keywords": keyword_buckets,
             "search_terms": term_buckets,
-            "scoring_criteria": {
-                "high_fit": "70-100 (strong ICP match)",
-                "medium_fit": "40-69 (moderate ICP match)",
-                "low_fit": "0-39 (poor ICP match)"
-            }
+            "scoring_criteria": scoring_criteria
         }
         
     except Exception as e:
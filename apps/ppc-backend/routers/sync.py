@@ -2,134 +2,40 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from database import get_db
 from ads.client import ads_client
-from models import Campaign, AdGroup, Keyword, SearchTerm, DailyMetric
-from datetime import datetime, date, timedelta
+from models import SyncJob
+from services.sync_service import SyncOrchestrator, STAGES
+from services.sync_job_service import SyncJobService
+from scheduler import get_scheduler
+from typing import List, Optional
 import logging
-import hashlib
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def create_composite_id(date_str: str, level: str, ref_id: str) -> str:
-    """Create a composite ID for daily metrics."""
-    return f"{date_str}_{level}_{ref_id}"
-
-
-def create_search_term_id(term: str, ad_group_id: str) -> str:
-    """Create a unique ID for search terms."""
-    content = f"{term}_{ad_group_id}"
-    return hashlib.md5(content.encode()).hexdigest()
+def run_stages(db: Session, days: dict, full_refresh: bool) -> dict:
+    """Run the given sync stages against the configured Google Ads account."""
+    orchestrator = SyncOrchestrator(db, ads_client.customer_id, ads_client.iter_query)
+    return orchestrator.run(list(days), days=days, full_refresh=full_refresh)
 
 
 @router.get("/keywords")
 def sync_keywords(
     days: int = Query(default=90, description="Number of days to sync"),
+    full_refresh: bool = Query(default=False, description="Ignore the sync watermark"),
     db: Session = Depends(get_db)
 ):
     """Sync keywords and their metrics from Google Ads."""
     try:
-        customer_id = ads_client.customer_id
-        
-        # GAQL query for keywords with metrics
-        query = f"""
-        SELECT
-          customer.id,
-          campaign.id, campaign.name, campaign.status,
-          ad_group.id, ad_group.name, ad_group.status,
-          ad_group_criterion.criterion_id,
-          ad_group_criterion.keyword.text,
-          ad_group_criterion.keyword.match_type,
-          ad_group_criterion.status,
-          ad_group_criterion.cpc_bid_micros,
-          metrics.impressions, metrics.clicks, metrics.cost_micros,
-          metrics.conversions, metrics.conversions_value
-        FROM keyword_view
-        WHERE segments.date DURING LAST_{days}_DAYS
-        """
-        
-        results = ads_client.execute_query(query, customer_id)
-        
-        campaigns_synced = set()
-        ad_groups_synced = set()
-        keywords_synced = 0
-        metrics_synced = 0
-        
-        for row in results:
-            # Sync campaign
-            campaign_id = str(row.campaign.id)
-            if campaign_id not in campaigns_synced:
-                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                if not campaign:
-                    campaign = Campaign(
-                        id=campaign_id,
-                        name=row.campaign.name,
-                        status=row.campaign.status.name,
-                        daily_budget_micros=getattr(row.campaign, 'campaign_budget', {}).get('amount_micros', 0)
-                    )
-                    db.add(campaign)
-                campaigns_synced.add(campaign_id)
-            
-            # Sync ad group
-            ad_group_id = str(row.ad_group.id)
-            if ad_group_id not in ad_groups_synced:
-                ad_group = db.query(AdGroup).filter(AdGroup.id == ad_group_id).first()
-                if not ad_group:
-                    ad_group = AdGroup(
-                        id=ad_group_id,
-                        campaign_id=campaign_id,
-                        name=row.ad_group.name,
-                        status=row.ad_group.status.name
-                    )
-                    db.add(ad_group)
-                ad_groups_synced.add(ad_group_id)
-            
-            # Sync keyword
-            keyword_id = str(row.ad_group_criterion.criterion_id)
-            keyword = db.query(Keyword).filter(Keyword.id == keyword_id).first()
-            if not keyword:
-                keyword = Keyword(
-                    id=keyword_id,
-                    ad_group_id=ad_group_id,
-                    text=row.ad_group_criterion.keyword.text,
-                    match_type=row.ad_group_criterion.keyword.match_type.name,
-                    status=row.ad_group_criterion.status.name,
-                    cpc_bid_micros=getattr(row.ad_group_criterion, 'cpc_bid_micros', None)
-                )
-                db.add(keyword)
-                keywords_synced += 1
-            
-            # For aggregated metrics, we'll create one record per keyword
-            # In a real implementation, you might want daily breakdowns
-            metric_id = create_composite_id("aggregated", "keyword", keyword_id)
-            metric = db.query(DailyMetric).filter(DailyMetric.id == metric_id).first()
-            if not metric:
-                metric = DailyMetric(
-                    id=metric_id,
-                    date=date.today() - timedelta(days=1),  # Yesterday as representative
-                    level="keyword",
-                    ref_id=keyword_id,
-                    impressions=row.metrics.impressions,
-                    clicks=row.metrics.clicks,
-                    cost_micros=row.metrics.cost_micros,
-                    conversions=row.metrics.conversions,
-                    conversions_value=row.metrics.conversions_value,
-                    ctr=row.metrics.clicks / max(row.metrics.impressions, 1) * 100,
-                    cpc_micros=row.metrics.cost_micros // max(row.metrics.clicks, 1),
-                    conversion_rate=row.metrics.conversions / max(row.metrics.clicks, 1) * 100
-                )
-                db.add(metric)
-                metrics_synced += 1
-        
-        db.commit()
-        
+        result = run_stages(db, {"keywords": days}, full_refresh)["keywords"]
+        written = result["rows_written"]
         return {
-            "status": "success",
-            "campaigns_synced": len(campaigns_synced),
-            "ad_groups_synced": len(ad_groups_synced),
-            "keywords_synced": keywords_synced,
-            "metrics_synced": metrics_synced,
-            "total_rows_processed": len(results)
+            **result,
+            "campaigns_synced": written["campaigns"],
+            "ad_groups_synced": written["ad_groups"],
+            "keywords_synced": written["keywords"],
+            "metrics_synced": written["daily_metrics"],
         }
         
     except Exception as e:
@@ -140,57 +46,17 @@ def sync_keywords(
 @router.get("/search_terms")
 def sync_search_terms(
     days: int = Query(default=30, description="Number of days to sync"),
+    full_refresh: bool = Query(default=False, description="Ignore the sync watermark"),
     db: Session = Depends(get_db)
 ):
     """Sync search terms from Google Ads."""
     try:
-        customer_id = ads_client.customer_id
-        
-        # GAQL query for search terms
-        query = f"""
-        SELECT
-          search_term_view.search_term,
-          ad_group.id, ad_group.name,
-          ad_group_criterion.keyword.text,
-          segments.date,
-          metrics.impressions, metrics.clicks, metrics.cost_micros,
-          metrics.conversions, metrics.conversions_value
-        FROM search_term_view
-        WHERE segments.date DURING LAST_{days}_DAYS
-        """
-        
-        results = ads_client.execute_query(query, customer_id)
-        
-        search_terms_synced = 0
-        
-        for row in results:
-            ad_group_id = str(row.ad_group.id)
-            search_term = row.search_term_view.search_term
-            search_term_id = create_search_term_id(search_term, ad_group_id)
-            
-            # Check if search term already exists
-            existing_term = db.query(SearchTerm).filter(SearchTerm.id == search_term_id).first()
-            
-            if not existing_term:
-                search_term_obj = SearchTerm(
-                    id=search_term_id,
-                    ad_group_id=ad_group_id,
-                    text=search_term,
-                    matched_keyword_text=getattr(row.ad_group_criterion.keyword, 'text', None),
-                    last_seen=row.segments.date
-                )
-                db.add(search_term_obj)
-                search_terms_synced += 1
-            else:
-                # Update last seen date
-                existing_term.last_seen = max(existing_term.last_seen, row.segments.date)
-        
-        db.commit()
-        
+        result = run_stages(db, {"search_terms": days}, full_refresh)["search_terms"]
+        written = result["rows_written"]
         return {
-            "status": "success",
-            "search_terms_synced": search_terms_synced,
-            "total_rows_processed": len(results)
+            **result,
+            "search_terms_synced": written["search_terms"],
+            "metrics_synced": written["daily_metrics"],
         }
         
     except Exception as e:
@@ -201,60 +67,17 @@ def sync_search_terms(
 @router.get("/campaigns")
 def sync_campaigns(
     days: int = Query(default=30, description="Number of days for budget data"),
+    full_refresh: bool = Query(default=False, description="Ignore the sync watermark"),
     db: Session = Depends(get_db)
 ):
     """Sync campaign budgets and pacing data."""
     try:
-        customer_id = ads_client.customer_id
-        
-        # GAQL query for campaigns with budget data
-        query = f"""
-        SELECT
-          campaign.id, campaign.name, campaign.status,
-          campaign_budget.amount_micros, campaign_budget.status,
-          segments.date, metrics.cost_micros
-        FROM campaign
-        WHERE segments.date DURING LAST_{days}_DAYS
-        """
-        
-        results = ads_client.execute_query(query, customer_id)
-        
-        campaigns_updated = set()
-        daily_metrics_added = 0
-        
-        for row in results:
-            campaign_id = str(row.campaign.id)
-            
-            # Update campaign budget info
-            if campaign_id not in campaigns_updated:
-                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                if campaign:
-                    campaign.daily_budget_micros = row.campaign_budget.amount_micros
-                    campaign.status = row.campaign.status.name
-                    campaigns_updated.add(campaign_id)
-            
-            # Add daily metric
-            metric_id = create_composite_id(str(row.segments.date), "campaign", campaign_id)
-            existing_metric = db.query(DailyMetric).filter(DailyMetric.id == metric_id).first()
-            
-            if not existing_metric:
-                daily_metric = DailyMetric(
-                    id=metric_id,
-                    date=row.segments.date,
-                    level="campaign",
-                    ref_id=campaign_id,
-                    cost_micros=row.metrics.cost_micros
-                )
-                db.add(daily_metric)
-                daily_metrics_added += 1
-        
-        db.commit()
-        
+        result = run_stages(db, {"campaigns": days}, full_refresh)["campaigns"]
+        written = result["rows_written"]
         return {
-            "status": "success",
-            "campaigns_updated": len(campaigns_updated),
-            "daily_metrics_added": daily_metrics_added,
-            "total_rows_processed": len(results)
+            **result,
+            "campaigns_updated": written["campaigns"],
+            "daily_metrics_added": written["daily_metrics"],
         }
         
     except Exception as e:
@@ -263,21 +86,73 @@ def sync_campaigns(
 
 
 @router.post("/full_sync")
-def full_sync(db: Session = Depends(get_db)):
+def full_sync(
+    full_refresh: bool = Query(default=False, description="Ignore sync watermarks"),
+    db: Session = Depends(get_db)
+):
     """Perform a full sync of all data."""
     try:
-        # Sync in order: campaigns -> keywords -> search terms
-        campaign_result = sync_campaigns(30, db)
-        keyword_result = sync_keywords(90, db)
-        search_term_result = sync_search_terms(30, db)
+        # Fetches run concurrently; writes still land campaigns -> keywords -> search terms
+        started = time.monotonic()
+        results = run_stages(db, {"campaigns": 30, "keywords": 90, "search_terms": 30}, full_refresh)
         
         return {
             "status": "success",
-            "campaigns": campaign_result,
-            "keywords": keyword_result,
-            "search_terms": search_term_result
+            **results,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
         }
         
     except Exception as e:
         logger.error(f"Full sync failed: {e}")
         raise HTTPException(status_code=500, detail=f"Full sync failed: {str(e)}")
+
+
+@router.post("/jobs")
+def create_sync_job(
+    stages: Optional[List[str]] = Query(default=None, description="Stages to sync (default: all)"),
+    full_refresh: bool = Query(default=False, description="Ignore sync watermarks"),
+    db: Session = Depends(get_db)
+):
+    """Queue a background sync and return its job id for polling."""
+    stages = stages or list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sync stages: {unknown}")
+    
+    try:
+        job = SyncJobService.create_job(
+            db,
+            ads_client.customer_id,
+            {stage: STAGES[stage].default_days for stage in stages},
+            full_refresh,
+        )
+        get_scheduler().schedule_sync_job(job.id)
+        
+        return {"job_id": job.id, "status": job.status}
+        
+    except Exception as e:
+        logger.error(f"Failed to queue sync job: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue sync job: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+def get_sync_job(job_id: str, db: Session = Depends(get_db)):
+    """Get progress of a background sync job."""
+    job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    
+    return SyncJobService.get_progress(job)
+
+
+@router.post("/jobs/{job_id}/resume")
+def resume_sync_job(job_id: str, db: Session = Depends(get_db)):
+    """Resume a failed sync job from its last committed slice."""
+    job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Sync job is {job.status}")
+    
+    get_scheduler().schedule_sync_job(job.id)
+    return {"job_id": job.id, "status": job.status}
@@ -2,7 +2,8 @@
 Background scheduler for automatic token refresh.
 
 This module proactively refreshes OAuth tokens before they expire,
-preventing API failures and ensuring continuous operation.
+preventing API failures and ensuring continuous operation. It also runs
+on-demand background sync and ICP scoring jobs.
 """
 
 import asyncio
@@ -10,6 +11,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import List
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy import create_engine, and_
 from sqlalchemy.orm import sessionmaker
@@ -17,9 +19,16 @@ import os
 
 from models_vault import OAuthTokenVault, AdAccountConnection, ConnectionStatus
 from services.token_service import TokenService
+from services.sync_job_service import SyncJobService
+from services.score_job_service import ScoreJobService
+from services.account_sync_service import AccountSyncService
+from services.job_lease import LEASE_SECONDS
+from database import SessionLocal as AppSessionLocal
 
 logger = logging.getLogger(__name__)
 
+ACCOUNT_SYNC_INTERVAL_MINUTES = int(os.getenv("ACCOUNT_SYNC_INTERVAL_MINUTES", "60"))
+
 
 class TokenRefreshScheduler:
     """Manages scheduled token refresh jobs."""
@@ -192,6 +201,92 @@ class TokenRefreshScheduler:
         finally:
             db.close()
     
+    async def sync_connected_accounts(self):
+        """Sync every active connected ad account through the bounded worker pool."""
+        db = self.SessionLocal()
+        
+        try:
+            await AccountSyncService.sync_active_connections(db)
+        except Exception as e:
+            logger.error(f"Error in sync_connected_accounts: {e}", exc_info=True)
+        finally:
+            db.close()
+    
+    def schedule_account_sync(self):
+        """
+        Sync all connected accounts in the background as soon as possible.
+        
+        Repeated requests while one is pending replace it rather than queueing
+        another fan-out.
+        """
+        self.scheduler.add_job(
+            self.sync_connected_accounts,
+            trigger=DateTrigger(),
+            id="sync_accounts_now",
+            name="Sync connected ad accounts now",
+            replace_existing=True,
+            misfire_grace_time=None,
+        )
+    
+    def schedule_sync_job(self, job_id: str):
+        """
+        Run a sync job in the background as soon as possible.
+        
+        SyncJobService.run_job is synchronous, so APScheduler runs it on a
+        worker thread rather than the event loop.
+        """
+        self.scheduler.add_job(
+            SyncJobService.run_job,
+            trigger=DateTrigger(),
+            args=[job_id],
+            id=f"sync_job_{job_id}",
+            name=f"Sync job {job_id}",
+            replace_existing=True,
+            misfire_grace_time=None,
+        )
+    
+    def resume_sync_jobs(self):
+        """Requeue sync jobs whose owning process stopped heartbeating; they resume from their checkpoints."""
+        db = AppSessionLocal()
+        
+        try:
+            job_ids = SyncJobService.claim_interrupted(db)
+            for job_id in job_ids:
+                self.schedule_sync_job(job_id)
+            if job_ids:
+                logger.info(f"Resuming {len(job_ids)} interrupted sync jobs")
+        except Exception as e:
+            logger.error(f"Error resuming sync jobs: {e}", exc_info=True)
+        finally:
+            db.close()
+    
+    def schedule_score_job(self, job_id: str):
+        """Run an ICP scoring job on a scheduler worker thread as soon as possible."""
+        self.scheduler.add_job(
+            ScoreJobService.run_job,
+            trigger=DateTrigger(),
+            args=[job_id],
+            id=f"score_job_{job_id}",
+            name=f"Score job {job_id}",
+            replace_existing=True,
+            misfire_grace_time=None,
+        )
+    
+    def resume_score_jobs(self):
+        """Requeue scoring jobs whose owning process stopped heartbeating; they continue after their last chunk."""
+        db = AppSessionLocal()
+        
+        try:
+            job_ids = ScoreJobService.claim_interrupted(db)
+            for job_id in job_ids:
+                self.schedule_score_job(job_id)
+            if job_ids:
+                logger.info(f"Resuming {len(job_ids)} interrupted score jobs")
+        except Exception as e:
+            logger.error(f"Error resuming score jobs: {e}", exc_info=True)
+        finally:
+            db.close()
+    
     def start(self):
         """Start the scheduler with all jobs."""
         if self._running:
@@ -225,13 +320,45 @@ class TokenRefreshScheduler:
             max_instances=1,
         )
         
+        self.scheduler.add_job(
+            self.sync_connected_accounts,
+            trigger=IntervalTrigger(minutes=ACCOUNT_SYNC_INTERVAL_MINUTES),
+            id="sync_accounts",
+            name="Sync connected ad accounts",
+            replace_existing=True,
+            max_instances=1,
+        )
+        
+        # Jobs of a process that died are taken over once their lease expires
+        self.scheduler.add_job(
+            self.resume_sync_jobs,
+            trigger=IntervalTrigger(seconds=LEASE_SECONDS),
+            id="resume_sync_jobs",
+            name="Resume interrupted sync jobs",
+            replace_existing=True,
+            max_instances=1,
+        )
+        
+        self.scheduler.add_job(
+            self.resume_score_jobs,
+            trigger=IntervalTrigger(seconds=LEASE_SECONDS),
+            id="resume_score_jobs",
+            name="Resume interrupted score jobs",
+            replace_existing=True,
+            max_instances=1,
+        )
+        
         self.scheduler.start()
         self._running = True
+        self.resume_sync_jobs()
+        self.resume_score_jobs()
         
         logger.info("🚀 Token refresh scheduler started")
         logger.info("  - Refresh expiring tokens: every 10 minutes")
         logger.info("  - Health check: every hour")
         logger.info("  - Cleanup expired: every 6 hours")
+        logger.info(f"  - Sync connected accounts: every {ACCOUNT_SYNC_INTERVAL_MINUTES} minutes")
+        logger.info(f"  - Resume interrupted jobs: every {LEASE_SECONDS} seconds")
     
     def shutdown(self):
         """Gracefully shutdown the scheduler."""
@@ -0,0 +1,331 @@
+"""
+Columnar account snapshot for recommendation rules.
+
+build_snapshot reads campaigns, ad groups, keywords and search terms once,
+column by column, into NumPy arrays with an id -> row index per entity type.
+Trailing-window metric totals come from one grouped daily_metrics query per
+level, covering just the (metric, window) pairs the rules read, and are
+aligned to the entity rows, zero where an entity had no activity. Rules then run as vectorized
+masks over whole arrays instead of per-entity queries.
+
+A scoped snapshot (see dirty_scope) loads only the given entities. The
+account-wide figures the rules compare against (p25 keyword conversion rate,
+30-day campaign conversions, campaign average ICP) then come from aggregate
+queries instead of the loaded arrays.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+import logging
+import time
+
+import numpy as np
+
+from models import Campaign, AdGroup, Keyword, SearchTerm, DailyMetric
+from services.dirty_set_service import ALL
+
+logger = logging.getLogger(__name__)
+
+# Metric totals the recommendation rules read, per level: (metric, trailing days)
+METRIC_WINDOWS: Dict[str, List[Tuple[str, int]]] = {
+    "campaign": [("cost_micros", 7), ("conversions", 30)],
+    "keyword": [("clicks", 14), ("cost_micros", 14), ("conversions", 14), ("clicks", 30), ("conversions", 30)],
+    "search_term": [("cost_micros", 7), ("conversions", 7)],
+}
+
+# Ids per IN (...) filter of a scoped snapshot
+LOOKUP_CHUNK_SIZE = 500
+
+
+@dataclass
+class EntityFrame:
+    """
+    One entity type as aligned columns.
+
+    Text columns are object arrays; numeric columns are float arrays with
+    NaN for NULL. Metric totals are named like "cost_micros_7d".
+    """
+    ids: np.ndarray
+    columns: Dict[str, np.ndarray]
+    index: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.index = {item_id: row for row, item_id in enumerate(self.ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def rows_of(self, ids: Sequence[str]) -> np.ndarray:
+        """Row index per id, -1 where the id isn't in the frame."""
+        return np.fromiter((self.index.get(item_id, -1) for item_id in ids), dtype=np.int64, count=len(ids))
+
+
+@dataclass
+class AccountSnapshot:
+    """
+    Every entity the recommendation rules read, as columnar frames.
+
+    Campaigns carry an "avg_icp" column (0 without scored keywords).
+    """
+    campaigns: EntityFrame
+    ad_groups: EntityFrame
+    keywords: EntityFrame
+    search_terms: EntityFrame
+    # Account-wide 25th percentile of 30-day keyword conversion rate (%), None without conversions
+    keyword_p25_conv_rate: Optional[float] = None
+    campaign_conversions_30d: float = 0.0
+    scoped: bool = False
+
+    def keyword_campaigns(self) -> np.ndarray:
+        """Campaign row per keyword row, -1 if its ad group or campaign is missing."""
+        ad_group_rows = self.ad_groups.rows_of(self.keywords["ad_group_id"].tolist())
+        campaign_rows = self.campaigns.rows_of(self.ad_groups["campaign_id"].tolist())
+        # Row -1 picks the appended -1
+        return np.append(campaign_rows, -1)[ad_group_rows]
+
+    def search_term_campaign_ids(self) -> np.ndarray:
+        """Campaign id per search term row, None if its ad group is missing."""
+        ad_group_rows = self.ad_groups.rows_of(self.search_terms["ad_group_id"].tolist())
+        # Row -1 picks the appended None
+        return np.append(self.ad_groups["campaign_id"], None)[ad_group_rows]
+
+
+def build_snapshot(
+    db: Session,
+    metric_windows: Dict[str, List[Tuple[str, int]]] = METRIC_WINDOWS,
+    scope: Optional[Dict[str, Set[str]]] = None
+) -> AccountSnapshot:
+    """
+    Load entities with their trailing-window metric totals.
+
+    Args:
+        db: Database session
+        metric_windows: (metric, days) totals to load per level
+        scope: Ids to load per level (from dirty_scope); every entity when omitted
+    """
+    started = time.perf_counter()
+
+    def ids(level: str) -> Optional[Set[str]]:
+        return None if scope is None else scope.get(level, set())
+
+    keywords = _load_frame(
+        db, Keyword, ["ad_group_id", "text", "match_type"], ["icp_score", "icp_confidence"], ids("keyword")
+    )
+    search_terms = _load_frame(
+        db, SearchTerm, ["ad_group_id", "text", "icp_rationale"], ["icp_score", "icp_confidence"],
+        ids("search_term")
+    )
+    snapshot = AccountSnapshot(
+        campaigns=_load_frame(db, Campaign, ["name"], ["daily_budget_micros"], ids("campaign")),
+        # Scoped snapshots still need the ad groups linking loaded keywords and search terms to campaigns
+        ad_groups=_load_frame(
+            db, AdGroup, ["campaign_id"], [],
+            None if scope is None
+            else set(keywords["ad_group_id"].tolist()) | set(search_terms["ad_group_id"].tolist())
+        ),
+        keywords=keywords,
+        search_terms=search_terms,
+        scoped=scope is not None,
+    )
+    for level, frame in (
+        ("campaign", snapshot.campaigns),
+        ("keyword", snapshot.keywords),
+        ("search_term", snapshot.search_terms),
+    ):
+        frame.columns.update(_window_totals(db, level, frame, metric_windows.get(level, []), ids(level)))
+
+    if scope is None:
+        _account_figures_from_frames(snapshot)
+    else:
+        _account_figures_from_queries(db, snapshot)
+
+    logger.info(
+        f"Built {'scoped ' if snapshot.scoped else ''}account snapshot in {time.perf_counter() - started:.3f}s: "
+        f"{len(snapshot.campaigns)} campaigns, {len(snapshot.keywords)} keywords, "
+        f"{len(snapshot.search_terms)} search terms"
+    )
+    return snapshot
+
+
+def dirty_scope(db: Session, dirty: Dict[str, Set[str]]) -> Optional[Dict[str, Set[str]]]:
+    """
+    Entities to re-evaluate for dirty ids per level.
+
+    That is the dirty entities plus the campaigns of dirty keywords, whose
+    average ICP they feed, and every search term sharing a dirty term's text
+    in its campaign, since a campaign-level negative is chosen across them.
+    None if a whole level was marked dirty.
+    """
+    if any(ALL in level_ids for level_ids in dirty.values()):
+        return None
+
+    campaigns = set(dirty.get("campaign", set()))
+    for chunk in _chunks(dirty.get("keyword", set())):
+        campaigns.update(campaign_id for (campaign_id,) in db.query(AdGroup.campaign_id).join(
+            Keyword, Keyword.ad_group_id == AdGroup.id
+        ).filter(Keyword.id.in_(chunk)).distinct())
+
+    search_terms = set(dirty.get("search_term", set()))
+    term_campaigns: Set[Tuple[str, str]] = set()
+    for chunk in _chunks(search_terms):
+        term_campaigns.update(db.query(AdGroup.campaign_id, SearchTerm.text).join(
+            SearchTerm, SearchTerm.ad_group_id == AdGroup.id
+        ).filter(SearchTerm.id.in_(chunk)).distinct())
+    for chunk in _chunks({text for _, text in term_campaigns}):
+        search_terms.update(term_id for term_id, campaign_id, text in db.query(
+            SearchTerm.id, AdGroup.campaign_id, SearchTerm.text
+        ).join(AdGroup, SearchTerm.ad_group_id == AdGroup.id).filter(
+            SearchTerm.text.in_(chunk)
+        ) if (campaign_id, text) in term_campaigns)
+
+    return {
+        "campaign": campaigns,
+        "keyword": set(dirty.get("keyword", set())),
+        "search_term": search_terms,
+    }
+
+
+def conversion_rate_percentile(db: Session, days: int, percentile: int) -> Optional[float]:
+    """
+    Percentile of per-keyword conversion rate (%) over the trailing window, in the database.
+
+    Only keywords with clicks and conversions count. Postgres uses
+    percentile_cont; other databases stream just the rate column into NumPy.
+    Both interpolate linearly, like the full snapshot's np.percentile.
+    """
+    totals = select(
+        func.sum(DailyMetric.clicks).label("clicks"),
+        func.sum(DailyMetric.conversions).label("conversions"),
+    ).where(
+        DailyMetric.level == "keyword",
+        DailyMetric.date >= date.today() - timedelta(days=days)
+    ).group_by(DailyMetric.ref_id).subquery()
+    rate = totals.c.conversions * 100.0 / totals.c.clicks
+    qualifies = and_(totals.c.conversions > 0, totals.c.clicks > 0)
+
+    if db.get_bind().dialect.name == "postgresql":
+        value = db.execute(select(func.percentile_cont(percentile / 100).within_group(rate)).where(qualifies)).scalar()
+        return None if value is None else float(value)
+
+    rates = np.fromiter(
+        db.execute(select(rate).where(qualifies).execution_options(yield_per=10_000)).scalars(),
+        dtype=float
+    )
+    return float(np.percentile(rates, percentile)) if len(rates) else None
+
+
+def _account_figures_from_frames(snapshot: AccountSnapshot):
+    keywords, campaigns = snapshot.keywords, snapshot.campaigns
+
+    clicks, conversions = keywords["clicks_30d"], keywords["conversions_30d"]
+    converting = (clicks > 0) & (conversions > 0)
+    if converting.any():
+        snapshot.keyword_p25_conv_rate = float(np.percentile(conversions[converting] / clicks[converting] * 100, 25))
+    snapshot.campaign_conversions_30d = float(campaigns["conversions_30d"].sum())
+
+    # Average ICP of each campaign's scored keywords
+    keyword_campaigns = snapshot.keyword_campaigns()
+    scores = keywords["icp_score"]
+    scored = (keyword_campaigns >= 0) & ~np.isnan(scores)
+    score_sums = np.bincount(keyword_campaigns[scored], weights=scores[scored], minlength=len(campaigns))
+    score_counts = np.bincount(keyword_campaigns[scored], minlength=len(campaigns))
+    campaigns.columns["avg_icp"] = np.divide(
+        score_sums, score_counts, out=np.zeros(len(campaigns)), where=score_counts > 0
+    )
+
+
+def _account_figures_from_queries(db: Session, snapshot: AccountSnapshot):
+    campaigns = snapshot.campaigns
+
+    snapshot.keyword_p25_conv_rate = conversion_rate_percentile(db, 30, 25)
+    snapshot.campaign_conversions_30d = float(db.query(func.sum(DailyMetric.conversions)).filter(
+        DailyMetric.level == "campaign",
+        DailyMetric.date >= date.today() - timedelta(days=30)
+    ).scalar() or 0)
+
+    avg_icp = np.zeros(len(campaigns))
+    for chunk in _chunks(campaigns.ids.tolist()):
+        for campaign_id, value in db.query(AdGroup.campaign_id, func.avg(Keyword.icp_score)).join(
+            Keyword, Keyword.ad_group_id == AdGroup.id
+        ).filter(
+            AdGroup.campaign_id.in_(chunk),
+            Keyword.icp_score.isnot(None)
+        ).group_by(AdGroup.campaign_id):
+            avg_icp[campaigns.index[campaign_id]] = float(value or 0)
+    campaigns.columns["avg_icp"] = avg_icp
+
+
+def _chunks(ids: Iterable[str]) -> Iterable[List[str]]:
+    ids = list(ids)
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        yield ids[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def _load_frame(
+    db: Session,
+    model,
+    text_columns: Sequence[str],
+    numeric_columns: Sequence[str],
+    ids: Optional[Set[str]] = None
+) -> EntityFrame:
+    names = ["id", *text_columns, *numeric_columns]
+    query = select(*[getattr(model, name) for name in names])
+    if ids is None:
+        rows = db.execute(query).all()
+    else:
+        rows = [row for chunk in _chunks(ids) for row in db.execute(query.where(model.id.in_(chunk)))]
+    values = list(zip(*rows)) if rows else [()] * len(names)
+
+    columns = {}
+    for name, column in zip(names[1:], values[1:]):
+        if name in text_columns:
+            columns[name] = np.array(column, dtype=object)
+        else:
+            columns[name] = np.array(column, dtype=float)
+    return EntityFrame(ids=np.array(values[0], dtype=object), columns=columns)
+
+
+def _window_totals(
+    db: Session,
+    level: str,
+    frame: EntityFrame,
+    windows: Sequence[Tuple[str, int]],
+    ids: Optional[Set[str]] = None
+) -> Dict[str, np.ndarray]:
+    """Metric sums per (metric, days) aligned to the frame's rows, in one grouped query (per id chunk if scoped)."""
+    if not windows:
+        return {}
+    today = date.today()
+    longest = max(days for _, days in windows)
+    # Only windows shorter than the scanned range need a conditional sum
+    sums = [
+        func.sum(getattr(DailyMetric, metric)) if days == longest else
+        func.sum(case((DailyMetric.date >= today - timedelta(days=days), getattr(DailyMetric, metric)), else_=0))
+        for metric, days in windows
+    ]
+    query = select(DailyMetric.ref_id, *sums).where(
+        DailyMetric.level == level,
+        DailyMetric.date >= today - timedelta(days=longest)
+    ).group_by(DailyMetric.ref_id)
+    if ids is None:
+        rows = db.execute(query).all()
+    else:
+        rows = [row for chunk in _chunks(ids) for row in db.execute(query.where(DailyMetric.ref_id.in_(chunk)))]
+
+    names = [f"{metric}_{days}d" for metric, days in windows]
+    totals = {name: np.zeros(len(frame)) for name in names}
+    if not rows:
+        return totals
+
+    values = np.array([row[1:] for row in rows], dtype=float)
+    frame_rows = frame.rows_of([row[0] for row in rows])
+    known = frame_rows >= 0
+    for position, name in enumerate(names):
+        totals[name][frame_rows[known]] = np.nan_to_num(values[known, position])
+    return totals
@@ -0,0 +1,164 @@
+"""
+Scheduled sync of every connected ad account.
+
+Each ACTIVE connection becomes a sequence of work units, one per sync stage,
+which run on a bounded thread pool. A unit needs a slot from its platform's
+semaphore and then from the global pool. Both semaphores wake waiters in
+FIFO order, and an account rejoins the back of the queue after every unit,
+so accounts are served round-robin and one large account can't hold more
+than one worker at a time.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from ads.client import ads_client
+from ads.providers import ProviderManager
+from database import SessionLocal
+from models_vault import AdAccountConnection, ConnectionStatus
+from services.sync_service import SyncOrchestrator, STAGES
+from services.token_service import TokenService
+
+logger = logging.getLogger(__name__)
+
+# Platforms with a sync pipeline; other connections are skipped
+SYNCABLE_PLATFORMS = {"google_ads"}
+
+MAX_WORKERS = int(os.getenv("ACCOUNT_SYNC_MAX_WORKERS", "8"))
+DEFAULT_PLATFORM_CONCURRENCY = 4
+
+
+def platform_limits() -> Dict[str, int]:
+    """Per-platform concurrent account limits from ACCOUNT_SYNC_PLATFORM_CONCURRENCY, e.g. 'google_ads=4'."""
+    limits = {}
+    for entry in os.getenv("ACCOUNT_SYNC_PLATFORM_CONCURRENCY", "").split(","):
+        if "=" in entry:
+            platform, limit = entry.split("=", 1)
+            limits[platform.strip()] = max(int(limit), 1)
+    return limits
+
+
+class AccountSyncService:
+    """Fans sync out over all active ad account connections."""
+
+    @staticmethod
+    async def sync_active_connections(db: Session, max_workers: int = MAX_WORKERS) -> dict:
+        """
+        Sync every ACTIVE connection on a syncable platform.
+
+        Args:
+            db: Session used to list the connections; each unit opens its own
+                session for tokens, since refreshing one commits
+            max_workers: Accounts syncing at the same time across all platforms
+
+        Returns:
+            Per-account results keyed by connection ID
+        """
+        connections = db.query(AdAccountConnection).filter(
+            AdAccountConnection.status == ConnectionStatus.ACTIVE
+        ).all()
+
+        accounts = [
+            (c.id, c.platform.name.value, c.account_name)
+            for c in connections if c.platform.name.value in SYNCABLE_PLATFORMS
+        ]
+        if not accounts:
+            logger.debug("No active connections to sync")
+            return {}
+
+        limits = platform_limits()
+        platform_slots = {
+            platform: asyncio.Semaphore(limits.get(platform, DEFAULT_PLATFORM_CONCURRENCY))
+            for platform in {platform for _, platform, _ in accounts}
+        }
+        worker_slots = asyncio.Semaphore(max_workers)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="account-sync")
+
+        logger.info(f"Syncing {len(accounts)} connected accounts with {max_workers} workers")
+
+        try:
+            results = await asyncio.gather(*(
+                AccountSyncService._sync_connection(
+                    connection_id, account_name, platform_slots[platform], worker_slots, executor
+                )
+                for connection_id, platform, account_name in accounts
+            ))
+        finally:
+            executor.shutdown(wait=False)
+
+        failed = sum(1 for result in results if result["status"] != "success")
+        logger.info(f"Account sync complete: {len(results) - failed} succeeded, {failed} failed")
+        return {connection_id: result for (connection_id, _, _), result in zip(accounts, results)}
+
+    @staticmethod
+    async def _sync_connection(
+        connection_id: str,
+        account_name: str,
+        platform_slot: asyncio.Semaphore,
+        worker_slot: asyncio.Semaphore,
+        executor: ThreadPoolExecutor,
+    ) -> dict:
+        """Run one account's stages in dependency order, one unit per slot acquisition."""
+        loop = asyncio.get_running_loop()
+        customer_id = None
+        stages: Dict[str, dict] = {}
+        started = time.monotonic()
+
+        try:
+            db = SessionLocal()
+            try:
+                connection = db.get(AdAccountConnection, connection_id)
+                customer_id = connection.external_account_id.replace("-", "")
+                app_cred = TokenService.get_connection_credentials(connection)
+            finally:
+                db.close()
+
+            for stage in STAGES:
+                async with platform_slot, worker_slot:
+                    # Fetched per unit so long fan-outs never run on an expired token
+                    db = SessionLocal()
+                    try:
+                        access_token = await TokenService.get_valid_access_token(db, connection_id)
+                    finally:
+                        db.close()
+                    stages[stage] = await loop.run_in_executor(
+                        executor, AccountSyncService._run_stage, customer_id, stage, access_token, app_cred
+                    )
+
+            return {
+                "status": "success",
+                "customer_id": customer_id,
+                "stages": stages,
+                "elapsed_seconds": round(time.monotonic() - started, 3),
+            }
+
+        except Exception as e:
+            logger.error(f"Sync failed for {account_name} ({customer_id}): {e}", exc_info=True)
+            return {
+                "status": "error",
+                "customer_id": customer_id,
+                "stages": stages,
+                "error": str(e),
+            }
+
+    @staticmethod
+    def _run_stage(customer_id: str, stage: str, access_token: str, app_cred) -> dict:
+        """Sync one stage of one account on a worker thread with its own session."""
+        client = ProviderManager.get_provider("google_ads").build_client(access_token, app_cred)
+        db = SessionLocal()
+
+        try:
+            orchestrator = SyncOrchestrator(
+                db,
+                customer_id,
+                lambda query, cid: ads_client.iter_query(query, cid, client=client),
+            )
+            return orchestrator.run([stage])[stage]
+        finally:
+            db.close()
@@ -0,0 +1,287 @@
+"""
+Set-based bulk upserts for sync ingestion.
+
+Rows are buffered per table and written one chunk at a time as a single
+executemany of INSERT ... ON CONFLICT DO UPDATE, so the number of database
+round trips scales with the number of chunks instead of the number of GAQL
+rows, and the statement is compiled once per table.
+
+Rows of a table registered with a merge callback are also merged across
+chunks: when a key comes back after its first row was written, the stored
+row is read back and merged with the new one instead of being overwritten.
+
+Tables with after_write callbacks only update rows whose values change, and
+report the keys each chunk actually inserted or changed (via RETURNING; where
+the database can't return them, every written row is reported).
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import and_, bindparam, func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Keys per IN (...) read-back of rows that a later chunk merges into
+LOOKUP_CHUNK_SIZE = 500
+
+# SQLite only understands ON CONFLICT ... DO UPDATE from 3.24 onwards
+SQLITE_SUPPORTS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+# ... and RETURNING from 3.35 onwards
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+@dataclass
+class _TableBuffer:
+    """Pending rows and conflict policy for one table."""
+    model: Any
+    key_columns: List[str]
+    update_columns: Sequence[str]
+    keep_max: Sequence[str]
+    merge: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]]
+    update_where: Optional[Callable[[Any, Any], Any]] = None
+    rows: Dict[tuple, Dict[str, Any]] = field(default_factory=dict)
+    before_write: List[Callable[[List[Dict[str, Any]]], None]] = field(default_factory=list)
+    after_write: List[Callable[[List[Dict[str, Any]]], None]] = field(default_factory=list)
+    # Keys written since the last forget_written(), for tables with a merge callback
+    written_keys: Set[tuple] = field(default_factory=set)
+
+
+class UpsertBuffer:
+    """
+    Buffers rows per table and flushes them as multi-row upserts.
+
+    Tables are flushed in registration order, so register parents (campaigns)
+    before children (ad groups, keywords, metrics) to keep foreign keys valid.
+    Rows sharing a primary key inside a chunk are collapsed before writing,
+    either with the registered ``merge`` callback or by letting the last row win.
+    With ``merge``, a key already written by an earlier chunk is merged into
+    the stored row too, until forget_written() is called.
+
+    With ``commit=True`` every flush is committed, which keeps transactions
+    and session memory bounded while streaming large GAQL results.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, commit: bool = False):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.commit = commit
+        self.chunks_written = 0
+        self.written: Dict[str, int] = {}
+        self._tables: Dict[Any, _TableBuffer] = {}
+
+    def register(
+        self,
+        model,
+        update_columns: Sequence[str] = (),
+        keep_max: Sequence[str] = (),
+        merge: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None,
+        key_columns: Optional[Sequence[str]] = None,
+        update_where: Optional[Callable[[Any, Any], Any]] = None,
+    ) -> "UpsertBuffer":
+        """
+        Register a model for buffering.
+
+        Args:
+            model: Declarative model class to write
+            update_columns: Columns overwritten from the incoming row on conflict
+            keep_max: Columns that only ever move forward (e.g. last_seen dates)
+            merge: Optional callback combining two rows with the same key, within
+                and across chunks
+            key_columns: Unique columns conflicts are detected on; defaults to the primary key
+            update_where: Callback (current columns, incoming columns) returning the
+                condition an existing row must meet to be updated
+
+        With no update or keep_max columns, conflicting rows are left untouched.
+        """
+        self._tables[model] = _TableBuffer(
+            model=model,
+            key_columns=list(key_columns or [c.name for c in model.__table__.primary_key.columns]),
+            update_columns=list(update_columns),
+            keep_max=list(keep_max),
+            merge=merge,
+            update_where=update_where,
+        )
+        self.written.setdefault(model.__tablename__, 0)
+        return self
+
+    def before_write(self, model, callback: Callable[[List[Dict[str, Any]]], None]) -> "UpsertBuffer":
+        """
+        Run a callback over each chunk of a registered model's rows just before it is written.
+
+        Callbacks run in the order they were added. A callback may fill in
+        extra columns; it must set the same keys on every row.
+        """
+        self._tables[model].before_write.append(callback)
+        return self
+
+    def after_write(self, model, callback: Callable[[List[Dict[str, Any]]], None]) -> "UpsertBuffer":
+        """
+        Run a callback over the rows each chunk of a registered model inserted or changed.
+
+        From then on, conflicting rows whose update would leave every column as
+        it is are not updated. The callback gets each affected row's key
+        columns, in the chunk's transaction.
+        """
+        self._tables[model].after_write.append(callback)
+        return self
+
+    def has(self, model) -> bool:
+        """Whether a model is registered."""
+        return model in self._tables
+
+    def add(self, model, row: Dict[str, Any]):
+        """Buffer a row, flushing every table once this one reaches a full chunk."""
+        buffer = self._tables[model]
+        key = tuple(row[c] for c in buffer.key_columns)
+
+        existing = buffer.rows.get(key)
+        if existing is not None:
+            if buffer.merge:
+                row = buffer.merge(existing, row)
+            for column in buffer.keep_max:
+                if existing.get(column) is not None and (row.get(column) is None or existing[column] > row[column]):
+                    row[column] = existing[column]
+
+        buffer.rows[key] = row
+
+        if len(buffer.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write all pending rows, parents first."""
+        wrote = False
+        for buffer in self._tables.values():
+            if not buffer.rows:
+                continue
+            if buffer.merge:
+                rows = self._merge_written(buffer)
+            else:
+                rows = list(buffer.rows.values())
+            buffer.rows.clear()
+            for callback in buffer.before_write:
+                callback(rows)
+            self._write(buffer, rows)
+            self.written[buffer.model.__tablename__] += len(rows)
+            wrote = True
+
+        if wrote:
+            self.chunks_written += 1
+            if self.commit:
+                self.db.commit()
+
+    def forget_written(self):
+        """
+        Flush, then stop merging into rows written so far.
+
+        Call once no more rows for the written keys can arrive, e.g. at the end
+        of a sync date slice; this keeps the remembered keys bounded.
+        """
+        self.flush()
+        for buffer in self._tables.values():
+            buffer.written_keys.clear()
+
+    def _merge_written(self, buffer: _TableBuffer) -> List[Dict[str, Any]]:
+        """Pending rows, with keys written by an earlier chunk merged into their stored rows."""
+        repeated = [key for key in buffer.rows if key in buffer.written_keys]
+        if repeated:
+            table = buffer.model.__table__
+            columns = [table.c[name] for name in next(iter(buffer.rows.values()))]
+            key = tuple_(*[table.c[name] for name in buffer.key_columns])
+            for start in range(0, len(repeated), LOOKUP_CHUNK_SIZE):
+                for stored in self.db.execute(
+                    select(*columns).where(key.in_(repeated[start:start + LOOKUP_CHUNK_SIZE]))
+                ).mappings():
+                    stored_key = tuple(stored[name] for name in buffer.key_columns)
+                    buffer.rows[stored_key] = buffer.merge(dict(stored), buffer.rows[stored_key])
+        buffer.written_keys.update(buffer.rows)
+        return list(buffer.rows.values())
+
+    def _write(self, buffer: _TableBuffer, rows: List[Dict[str, Any]]):
+        # One cached statement executed over all rows; the driver batches the
+        # executemany, so no per-chunk multi-row VALUES clause is compiled
+        table = buffer.model.__table__
+        dialect = self.db.get_bind().dialect.name
+        track = bool(buffer.after_write)
+        changed = rows
+
+        if dialect == "postgresql" or SQLITE_SUPPORTS_UPSERT:
+            insert, greatest = (pg_insert, func.greatest) if dialect == "postgresql" else (sqlite_insert, func.max)
+            stmt = self._upsert_statement(insert(table), buffer, greatest, only_changes=track)
+            if track and (dialect == "postgresql" or SQLITE_SUPPORTS_RETURNING):
+                # Skipped conflicts return nothing, so these are the inserted and changed rows
+                keys = [table.c[name] for name in buffer.key_columns]
+                changed = [dict(row._mapping) for row in self.db.execute(stmt.returning(*keys), rows)]
+            else:
+                self.db.execute(stmt, rows)
+        else:
+            # Insert new keys, then update existing rows in place; OR REPLACE
+            # would reset every column missing from the batch to its default
+            self.db.execute(sqlite_insert(table).prefix_with("OR IGNORE"), rows)
+            if buffer.update_columns or buffer.keep_max:
+                self.db.execute(
+                    self._fallback_update_statement(buffer, rows[0]),
+                    [{f"incoming_{name}": value for name, value in row.items()} for row in rows]
+                )
+
+        for callback in buffer.after_write:
+            callback(changed)
+
+    @staticmethod
+    def _upsert_statement(stmt, buffer: _TableBuffer, greatest, only_changes: bool = False):
+        table = buffer.model.__table__
+
+        set_ = {column: stmt.excluded[column] for column in buffer.update_columns}
+        for column in buffer.keep_max:
+            current = func.coalesce(table.c[column], stmt.excluded[column])
+            set_[column] = greatest(current, stmt.excluded[column])
+
+        if not set_:
+            return stmt.on_conflict_do_nothing(index_elements=buffer.key_columns)
+
+        where = buffer.update_where(table.c, stmt.excluded) if buffer.update_where else None
+        if only_changes:
+            changes = or_(*[table.c[column].is_distinct_from(value) for column, value in set_.items()])
+            where = changes if where is None else and_(where, changes)
+
+        if "updated_at" in table.c and "updated_at" not in set_:
+            set_["updated_at"] = func.now()
+
+        return stmt.on_conflict_do_update(index_elements=buffer.key_columns, set_=set_, where=where)
+
+    @staticmethod
+    def _fallback_update_statement(buffer: _TableBuffer, sample: Dict[str, Any]):
+        """UPDATE applying _upsert_statement's conflict policy, with incoming_<column> bind parameters."""
+        table = buffer.model.__table__
+        incoming = _IncomingColumns(
+            (name, bindparam(f"incoming_{name}", type_=table.c[name].type)) for name in sample
+        )
+
+        values = {column: incoming[column] for column in buffer.update_columns}
+        for column in buffer.keep_max:
+            values[column] = func.max(func.coalesce(table.c[column], incoming[column]), incoming[column])
+        if "updated_at" in table.c and "updated_at" not in values:
+            values["updated_at"] = func.now()
+
+        conditions = [table.c[name] == incoming[name] for name in buffer.key_columns]
+        if buffer.update_where:
+            conditions.append(buffer.update_where(table.c, incoming))
+        return table.update().where(and_(*conditions)).values(values)
+
+
+class _IncomingColumns(dict):
+    """Incoming row values by column name, readable like ``excluded`` (row.name or row["name"])."""
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
@@ -4,7 +4,6 @@ import json
 from typing import Dict, Optional
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
 import logging
 
 logger = logging.getLogger(__name__)
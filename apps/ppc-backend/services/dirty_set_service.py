@@ -0,0 +1,102 @@
+"""
+Dirty set of entities whose recommendations may have changed.
+
+Sync writes and ICP score writes mark the campaigns, keywords and search
+terms they change in dirty_entities, in the same transaction as the change.
+A sync only marks entities whose row or daily metrics it inserted or
+actually changed, so re-syncing unchanged data leaves the set empty.
+Incremental recommendation regeneration reads the marks, re-evaluates only
+those entities (and their parents), then clears exactly the marks it read,
+so anything marked again in the meantime stays dirty.
+"""
+
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy import and_, bindparam
+from sqlalchemy.orm import Session
+import logging
+
+from models import Campaign, Keyword, SearchTerm, DailyMetric, DirtyEntity
+from services.bulk_upsert import UpsertBuffer
+
+logger = logging.getLogger(__name__)
+
+# Entity tables and the daily_metrics level of each
+MODEL_LEVELS = {Campaign: "campaign", Keyword: "keyword", SearchTerm: "search_term"}
+
+DIRTY_LEVELS = tuple(MODEL_LEVELS.values())
+
+# ref_id marking every entity of a level, e.g. after all scores were cleared
+ALL = "*"
+
+
+class DirtySetService:
+    """Records changed entities and hands them to incremental regeneration."""
+
+    @staticmethod
+    def mark(db: Session, level: str, ids: Iterable[str]):
+        """Mark entities of a level as changed (not committed)."""
+        marked_at = datetime.utcnow()
+        upserts = UpsertBuffer(db).register(DirtyEntity, update_columns=["marked_at"])
+        for ref_id in set(ids):
+            upserts.add(DirtyEntity, {"level": level, "ref_id": ref_id, "marked_at": marked_at})
+        upserts.flush()
+
+    @staticmethod
+    def mark_all(db: Session, level: str):
+        """Mark every entity of a level as changed (not committed)."""
+        DirtySetService.mark(db, level, [ALL])
+
+    @staticmethod
+    def track(upserts: UpsertBuffer):
+        """Mark the entities whose rows or metrics an UpsertBuffer inserts or changes, chunk by chunk."""
+        for model, level in MODEL_LEVELS.items():
+            if upserts.has(model):
+                upserts.after_write(model, partial(_mark_entity_rows, upserts.db, level))
+        if upserts.has(DailyMetric):
+            upserts.after_write(DailyMetric, partial(_mark_metric_rows, upserts.db))
+
+    @staticmethod
+    def pending(db: Session) -> List[Tuple[str, str, datetime]]:
+        """Every current mark as (level, ref_id, marked_at)."""
+        return [tuple(row) for row in db.query(DirtyEntity.level, DirtyEntity.ref_id, DirtyEntity.marked_at)]
+
+    @staticmethod
+    def clear(db: Session, marks: List[Tuple[str, str, datetime]]):
+        """Remove marks read by pending(), keeping any that were renewed since (not committed)."""
+        if not marks:
+            return
+        table = DirtyEntity.__table__
+        db.execute(
+            table.delete().where(and_(
+                table.c.level == bindparam("mark_level"),
+                table.c.ref_id == bindparam("mark_ref_id"),
+                table.c.marked_at == bindparam("mark_marked_at"),
+            )),
+            [
+                {"mark_level": level, "mark_ref_id": ref_id, "mark_marked_at": marked_at}
+                for level, ref_id, marked_at in marks
+            ]
+        )
+
+    @staticmethod
+    def by_level(marks: Iterable[Tuple[str, str, Any]]) -> Dict[str, set]:
+        """Marked ids per level."""
+        ids = {level: set() for level in DIRTY_LEVELS}
+        for level, ref_id, _ in marks:
+            ids.setdefault(level, set()).add(ref_id)
+        return ids
+
+
+def _mark_entity_rows(db: Session, level: str, rows: List[Dict[str, Any]]):
+    DirtySetService.mark(db, level, (row["id"] for row in rows))
+
+
+def _mark_metric_rows(db: Session, rows: List[Dict[str, Any]]):
+    ids: Dict[str, set] = {}
+    for row in rows:
+        if row["level"] in DIRTY_LEVELS:
+            ids.setdefault(row["level"], set()).add(row["ref_id"])
+    for level, level_ids in ids.items():
+        DirtySetService.mark(db, level, level_ids)
@@ -0,0 +1,136 @@
+"""
+Cached ICP scoring.
+
+Score and rationale depend only on the normalized text and the lexicons, so
+they are stored per (text hash, lexicon version) in icp_score_cache with an
+in-process LRU in front. Confidence depends on clicks and is computed per
+row. Each distinct text costs at most one cache lookup, and only texts never
+scored under the current lexicons reach the scorer.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import IcpScoreCache
+from services.bulk_upsert import UpsertBuffer
+from services.icp_service import IcpLexicon, IcpScores, DEFAULT_LEXICON, normalize_text, score_batch, confidence_batch
+
+logger = logging.getLogger(__name__)
+
+# (text hash, lexicon version) entries kept in process
+CACHE_SIZE = int(os.getenv("ICP_SCORE_CACHE_SIZE", "100000"))
+
+# Hashes per IN (...) lookup against icp_score_cache
+LOOKUP_CHUNK_SIZE = 500
+
+_lru: "OrderedDict[Tuple[str, str], Tuple[int, str]]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+class IcpCacheService:
+    """Scores texts through the persistent ICP score cache."""
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Cache key for a text: sha256 of its normalized form."""
+        return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+    @staticmethod
+    def score_texts(
+        db: Session,
+        texts: Sequence[str],
+        clicks: Sequence[int],
+        lexicon: IcpLexicon = DEFAULT_LEXICON
+    ) -> IcpScores:
+        """
+        Score texts, reusing cached results for any text seen before.
+
+        Args:
+            db: Database session; new cache rows are added but not committed
+            texts: Keyword or search term texts
+            clicks: Clicks per text, used for confidence
+            lexicon: Lexicon version to score against
+
+        Returns:
+            IcpScores aligned with texts
+        """
+        lexicon_version = lexicon.version
+
+        # One entry per distinct normalized text
+        hashes = [IcpCacheService.text_hash(text) for text in texts]
+        distinct: Dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            distinct.setdefault(text_hash, text)
+
+        resolved = IcpCacheService._from_lru(distinct, lexicon_version)
+        resolved.update(IcpCacheService._from_table(
+            db, [h for h in distinct if h not in resolved], lexicon_version
+        ))
+
+        missing = [h for h in distinct if h not in resolved]
+        if missing:
+            scored = score_batch([distinct[h] for h in missing], [0] * len(missing), [0] * len(missing), lexicon)
+            upserts = UpsertBuffer(db).register(IcpScoreCache)
+            for text_hash, score, rationale in zip(missing, scored.scores.tolist(), scored.rationales):
+                resolved[text_hash] = (score, rationale)
+                upserts.add(IcpScoreCache, {
+                    "text_hash": text_hash,
+                    "lexicon_version": lexicon_version,
+                    "icp_score": score,
+                    "icp_rationale": rationale,
+                })
+            upserts.flush()
+
+        IcpCacheService._remember(
+            {h: resolved[h] for h in distinct}, lexicon_version
+        )
+        logger.debug(
+            f"ICP cache: {len(texts)} texts, {len(distinct)} distinct, {len(missing)} scored"
+        )
+
+        return IcpScores(
+            scores=np.array([resolved[h][0] for h in hashes], dtype=np.int64),
+            rationales=[resolved[h][1] for h in hashes],
+            confidences=confidence_batch(clicks),
+        )
+
+    @staticmethod
+    def _from_lru(distinct: Dict[str, str], lexicon_version: str) -> Dict[str, Tuple[int, str]]:
+        found = {}
+        with _lru_lock:
+            for text_hash in distinct:
+                entry = _lru.get((text_hash, lexicon_version))
+                if entry is not None:
+                    _lru.move_to_end((text_hash, lexicon_version))
+                    found[text_hash] = entry
+        return found
+
+    @staticmethod
+    def _from_table(db: Session, hashes: List[str], lexicon_version: str) -> Dict[str, Tuple[int, str]]:
+        found = {}
+        for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            rows = db.query(
+                IcpScoreCache.text_hash, IcpScoreCache.icp_score, IcpScoreCache.icp_rationale
+            ).filter(
+                IcpScoreCache.lexicon_version == lexicon_version,
+                IcpScoreCache.text_hash.in_(hashes[start:start + LOOKUP_CHUNK_SIZE])
+            ).all()
+            for text_hash, score, rationale in rows:
+                found[text_hash] = (score, rationale)
+        return found
+
+    @staticmethod
+    def _remember(entries: Dict[str, Tuple[int, str]], lexicon_version: str):
+        with _lru_lock:
+            for text_hash, entry in entries.items():
+                _lru[(text_hash, lexicon_version)] = entry
+                _lru.move_to_end((text_hash, lexicon_version))
+            while len(_lru) > CACHE_SIZE:
+                _lru.popitem(last=False)
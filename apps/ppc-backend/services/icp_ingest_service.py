@@ -0,0 +1,77 @@
+"""
+ICP scoring on ingest.
+
+With score-on-ingest enabled, sync scores keywords and search terms in its
+write path. Just before a chunk is upserted, the rows whose ids aren't in the
+table yet are scored in memory with the active, already compiled lexicon and
+inserted with their scores. Rows that already exist carry empty score
+columns, which the upsert never updates, so their scores are left alone.
+"""
+
+from functools import partial
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+import os
+import logging
+
+from services.bulk_upsert import UpsertBuffer
+from services.icp_lexicon_service import IcpLexiconService, DEFAULT_TENANT
+from services.icp_service import score_batch
+from services.icp_stats_service import IcpStatsService, LEVEL_MODELS
+
+logger = logging.getLogger(__name__)
+
+SCORE_ON_INGEST = os.getenv("SYNC_SCORE_ON_INGEST", "").lower() in ("1", "true", "yes")
+
+# Ids per IN (...) lookup of existing rows
+LOOKUP_CHUNK_SIZE = 500
+
+SCORE_COLUMNS = ("icp_score", "icp_rationale", "icp_confidence", "icp_lexicon_version")
+
+
+class IcpIngestScorer:
+    """Scores newly inserted keywords and search terms as an UpsertBuffer writes them."""
+
+    def __init__(self, db: Session, tenant: str = DEFAULT_TENANT):
+        self.db = db
+        self.lexicon = IcpLexiconService.get_active(db, tenant)
+        self.scored: Dict[str, int] = {}
+
+    def attach(self, upserts: UpsertBuffer):
+        """Score the buffer's Keyword and SearchTerm chunks before they are written."""
+        for model in LEVEL_MODELS.values():
+            if upserts.has(model):
+                upserts.before_write(model, partial(self.score_new_rows, model))
+
+    def score_new_rows(self, model, rows: List[Dict[str, Any]]):
+        """Fill score columns on rows not yet in the table, and blank them on the rest."""
+        ids = [row["id"] for row in rows]
+        existing = set()
+        for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            existing.update(
+                item_id for (item_id,) in self.db.query(model.id).filter(
+                    model.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])
+                )
+            )
+
+        # Every row needs the same keys for the bulk write
+        for row in rows:
+            row.update(dict.fromkeys(SCORE_COLUMNS))
+
+        new_rows = [row for row in rows if row["id"] not in existing]
+        if not new_rows:
+            return
+
+        # New rows have no metrics history yet
+        results = score_batch([row["text"] for row in new_rows], [0] * len(new_rows), [0] * len(new_rows), self.lexicon)
+        scores = results.scores.tolist()
+        for row, score, rationale, confidence in zip(new_rows, scores, results.rationales, results.confidences.tolist()):
+            row.update(
+                icp_score=score,
+                icp_rationale=rationale,
+                icp_confidence=confidence,
+                icp_lexicon_version=self.lexicon.version,
+            )
+
+        IcpStatsService.record_inserted(self.db, model, scores)
+        self.scored[model.__tablename__] = self.scored.get(model.__tablename__, 0) + len(new_rows)
@@ -0,0 +1,289 @@
+"""
+Versioned ICP lexicons and incremental re-scoring.
+
+Lexicons are published as content-hashed versions in icp_lexicons, with one
+active version per tenant, and every score records the version it was
+computed with. A text's score and rationale depend only on the first
+matching term of each category, so moving to a new version can only change
+texts that match a term that was added, removed or reordered. Candidates are
+narrowed in SQL to texts containing a required fragment of each changed term,
+then checked with a diff matcher compiled from those terms: rows it matches
+are re-scored, and every other row only has its version relabeled with one
+UPDATE. With the n-gram similarity signal enabled every row depends on every
+term, so all rows are re-scored. Publishing queues the re-score as a
+background score job (see score_job_service).
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence
+from sqlalchemy import false, func, or_
+from sqlalchemy.orm import Session
+import json
+import os
+import logging
+
+import numpy as np
+
+from models import IcpLexiconVersion, Keyword, SearchTerm
+from services.icp_cache_service import IcpCacheService
+from services.icp_matcher import LexiconMatcher, required_fragments
+from services.icp_service import IcpLexicon, DEFAULT_LEXICON, normalize_text, write_icp_scores
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+# Rows read per keyset page while re-scoring
+RESCORE_PAGE_SIZE = int(os.getenv("ICP_RESCORE_PAGE_SIZE", "5000"))
+
+# Beyond this many LIKE fragments the candidate prefilter costs more than it saves
+RESCORE_MAX_FRAGMENTS = int(os.getenv("ICP_RESCORE_MAX_FRAGMENTS", "200"))
+
+# Compiled lexicons by stored version; versions are content hashes, so never
+# stale. A row stored under an older matcher compiles to a different version.
+_compiled: Dict[str, IcpLexicon] = {DEFAULT_LEXICON.version: DEFAULT_LEXICON}
+
+
+def changed_terms(old: IcpLexicon, new: IcpLexicon) -> Dict[str, List[str]]:
+    """Per category, the terms whose addition, removal or reordering can change a text's first match."""
+    changed = {}
+    old_terms = old.terms()
+    for category, new_list in new.terms().items():
+        old_list = old_terms[category]
+        old_set, new_set = set(old_list), set(new_list)
+        terms = old_set ^ new_set
+        # Kept terms matter only if their relative order changed
+        if [t for t in old_list if t in new_set] != [t for t in new_list if t in old_set]:
+            terms |= old_set & new_set
+        changed[category] = sorted(terms)
+    return changed
+
+
+def impacted_texts(texts: Sequence[str], changed: Dict[str, List[str]]) -> np.ndarray:
+    """Boolean mask of texts matching any changed term."""
+    impacted = np.zeros(len(texts), dtype=bool)
+    if not any(changed.values()):
+        return impacted
+    matches = LexiconMatcher(changed).match_batch([normalize_text(text) for text in texts])
+    for positions in matches.values():
+        impacted |= positions >= 0
+    return impacted
+
+
+def candidate_filter(model, changed: Dict[str, List[str]]):
+    """
+    SQL filter for the rows that can match a changed term, or None to scan them all.
+
+    Every word of a term has to hit, so each term contributes the required
+    fragments of just one word: the one whose shortest fragment is longest.
+    """
+    fragments = set()
+    for terms in changed.values():
+        for term in terms:
+            words = term.lower().split()
+            if not words:
+                return None  # An empty term matches every text
+            word_fragments = [required_fragments(word) for word in words]
+            fragments.update(max(word_fragments, key=lambda pieces: min(len(piece) for piece in pieces)))
+
+    # SQLite's lower() only folds ASCII, so non-ASCII fragments could miss rows
+    if len(fragments) > RESCORE_MAX_FRAGMENTS or not all(fragment.isascii() for fragment in fragments):
+        return None
+    if not fragments:
+        return false()
+    text = func.lower(model.text)
+    return or_(*[text.contains(fragment, autoescape=True) for fragment in sorted(fragments)])
+
+
+class IcpLexiconService:
+    """Publishes lexicon versions and moves stored scores between them."""
+
+    @staticmethod
+    def get_active(db: Session, tenant: str = DEFAULT_TENANT) -> IcpLexicon:
+        """The tenant's active lexicon, or the built-in one if none was published."""
+        row = db.query(IcpLexiconVersion).filter(
+            IcpLexiconVersion.tenant == tenant,
+            IcpLexiconVersion.is_active.is_(True)
+        ).first()
+        return IcpLexiconService._compile(row) if row else DEFAULT_LEXICON
+
+    @staticmethod
+    def get_version(db: Session, version: Optional[str], tenant: str = DEFAULT_TENANT) -> Optional[IcpLexicon]:
+        """
+        A lexicon by version.
+
+        None for unversioned scores and for versions compiled by an older
+        matcher, since neither can be reproduced and diffed.
+        """
+        if version is None:
+            return None
+        if version in _compiled:
+            lexicon = _compiled[version]
+            return lexicon if lexicon.version == version else None
+
+        row = db.query(IcpLexiconVersion).filter(
+            IcpLexiconVersion.tenant == tenant,
+            IcpLexiconVersion.version == version
+        ).first()
+        lexicon = IcpLexiconService._compile(row) if row else IcpLexiconService.get_active(db, tenant)
+        return lexicon if lexicon.version == version else None
+
+    @staticmethod
+    def publish(
+        db: Session,
+        brand: List[str],
+        include: List[str],
+        exclude: List[str],
+        tenant: str = DEFAULT_TENANT
+    ) -> IcpLexicon:
+        """
+        Store a lexicon version and make it the tenant's active one.
+
+        Publishing the same terms again reactivates the existing version.
+        """
+        lexicon = IcpLexicon(list(brand), list(include), list(exclude))
+
+        row = db.query(IcpLexiconVersion).filter(
+            IcpLexiconVersion.tenant == tenant,
+            IcpLexiconVersion.version == lexicon.version
+        ).first()
+        if not row:
+            row = IcpLexiconVersion(
+                tenant=tenant,
+                version=lexicon.version,
+                brand_terms_json=json.dumps(lexicon.brand),
+                include_terms_json=json.dumps(lexicon.include),
+                exclude_terms_json=json.dumps(lexicon.exclude),
+            )
+            db.add(row)
+
+        db.query(IcpLexiconVersion).filter(
+            IcpLexiconVersion.tenant == tenant,
+            IcpLexiconVersion.version != lexicon.version
+        ).update({"is_active": False}, synchronize_session=False)
+        row.is_active = True
+        db.commit()
+
+        _compiled.setdefault(lexicon.version, lexicon)
+        logger.info(f"Published ICP lexicon {lexicon.version} for tenant {tenant}")
+        return lexicon
+
+    @staticmethod
+    def count_outdated(db: Session, version: str) -> int:
+        """Scored keywords and search terms labeled with any version but the given one."""
+        return sum(
+            db.query(model).filter(
+                model.icp_score.isnot(None),
+                or_(model.icp_lexicon_version.is_(None), model.icp_lexicon_version != version)
+            ).count()
+            for model in (Keyword, SearchTerm)
+        )
+
+    @staticmethod
+    def rescore(
+        db: Session,
+        tenant: str = DEFAULT_TENANT,
+        page_size: int = RESCORE_PAGE_SIZE,
+        on_progress: Optional[Callable[[int], None]] = None
+    ) -> dict:
+        """
+        Bring every scored keyword and search term to the tenant's active lexicon.
+
+        Rows are grouped by their stored version; rows that can match a changed
+        term are read in keyset pages and re-scored if they do, keeping their
+        confidences. Every write is committed as it goes and moves rows off
+        their old version, so an interrupted run picks up where it stopped.
+
+        Args:
+            on_progress: Called with the rows moved to the new version after each commit
+
+        Returns:
+            Per-table counts of candidate rows scanned, re-scored and relabeled
+        """
+        target = IcpLexiconService.get_active(db, tenant)
+        summary = {"version": target.version}
+
+        for name, model in (("keywords", Keyword), ("search_terms", SearchTerm)):
+            counts = {"scanned": 0, "rescored": 0, "relabeled": 0}
+
+            versions = [
+                version for (version,) in db.query(model.icp_lexicon_version).filter(
+                    model.icp_score.isnot(None)
+                ).distinct()
+                if version != target.version
+            ]
+
+            for version in versions:
+                source = IcpLexiconService.get_version(db, version, tenant)
+                # Unversioned scores and unknown versions can't be diffed, so all are
+                # re-scored; so is everything when the similarity signal is on, since
+                # any term change moves every text's similarities
+                changed = changed_terms(source, target) if source and target.similarity is None else None
+                in_version = model.icp_lexicon_version.is_(None) if version is None else model.icp_lexicon_version == version
+                candidates = [in_version, model.icp_score.isnot(None)]
+                narrowed = candidate_filter(model, changed) if changed is not None else None
+                if narrowed is not None:
+                    candidates.append(narrowed)
+
+                last_id = ""
+                while True:
+                    page = db.query(model.id, model.text).filter(
+                        *candidates,
+                        model.id > last_id
+                    ).order_by(model.id).limit(page_size).all()
+                    if not page:
+                        break
+                    last_id = page[-1].id
+
+                    impacted = np.ones(len(page), dtype=bool) if changed is None else \
+                        impacted_texts([item.text for item in page], changed)
+                    rescored = [page[i] for i in np.flatnonzero(impacted).tolist()]
+                    if rescored:
+                        results = IcpCacheService.score_texts(
+                            db, [item.text for item in rescored], [0] * len(rescored), target
+                        )
+                        write_icp_scores(
+                            db, model, [item.id for item in rescored], results,
+                            version=target.version, with_confidence=False
+                        )
+                        db.commit()
+                        if on_progress:
+                            on_progress(len(rescored))
+
+                    counts["scanned"] += len(page)
+                    counts["rescored"] += len(rescored)
+
+                # Everything left on the old version scores the same under the new one
+                relabeled = db.query(model).filter(
+                    in_version,
+                    model.icp_score.isnot(None)
+                ).update({"icp_lexicon_version": target.version}, synchronize_session=False)
+                db.commit()
+                counts["relabeled"] += relabeled
+                if on_progress:
+                    on_progress(relabeled)
+
+            summary[name] = counts
+            logger.info(
+                f"Re-scored {name} to lexicon {target.version}: "
+                f"{counts['rescored']} re-scored, {counts['relabeled']} relabeled of {counts['scanned']}"
+            )
+
+        return summary
+
+    @staticmethod
+    def to_dict(lexicon: IcpLexicon) -> dict:
+        return {"version": lexicon.version, **lexicon.terms()}
+
+    @staticmethod
+    def _compile(row: IcpLexiconVersion) -> IcpLexicon:
+        # Cached by row.version, so rows published under an older matcher
+        # (whose compiled version differs) are still only compiled once
+        lexicon = _compiled.get(row.version)
+        if lexicon is None:
+            lexicon = IcpLexicon(
+                json.loads(row.brand_terms_json),
+                json.loads(row.include_terms_json),
+                json.loads(row.exclude_terms_json),
+            )
+            lexicon = _compiled.setdefault(row.version, lexicon)
+        return lexicon
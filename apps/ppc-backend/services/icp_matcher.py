@@ -0,0 +1,303 @@
+"""
+Compiled, typo-tolerant ICP lexicon matching.
+
+A term matches a text when every word of the term is within its edit budget
+of some word of the text (optimal string alignment distance: insertions,
+deletions, substitutions and adjacent transpositions), or is that word minus
+an inflection suffix. Short words get no edits, so "learn" doesn't hit inside
+"elearning" and "course" never turns into "source", but plurals and
+inflections still match ("jobs", "courses", "learning"); long words such as
+"sourcegraph" tolerate typos.
+
+LexiconMatcher answers icp_service.fuzzy_match for every lexicon term at
+once. Lexicon words are indexed SymSpell-style by every string reachable
+with up to their budget of deletions; a text word generates its own
+deletions, looks them up, and only the few candidates found are verified
+with a real distance computation; its suffix-stripped stems are looked up
+directly. Each distinct text word is resolved once and cached.
+"""
+
+from itertools import combinations
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Bumped whenever match semantics change, so versioned scores are recomputed
+MATCHER_VERSION = 3
+
+MAX_EDITS = 2
+
+# Words shorter than this get no edits (inflections still match); one edit is
+# allowed up to the next threshold and two from there on
+ONE_EDIT_LENGTH = 8
+TWO_EDIT_LENGTH = 11
+
+# A text word also hits a lexicon word it equals after dropping one of these
+INFLECTION_SUFFIXES = ("s", "es", "'s", "ed", "er", "ers", "ing")
+MIN_STEM_LENGTH = 3
+
+# Distinct text words whose hits are memoized before the cache is reset
+TOKEN_CACHE_SIZE = 200_000
+
+# Texts per term-count block in match_batch (block rows x terms int32 counts)
+BATCH_BLOCK_SIZE = 65_536
+
+
+def edit_budget(word: str, max_edits: int = MAX_EDITS) -> int:
+    """Edits a lexicon word tolerates, by length."""
+    if len(word) >= TWO_EDIT_LENGTH:
+        budget = 2
+    elif len(word) >= ONE_EDIT_LENGTH:
+        budget = 1
+    else:
+        budget = 0
+    return min(budget, max_edits)
+
+
+def stems(token: str) -> Set[str]:
+    """The token with one inflection suffix removed, for each suffix it ends with."""
+    return {
+        token[:-len(suffix)] for suffix in INFLECTION_SUFFIXES
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH
+    }
+
+
+def word_matches(token: str, word: str, budget: int) -> bool:
+    """Whether a text word hits a lexicon word: within its edit budget, or an inflection of it."""
+    return edit_distance(token, word, budget) <= budget or word in stems(token)
+
+
+def required_fragments(word: str, max_edits: int = MAX_EDITS) -> List[str]:
+    """
+    Pieces of a lexicon word, at least one of which every text word hitting it contains.
+
+    Inflections contain the whole word. A typo within k edits leaves one of
+    2k + 1 consecutive pieces intact, since an edit touches at most two
+    adjacent pieces (a transposition across their boundary).
+    """
+    pieces = 2 * edit_budget(word, max_edits) + 1
+    bounds = [len(word) * i // pieces for i in range(pieces + 1)]
+    return [word[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+
+    previous_row: Optional[List[int]] = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+            if (
+                previous_row is not None and j > 1
+                and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous_row[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_row, row = row, current
+    return row[-1] if row[-1] <= limit else limit + 1
+
+
+def deletes(word: str, edits: int) -> Set[str]:
+    """Every string reachable from word with up to edits deletions, word included."""
+    found = {word}
+    for count in range(1, min(edits, len(word)) + 1):
+        for positions in combinations(range(len(word)), count):
+            skip = set(positions)
+            found.add("".join(char for index, char in enumerate(word) if index not in skip))
+    return found
+
+
+class LexiconMatcher:
+    """
+    Matches texts against ordered, named term lists in one pass per text.
+
+    Args:
+        lexicons: Category name -> terms, in priority order (e.g. {"brand": BRAND_TERMS})
+        max_edits: Cap on any word's edit budget
+    """
+
+    def __init__(self, lexicons: Dict[str, Sequence[str]], max_edits: int = MAX_EDITS):
+        self.lexicons = {name: list(terms) for name, terms in lexicons.items()}
+        self.max_edits = max_edits
+
+        words: List[str] = []
+        word_ids: Dict[str, int] = {}
+        # Per category: (term, word ids of the term, hits needed)
+        self._terms: Dict[str, List[Tuple[str, Tuple[int, ...], int]]] = {}
+        for name, terms in self.lexicons.items():
+            compiled = []
+            for term in terms:
+                ids = []
+                for word in term.lower().strip().split():
+                    if word not in word_ids:
+                        word_ids[word] = len(words)
+                        words.append(word)
+                    ids.append(word_ids[word])
+                # Every word of the term has to be found
+                compiled.append((term, tuple(ids), len(ids)))
+            self._terms[name] = compiled
+
+        self.words = words
+        self._budgets = [edit_budget(word, max_edits) for word in words]
+        self._query_edits = max(self._budgets, default=0)
+        self._word_ids = word_ids
+        # Longest text word that can still hit a lexicon word
+        self._max_token_length = max((len(word) for word in words), default=0) + max(
+            self._query_edits, max(len(suffix) for suffix in INFLECTION_SUFFIXES)
+        )
+
+        # Deletion index: every deletion variant -> lexicon words producing it
+        index: Dict[str, Set[int]] = {}
+        for word_id, word in enumerate(words):
+            for variant in deletes(word, self._budgets[word_id]):
+                index.setdefault(variant, set()).add(word_id)
+        self._deletes = {variant: frozenset(ids) for variant, ids in index.items()}
+
+        # Term positions each word contributes to, and the first term per
+        # category that matches with no hits at all (empty terms)
+        self._postings: List[List[Tuple[str, int]]] = [[] for _ in words]
+        self._first_free: Dict[str, int] = {}
+        for name, compiled in self._terms.items():
+            free = [position for position, (_, _, needed) in enumerate(compiled) if needed <= 0]
+            self._first_free[name] = free[0] if free else len(compiled)
+            for position, (_, ids, _) in enumerate(compiled):
+                for word_id in ids:
+                    self._postings[word_id].append((name, position))
+
+        self._no_hit_match = {
+            name: self._term_at(name, position) for name, position in self._first_free.items()
+        }
+        self._token_hits: Dict[str, FrozenSet[int]] = {}
+
+        # Column layout of the term-hit matrix used by match_batch
+        self._columns: Dict[str, Tuple[int, int]] = {}
+        needed: List[int] = []
+        for name, compiled in self._terms.items():
+            self._columns[name] = (len(needed), len(needed) + len(compiled))
+            needed.extend(term_needed for _, _, term_needed in compiled)
+        self._needed = np.array(needed, dtype=np.int32)
+        postings = [
+            [self._columns[name][0] + position for name, position in word_postings]
+            for word_postings in self._postings
+        ]
+        self._posting_counts = np.array([len(p) for p in postings], dtype=np.int64)
+        self._posting_starts = np.concatenate(([0], np.cumsum(self._posting_counts)[:-1])).astype(np.int64)
+        self._posting_terms = np.array([column for p in postings for column in p], dtype=np.int64)
+
+    def _term_at(self, name: str, position: int) -> Optional[str]:
+        compiled = self._terms[name]
+        return compiled[position][0] if position < len(compiled) else None
+
+    def token_hits(self, token: str) -> FrozenSet[int]:
+        """Ids of lexicon words within their edit budget of a single text word."""
+        hits = self._token_hits.get(token)
+        if hits is None and len(token) > self._max_token_length:
+            hits = frozenset()
+        if hits is None:
+            # Two words within k edits share a variant reachable with k deletions
+            # from each, so the token's deletions find every candidate
+            candidates: Set[int] = set()
+            for variant in deletes(token, self._query_edits):
+                found = self._deletes.get(variant)
+                if found:
+                    candidates |= found
+            hits = frozenset(
+                word_id for word_id in candidates
+                if edit_distance(token, self.words[word_id], self._budgets[word_id]) <= self._budgets[word_id]
+            ) | frozenset(self._word_ids[stem] for stem in stems(token) if stem in self._word_ids)
+            if len(self._token_hits) >= TOKEN_CACHE_SIZE:
+                self._token_hits.clear()
+            self._token_hits[token] = hits
+        return hits
+
+    def word_hits(self, text: str) -> Set[int]:
+        """Ids of lexicon words hit by any word of the lowercased text."""
+        hits: Set[int] = set()
+        cached = self._token_hits
+        for token in text.split():
+            found = cached.get(token)
+            if found is None:
+                found = self.token_hits(token)
+            if found:
+                hits |= found
+        return hits
+
+    def match(self, text: str) -> Dict[str, Optional[str]]:
+        """First matching term per category for a lowercased, stripped text."""
+        hits = self.word_hits(text)
+        if not hits:
+            return dict(self._no_hit_match)
+
+        counts: Dict[Tuple[str, int], int] = {}
+        for word_id in hits:
+            for key in self._postings[word_id]:
+                counts[key] = counts.get(key, 0) + 1
+
+        best = dict(self._first_free)
+        for (name, position), count in counts.items():
+            if position < best[name] and count >= self._terms[name][position][2]:
+                best[name] = position
+        return {name: self._term_at(name, position) for name, position in best.items()}
+
+    def match_batch(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        First matching term position per category for many lowercased, stripped texts.
+
+        Each text is tokenized once into (row, word) hits; term counts come
+        from expanding those hits through the word postings, so the per-text
+        Python work is only the word lookup.
+
+        Returns:
+            Category name -> int array of term positions into the category's
+            term list, -1 where nothing matched
+        """
+        rows: List[int] = []
+        words: List[int] = []
+        for row, text in enumerate(texts):
+            hits = self.word_hits(text)
+            rows.extend([row] * len(hits))
+            words.extend(hits)
+
+        rows_array = np.array(rows, dtype=np.int64)
+        words_array = np.array(words, dtype=np.int64)
+        result = {name: np.empty(len(texts), dtype=np.int64) for name in self._columns}
+
+        for block_start in range(0, len(texts), BATCH_BLOCK_SIZE):
+            block_end = min(block_start + BATCH_BLOCK_SIZE, len(texts))
+            lo, hi = np.searchsorted(rows_array, [block_start, block_end])
+            block = self._block_matches(rows_array[lo:hi] - block_start, words_array[lo:hi], block_end - block_start)
+            for name, positions in block.items():
+                result[name][block_start:block_end] = positions
+
+        return result
+
+    def _block_matches(self, rows: np.ndarray, words: np.ndarray, size: int) -> Dict[str, np.ndarray]:
+        n_terms = len(self._needed)
+
+        # Expand (row, word) hits into (row, term column) pairs, keeping repeats
+        # of a word within a term so counts line up with the term's word count
+        lengths = self._posting_counts[words]
+        total = int(lengths.sum())
+        term_rows = np.repeat(rows, lengths)
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        term_columns = self._posting_terms[np.repeat(self._posting_starts[words], lengths) + offsets]
+
+        counts = np.bincount(term_rows * n_terms + term_columns, minlength=size * n_terms).reshape(size, n_terms)
+        satisfied = counts >= self._needed
+
+        matches = {}
+        for name, (start, end) in self._columns.items():
+            columns = satisfied[:, start:end]
+            if end == start:
+                matches[name] = np.full(size, -1, dtype=np.int64)
+                continue
+            matches[name] = np.where(columns.any(axis=1), columns.argmax(axis=1), -1)
+        return matches
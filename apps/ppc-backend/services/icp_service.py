@@ -0,0 +1,402 @@
+"""
+ICP (ideal customer profile) scoring for keywords and search terms.
+
+calculate_icp_score scores a single text; score_batch scores many texts at
+once with the same rules and returns columnar results for bulk writes.
+Both default to the built-in lexicons below; score_batch also takes an
+IcpLexicon loaded from the versioned icp_lexicons table.
+
+With ICP_SIMILARITY_WEIGHT set, texts that match no include or exclude term
+are also compared with those terms by character n-gram similarity (see
+icp_similarity), and close matches move the score by up to that many points.
+"""
+
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from models import DailyMetric
+from services.dirty_set_service import DirtySetService, MODEL_LEVELS
+from services.icp_matcher import LexiconMatcher, MATCHER_VERSION, MAX_EDITS, edit_budget, word_matches
+from services.icp_similarity import NgramSimilarity, SIMILARITY_WEIGHT, SIMILARITY_THRESHOLD
+from services.icp_stats_service import IcpStatsService, level_of
+
+
+# ICP Lexicons from the spec
+BRAND_TERMS = [
+    "sourcegraph", "sourcegraph enterprise", "sourcegraph ai", "sourcegraph code search"
+]
+
+INCLUDE_TERMS = [
+    "semantic code search", "enterprise code search", "codebase search",
+    "code discovery", "code navigation", "code intelligence", "ai code assistant",
+    "repo search", "monorepo search", "code indexing", "search in code",
+    "large codebase", "semantic search code", "code understanding"
+]
+
+EXCLUDE_TERMS = [
+    "homework", "assignment", "tutorial", "course", "learn", "leetcode",
+    "job", "salary", "interview", "pdf", "definition", "free download",
+    "torrent", "crack", "cheat", "student"
+]
+
+
+LEXICON_CATEGORIES = ("brand", "include", "exclude")
+
+
+def lexicon_version(
+    brand: Sequence[str],
+    include: Sequence[str],
+    exclude: Sequence[str],
+    similarity_weight: float = 0.0,
+    similarity_threshold: float = SIMILARITY_THRESHOLD
+) -> str:
+    """Content hash identifying a set of lexicons and the matcher applying them; term order is significant."""
+    payload = [MATCHER_VERSION, list(brand), list(include), list(exclude)]
+    # Versions without the similarity signal hash as they did before it existed
+    if similarity_weight:
+        payload.append([similarity_weight, similarity_threshold])
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:16]
+
+
+@dataclass
+class IcpLexicon:
+    """One version of the brand/include/exclude term lists with its compiled matcher."""
+    brand: List[str]
+    include: List[str]
+    exclude: List[str]
+    similarity_weight: float = SIMILARITY_WEIGHT
+    similarity_threshold: float = SIMILARITY_THRESHOLD
+    version: str = field(init=False)
+    matcher: LexiconMatcher = field(init=False, repr=False)
+    similarity: Optional[NgramSimilarity] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.version = lexicon_version(
+            self.brand, self.include, self.exclude, self.similarity_weight, self.similarity_threshold
+        )
+        # Equivalent to calling fuzzy_match against every term
+        self.matcher = LexiconMatcher(self.terms())
+        self.similarity = NgramSimilarity(
+            {"include": self.include, "exclude": self.exclude}
+        ) if self.similarity_weight else None
+
+    def terms(self) -> Dict[str, List[str]]:
+        return {"brand": self.brand, "include": self.include, "exclude": self.exclude}
+
+
+# Compiled once; used wherever no lexicon version is given
+DEFAULT_LEXICON = IcpLexicon(BRAND_TERMS, INCLUDE_TERMS, EXCLUDE_TERMS)
+LEXICON_VERSION = DEFAULT_LEXICON.version
+ICP_MATCHER = DEFAULT_LEXICON.matcher
+
+
+def fuzzy_match(text: str, pattern: str, max_edits: int = MAX_EDITS) -> bool:
+    """
+    Typo-tolerant term matching: every pattern word must be within its edit
+    budget of some text word (see icp_matcher.edit_budget) or be that word
+    minus an inflection suffix.
+    """
+    text_words = text.lower().strip().split()
+    for p_word in pattern.lower().strip().split():
+        budget = edit_budget(p_word, max_edits)
+        if not any(word_matches(t_word, p_word, budget) for t_word in text_words):
+            return False
+    return True
+
+
+def calculate_icp_score(text: str, impressions: int = 0, clicks: int = 0) -> Tuple[int, str, float]:
+    """
+    Calculate ICP score for a keyword or search term.
+    Returns (score, rationale, confidence)
+    """
+    text_lower = text.lower().strip()
+    score = 50  # Start at neutral
+    rationale_parts = []
+    
+    # Same first-match-per-list semantics as fuzzy_match, in one pass over the text
+    matches = ICP_MATCHER.match(text_lower)
+    
+    # Brand match check (+40)
+    brand_term = matches["brand"]
+    if brand_term is not None:
+        score += 40
+        rationale_parts.append(f"Brand match: '{brand_term}' (+40)")
+    else:
+        rationale_parts.append("Brand: no")
+    
+    # Include terms check (+25)
+    include_term = matches["include"]
+    if include_term is not None:
+        score += 25
+        rationale_parts.append(f"Include match: '{include_term}' (+25)")
+    else:
+        rationale_parts.append("Include: none")
+    
+    # Exclude terms check (-30)
+    exclude_term = matches["exclude"]
+    if exclude_term is not None:
+        score -= 30
+        rationale_parts.append(f"Exclude match: '{exclude_term}' (-30)")
+    else:
+        rationale_parts.append("Exclude: none")
+    
+    # Free/open source without enterprise check (-15)
+    if ("free" in text_lower or "open source" in text_lower) and "enterprise" not in text_lower:
+        score -= 15
+        rationale_parts.append("Free/open source without enterprise (-15)")
+    
+    # Optional n-gram similarity for texts no include/exclude term matched
+    if DEFAULT_LEXICON.similarity is not None and include_term is None and exclude_term is None:
+        adjustments, notes = similarity_adjustments(DEFAULT_LEXICON, [text_lower])
+        if notes[0]:
+            score += int(adjustments[0])
+            rationale_parts.append(notes[0])
+    
+    # Clamp score to [0, 100]
+    score = max(0, min(100, score))
+    
+    # Calculate confidence based on clicks (more clicks = higher confidence)
+    confidence = min(1.0, math.log10(clicks + 10) / 2) if clicks > 0 else 0.5
+    
+    rationale = "; ".join(rationale_parts)
+    
+    return score, rationale, confidence
+
+
+@dataclass
+class IcpScores:
+    """Columnar ICP scores, aligned with the input texts."""
+    scores: np.ndarray  # int, 0-100
+    rationales: List[str]
+    confidences: np.ndarray  # float, 0-1
+
+    def __len__(self) -> int:
+        return len(self.rationales)
+
+
+def score_batch(
+    texts: Sequence[str],
+    impressions: Sequence[int],
+    clicks: Sequence[int],
+    lexicon: IcpLexicon = DEFAULT_LEXICON
+) -> IcpScores:
+    """
+    Score many texts at once; element-for-element identical to calculate_icp_score.
+
+    Args:
+        texts: Keyword or search term texts
+        impressions: Impressions per text (unused by the current rules)
+        clicks: Clicks per text, used for confidence
+        lexicon: Term lists to score against
+
+    Returns:
+        IcpScores aligned with texts
+    """
+    if not len(texts):
+        return IcpScores(scores=np.empty(0, dtype=np.int64), rationales=[], confidences=np.empty(0))
+
+    lowered = [normalize_text(text) for text in texts]
+    matches = lexicon.matcher.match_batch(lowered)
+    brand, include, exclude = matches["brand"], matches["include"], matches["exclude"]
+
+    free = np.fromiter(
+        (("free" in text or "open source" in text) and "enterprise" not in text for text in lowered),
+        dtype=bool, count=len(lowered),
+    )
+
+    scores = 50 + 40 * (brand >= 0) + 25 * (include >= 0) - 30 * (exclude >= 0) - 15 * free
+
+    notes: Dict[int, str] = {}
+    if lexicon.similarity is not None:
+        unmatched = np.flatnonzero((include < 0) & (exclude < 0))
+        adjustments, unmatched_notes = similarity_adjustments(lexicon, [lowered[i] for i in unmatched.tolist()])
+        scores[unmatched] += adjustments
+        notes = {row: note for row, note in zip(unmatched.tolist(), unmatched_notes) if note}
+
+    scores = np.clip(scores, 0, 100)
+
+    confidences = confidence_batch(clicks)
+
+    # Rationale only depends on which terms matched, so format each combination
+    # once; the combination space is small enough to index directly
+    include_codes, exclude_codes = len(lexicon.include) + 1, len(lexicon.exclude) + 1
+    code = ((brand + 1) * include_codes + include + 1) * exclude_codes + exclude + 1
+    code = code * 2 + free
+    table = np.empty(int(code.max()) + 1, dtype=object)
+    for combo in np.flatnonzero(np.bincount(code)).tolist():
+        rest, has_free = divmod(combo, 2)
+        rest, exclude_code = divmod(rest, exclude_codes)
+        brand_code, include_code = divmod(rest, include_codes)
+        table[combo] = _rationale(lexicon, brand_code - 1, include_code - 1, exclude_code - 1, has_free)
+    rationales = table[code].tolist()
+    for row, note in notes.items():
+        rationales[row] = f"{rationales[row]}; {note}"
+
+    return IcpScores(scores=scores, rationales=rationales, confidences=confidences)
+
+
+def similarity_adjustments(lexicon: IcpLexicon, lowered: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Score points and rationale notes from n-gram similarity to the include and exclude terms.
+
+    A category counts when its best similarity reaches the lexicon's
+    threshold and moves the score by similarity x weight points. Texts with
+    no close term get 0 and an empty note.
+    """
+    best = lexicon.similarity.similarities(lowered)
+    adjustments = np.zeros(len(lowered), dtype=np.int64)
+    notes = [""] * len(lowered)
+    for category, sign in (("include", 1), ("exclude", -1)):
+        similarity, positions = best[category]
+        points = np.rint(similarity * lexicon.similarity_weight).astype(np.int64)
+        close = (similarity >= lexicon.similarity_threshold) & (points > 0)
+        adjustments += sign * np.where(close, points, 0)
+        terms = getattr(lexicon, category)
+        for row in np.flatnonzero(close).tolist():
+            note = f"Similar to {category} term '{terms[positions[row]]}' ({sign * points[row]:+d})"
+            notes[row] = f"{notes[row]}; {note}" if notes[row] else note
+    return adjustments, notes
+
+
+def confidence_batch(clicks: Sequence[int]) -> np.ndarray:
+    """Confidence per click count, identical to calculate_icp_score's."""
+    clicks = np.asarray(clicks, dtype=np.int64)
+    if not len(clicks):
+        return np.empty(0)
+    # Confidence only depends on the click count, so compute it once per distinct value
+    distinct_clicks, click_index = np.unique(clicks, return_inverse=True)
+    distinct_confidence = np.array([
+        min(1.0, math.log10(value + 10) / 2) if value > 0 else 0.5 for value in distinct_clicks.tolist()
+    ])
+    return distinct_confidence[click_index.reshape(-1)]
+
+
+def normalize_text(text: str) -> str:
+    """The form of a text the ICP score depends on."""
+    return text.lower().strip()
+
+
+def _rationale(lexicon: IcpLexicon, brand: int, include: int, exclude: int, free: int) -> str:
+    """Rationale text for term positions (-1 = no match), as built by calculate_icp_score."""
+    return "; ".join([
+        f"Brand match: '{lexicon.brand[brand]}' (+40)" if brand >= 0 else "Brand: no",
+        f"Include match: '{lexicon.include[include]}' (+25)" if include >= 0 else "Include: none",
+        f"Exclude match: '{lexicon.exclude[exclude]}' (-30)" if exclude >= 0 else "Exclude: none",
+    ] + (["Free/open source without enterprise (-15)"] if free else []))
+
+
+def write_icp_scores(
+    db: Session,
+    model,
+    ids: Sequence[str],
+    results: IcpScores,
+    version: str = LEXICON_VERSION,
+    with_confidence: bool = True
+):
+    """
+    Write batch scores to Keyword or SearchTerm rows with one executemany UPDATE by primary key.
+
+    The score histogram and the recommendation dirty set are updated in the
+    same transaction.
+
+    Args:
+        db: Database session
+        model: Keyword or SearchTerm
+        ids: Primary keys aligned with results
+        results: Scores to write
+        version: Lexicon version the scores were computed with
+        with_confidence: Also write confidences (re-scoring keeps the stored ones)
+    """
+    if not len(ids):
+        return
+    scores = results.scores.tolist()
+    IcpStatsService.record_scores(db, model, ids, scores)
+    DirtySetService.mark(db, MODEL_LEVELS[model], ids)
+    rows = [
+        {"id": item_id, "icp_score": score, "icp_rationale": rationale, "icp_lexicon_version": version}
+        for item_id, score, rationale in zip(ids, scores, results.rationales)
+    ]
+    if with_confidence:
+        for row, confidence in zip(rows, results.confidences.tolist()):
+            row["icp_confidence"] = confidence
+    db.execute(update(model), rows)
+
+
+def clear_icp_scores(db: Session, model, ids: Optional[Sequence[str]] = None):
+    """
+    Clear ICP scores so the rows are scored again, keeping the score histogram in step.
+
+    Args:
+        db: Database session
+        model: Keyword or SearchTerm
+        ids: Rows to clear; all rows when omitted
+    """
+    cleared = {"icp_score": None, "icp_rationale": None, "icp_confidence": None, "icp_lexicon_version": None}
+    if ids is None:
+        IcpStatsService.record_cleared(db, level_of(model))
+        DirtySetService.mark_all(db, MODEL_LEVELS[model])
+        db.query(model).filter(model.icp_score.isnot(None)).update(cleared, synchronize_session=False)
+        return
+    if not len(ids):
+        return
+    IcpStatsService.record_scores(db, model, ids, [None] * len(ids))
+    DirtySetService.mark(db, MODEL_LEVELS[model], ids)
+    db.execute(update(model), [{"id": item_id, **cleared} for item_id in ids])
+
+
+def fetch_unscored(
+    db: Session,
+    model,
+    limit: int,
+    after_id: Optional[str] = None,
+    metrics_days: int = 30
+) -> Tuple[list, List[int], List[int]]:
+    """
+    Read the next unscored keywords or search terms in primary key order.
+
+    Each row's clicks and impressions are summed from its daily metrics over
+    the last metrics_days (0 = all history) in the same statement.
+
+    Args:
+        db: Database session
+        model: Keyword or SearchTerm
+        limit: Maximum rows to read
+        after_id: Keyset cursor; only rows with a greater id are read
+        metrics_days: Days of metrics behind confidence
+
+    Returns:
+        (rows with id and text, clicks, impressions), aligned and ordered by id
+    """
+    pending = db.query(model.id, model.text).filter(model.icp_score.is_(None))
+    if after_id is not None:
+        pending = pending.filter(model.id > after_id)
+    pending = pending.order_by(model.id).limit(limit).subquery()
+
+    totals = db.query(
+        DailyMetric.ref_id,
+        func.sum(DailyMetric.clicks).label("clicks"),
+        func.sum(DailyMetric.impressions).label("impressions")
+    ).filter(
+        DailyMetric.level == MODEL_LEVELS[model],
+        DailyMetric.ref_id.in_(select(pending.c.id))
+    )
+    if metrics_days > 0:
+        totals = totals.filter(DailyMetric.date >= date.today() - timedelta(days=metrics_days))
+    totals = totals.group_by(DailyMetric.ref_id).subquery()
+
+    items = db.query(
+        pending.c.id,
+        pending.c.text,
+        func.coalesce(totals.c.clicks, 0).label("clicks"),
+        func.coalesce(totals.c.impressions, 0).label("impressions")
+    ).outerjoin(totals, totals.c.ref_id == pending.c.id).order_by(pending.c.id).all()
+
+    return items, [int(item.clicks) for item in items], [int(item.impressions) for item in items]
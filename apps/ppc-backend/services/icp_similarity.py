@@ -0,0 +1,171 @@
+"""
+Character n-gram similarity between texts and ICP exemplar terms.
+
+Lexicon rules only fire on literal (typo-tolerant) hits, so near-synonyms of
+an include or exclude term score a neutral 50. NgramSimilarity gives an
+offline signal for them: every text and exemplar is a TF-IDF vector over
+its character 3- and 4-grams (IDF over the exemplars), and a text's
+similarity to a category is its best cosine against that category's
+exemplars.
+
+Texts are processed in blocks without per-text Python work: n-grams are
+hashed with numpy over a padded code point matrix, matched against the
+sorted exemplar vocabulary, and the sparse text x n-gram product with the
+small exemplar matrix is accumulated with one bincount.
+"""
+
+import math
+import os
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+# Score points for a perfect match; 0 leaves the signal off
+SIMILARITY_WEIGHT = float(os.getenv("ICP_SIMILARITY_WEIGHT", "0"))
+
+# Best similarity a category needs before it moves the score
+SIMILARITY_THRESHOLD = float(os.getenv("ICP_SIMILARITY_THRESHOLD", "0.2"))
+
+NGRAM_SIZES = (3, 4)
+
+# Longer texts are truncated; search terms rarely come close
+MAX_TEXT_LENGTH = 96
+
+# Texts per block in similarities (block x MAX_TEXT_LENGTH hash matrices);
+# row numbers within a block share a sort key with the n-gram hash
+BATCH_BLOCK_SIZE = 16_384
+_ROW_BITS = np.uint64(16)
+
+_HASH_BASE = np.uint64(1_000_003)
+_HASH_MASK = np.uint64((1 << 48) - 1)
+
+
+def ngram_hashes(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    48-bit hashes of every character n-gram of lowercased texts, each padded with a space on both sides.
+
+    Returns:
+        (row, hash) arrays with one entry per n-gram occurrence
+    """
+    if not len(texts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+
+    padded = [f" {text[:MAX_TEXT_LENGTH - 2]} " for text in texts]
+    matrix = np.array(padded)
+    width = matrix.itemsize // 4
+    codes = matrix.view(np.uint32).reshape(len(padded), width).astype(np.uint64)
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+
+    rows, hashes = [], []
+    with np.errstate(over="ignore"):
+        for size in NGRAM_SIZES:
+            if width < size:
+                continue
+            starts = width - size + 1
+            # Seeded with the size so 3- and 4-grams never share a hash
+            hashed = np.full((len(padded), starts), size, dtype=np.uint64)
+            for offset in range(size):
+                hashed = hashed * _HASH_BASE + codes[:, offset:offset + starts]
+            valid = np.arange(starts) + size <= lengths[:, None]
+            row, _ = np.nonzero(valid)
+            rows.append(row)
+            hashes.append(hashed[valid] & _HASH_MASK)
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    return np.concatenate(rows), np.concatenate(hashes)
+
+
+class NgramSimilarity:
+    """
+    Cosine similarity of texts to named exemplar lists.
+
+    Args:
+        exemplars: Category name -> exemplar texts (e.g. {"include": INCLUDE_TERMS})
+    """
+
+    def __init__(self, exemplars: Dict[str, Sequence[str]]):
+        self.exemplars = {name: [text.lower().strip() for text in texts] for name, texts in exemplars.items()}
+        documents = [text for texts in self.exemplars.values() for text in texts]
+
+        # Exemplar columns per category
+        self._columns: Dict[str, Tuple[int, int]] = {}
+        start = 0
+        for name, texts in self.exemplars.items():
+            self._columns[name] = (start, start + len(texts))
+            start += len(texts)
+
+        rows, hashes = ngram_hashes(documents)
+        vocabulary, gram_index = np.unique(hashes, return_inverse=True)
+        gram_index = gram_index.reshape(-1)
+        counts = np.zeros((len(vocabulary), len(documents)))
+        np.add.at(counts, (gram_index, rows), 1)
+
+        # Smoothed IDF; n-grams no exemplar contains get the largest weight
+        document_frequency = (counts > 0).sum(axis=1)
+        self._idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+        self._unseen_idf = math.log(1 + len(documents)) + 1
+
+        weights = counts * self._idf[:, None]
+        norms = np.linalg.norm(weights, axis=0)
+        weights /= np.where(norms > 0, norms, 1)
+        self._vocabulary = vocabulary
+        self._width = len(documents)
+
+        # Exemplar matrix rows in sparse form: each n-gram's nonzero exemplars
+        grams, columns = np.nonzero(weights)
+        self._entry_counts = np.bincount(grams, minlength=len(vocabulary))
+        self._entry_starts = np.concatenate(([0], np.cumsum(self._entry_counts)[:-1])).astype(np.int64)
+        self._entry_columns = columns
+        self._entry_weights = weights[grams, columns]
+
+    def similarities(self, texts: Sequence[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Best exemplar per category for many lowercased, stripped texts.
+
+        Returns:
+            Category name -> (cosine similarity, exemplar position or -1 if the
+            category is empty), aligned with texts
+        """
+        size = len(texts)
+        best = {
+            name: (np.zeros(size), np.full(size, -1, dtype=np.int64)) for name in self._columns
+        }
+        for block_start in range(0, size, BATCH_BLOCK_SIZE):
+            block_end = min(block_start + BATCH_BLOCK_SIZE, size)
+            cosines = self._block_cosines(texts[block_start:block_end])
+            for name, (start, end) in self._columns.items():
+                if end == start:
+                    continue
+                columns = cosines[:, start:end]
+                best[name][1][block_start:block_end] = columns.argmax(axis=1)
+                best[name][0][block_start:block_end] = columns.max(axis=1)
+        return best
+
+    def _block_cosines(self, texts: Sequence[str]) -> np.ndarray:
+        size, width = len(texts), self._width
+        rows, hashes = ngram_hashes(texts)
+
+        # Term frequencies per (n-gram, row), grouped with one sort on a combined key
+        keys, frequencies = np.unique((hashes << _ROW_BITS) | rows.astype(np.uint64), return_counts=True)
+        rows = (keys & ((np.uint64(1) << _ROW_BITS) - np.uint64(1))).astype(np.int64)
+        hashes = keys >> _ROW_BITS
+
+        positions = np.minimum(np.searchsorted(self._vocabulary, hashes), max(len(self._vocabulary) - 1, 0))
+        known = self._vocabulary[positions] == hashes if len(self._vocabulary) else np.zeros(len(keys), dtype=bool)
+        idf = np.where(known, self._idf[positions] if len(self._idf) else 0, self._unseen_idf)
+        weights = frequencies * idf
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=size))
+
+        # Sparse (text x n-gram) times sparse (n-gram x exemplar): expand each
+        # known n-gram into its exemplar entries and sum per (row, exemplar)
+        rows, weights, positions = rows[known], weights[known], positions[known]
+        lengths = self._entry_counts[positions]
+        total = int(lengths.sum())
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(self._entry_starts[positions], lengths) + offsets
+        cells = np.repeat(rows, lengths) * width + self._entry_columns[entries]
+        dots = np.bincount(
+            cells, weights=np.repeat(weights, lengths) * self._entry_weights[entries], minlength=size * width
+        ).reshape(size, width)
+        return dots / np.where(norms > 0, norms, 1)[:, None]
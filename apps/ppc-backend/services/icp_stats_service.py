@@ -0,0 +1,229 @@
+"""
+Incrementally maintained ICP score histogram.
+
+icp_score_histogram holds, per level, the number of rows at each score 0-100
+plus an UNSCORED row. Score writes apply their old -> new deltas in the same
+transaction, and syncs count the keywords and search terms each chunk inserts,
+so stats never scan the scored tables. Old scores are read under row locks
+(SELECT ... FOR UPDATE on Postgres; SQLite serializes writers), so
+overlapping score writes can't both apply a delta from the same old score.
+Any bucket boundaries can be summed from the stored histogram.
+"""
+
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import and_, bindparam, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import logging
+
+import numpy as np
+
+from models import IcpScoreHistogram, Keyword, SearchTerm
+from services import bulk_upsert
+from services.bulk_upsert import UpsertBuffer
+
+logger = logging.getLogger(__name__)
+
+LEVEL_MODELS = {"keyword": Keyword, "term": SearchTerm}
+
+UNSCORED = -1
+MAX_SCORE = 100
+
+# Score ids per IN (...) lookup of previous scores
+LOOKUP_CHUNK_SIZE = 500
+
+
+def level_of(model) -> str:
+    """Histogram level for Keyword or SearchTerm."""
+    return next(level for level, level_model in LEVEL_MODELS.items() if level_model is model)
+
+
+class IcpStatsService:
+    """Maintains and reads the per-level ICP score histogram."""
+
+    @staticmethod
+    def record_scores(db: Session, model, ids: Sequence[str], scores: Sequence[Optional[int]]):
+        """
+        Apply the histogram deltas of setting rows' scores; call before the rows are updated.
+
+        Args:
+            db: Database session
+            model: Keyword or SearchTerm
+            ids: Primary keys of the rows being written
+            scores: New score per row, None to clear
+        """
+        if not len(ids):
+            return
+        level = level_of(model)
+        IcpStatsService._ensure(db, level)
+
+        # Locked until the caller commits the rows' new scores; sorted so
+        # concurrent writers lock overlapping rows in the same order
+        previous: Dict[str, Optional[int]] = {}
+        locking = sorted(set(ids))
+        for start in range(0, len(locking), LOOKUP_CHUNK_SIZE):
+            previous.update(db.query(model.id, model.icp_score).filter(
+                model.id.in_(locking[start:start + LOOKUP_CHUNK_SIZE])
+            ).with_for_update().all())
+
+        # Bin 0 is UNSCORED, bin s + 1 is score s
+        old_bins = np.array([_bin(previous.get(item_id)) for item_id in ids], dtype=np.int64)
+        new_bins = np.array([_bin(score) for score in scores], dtype=np.int64)
+        # Rows missing from the table aren't counted yet and gain no bin
+        known = np.array([item_id in previous for item_id in ids], dtype=bool)
+        deltas = (
+            np.bincount(new_bins[known], minlength=MAX_SCORE + 2)
+            - np.bincount(old_bins[known], minlength=MAX_SCORE + 2)
+        )
+        IcpStatsService._add(db, level, {
+            int(index) - 1: int(deltas[index]) for index in np.flatnonzero(deltas).tolist()
+        })
+
+    @staticmethod
+    def record_inserted(db: Session, model, scores: Sequence[Optional[int]]):
+        """Count rows being inserted, by score (None for unscored); call before they are written."""
+        if not len(scores):
+            return
+        level = level_of(model)
+        IcpStatsService._ensure(db, level)
+        bins = np.array([_bin(score) for score in scores], dtype=np.int64)
+        IcpStatsService._add(db, level, {
+            int(index) - 1: int(count) for index, count in zip(*np.unique(bins, return_counts=True))
+        })
+
+    @staticmethod
+    def track_inserts(upserts: UpsertBuffer):
+        """Count the keywords and search terms an UpsertBuffer inserts as unscored, chunk by chunk."""
+        for model in LEVEL_MODELS.values():
+            if upserts.has(model):
+                upserts.before_write(model, partial(_count_new_rows, upserts.db, model))
+
+    @staticmethod
+    def record_cleared(db: Session, level: str):
+        """Move every scored row of a level to UNSCORED; call when clearing all its scores."""
+        IcpStatsService._ensure(db, level)
+        scored = db.query(func.coalesce(func.sum(IcpScoreHistogram.count), 0)).filter(
+            IcpScoreHistogram.level == level,
+            IcpScoreHistogram.score != UNSCORED
+        ).scalar()
+        db.query(IcpScoreHistogram).filter(
+            IcpScoreHistogram.level == level,
+            IcpScoreHistogram.score != UNSCORED
+        ).delete(synchronize_session=False)
+        IcpStatsService._add(db, level, {UNSCORED: int(scored)})
+
+    @staticmethod
+    def rebuild(db: Session, level: str):
+        """Recompute a level's histogram from its table."""
+        model = LEVEL_MODELS[level]
+        db.query(IcpScoreHistogram).filter(IcpScoreHistogram.level == level).delete(synchronize_session=False)
+
+        counts = {UNSCORED: 0}
+        for score, count in db.query(model.icp_score, func.count(model.id)).group_by(model.icp_score):
+            counts[UNSCORED if score is None else score] = count
+        db.add_all(IcpScoreHistogram(level=level, score=score, count=count) for score, count in counts.items())
+        db.flush()
+        logger.info(f"Rebuilt ICP score histogram for {level}")
+
+    @staticmethod
+    def get_histogram(db: Session, level: str) -> np.ndarray:
+        """Row counts per score 0-100 followed by the unscored count (length 102)."""
+        IcpStatsService._ensure(db, level)
+        histogram = np.zeros(MAX_SCORE + 2, dtype=np.int64)
+        for score, count in db.query(IcpScoreHistogram.score, IcpScoreHistogram.count).filter(
+            IcpScoreHistogram.level == level
+        ):
+            histogram[MAX_SCORE + 1 if score == UNSCORED else score] = count
+        return histogram
+
+    @staticmethod
+    def bucket_counts(histogram: np.ndarray, boundaries: Sequence[int]) -> List[int]:
+        """
+        Sum scored rows into buckets.
+
+        Args:
+            histogram: From get_histogram
+            boundaries: Ascending lower bounds of every bucket after the first, e.g. [40, 70]
+
+        Returns:
+            Counts for [0, b0), [b0, b1), ... [bn, 100]
+        """
+        starts = [0] + sorted({b for b in boundaries if 0 < b <= MAX_SCORE})
+        return np.add.reduceat(histogram[:MAX_SCORE + 1], starts).tolist()
+
+    @staticmethod
+    def _ensure(db: Session, level: str) -> bool:
+        """Build a level's histogram on first use; False if it was just built."""
+        if _histogram_exists(db, level):
+            return True
+        if db.get_bind().dialect.name == "postgresql":
+            # Concurrent first uses would both rebuild and collide on the primary
+            # key; the lock is held to the end of the transaction, so whoever
+            # waited on it finds the histogram already built
+            db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"icp_score_histogram:{level}"})
+            if _histogram_exists(db, level):
+                return True
+        IcpStatsService.rebuild(db, level)
+        return False
+
+    @staticmethod
+    def _add(db: Session, level: str, deltas: Dict[int, int]):
+        if not deltas:
+            return
+        table = IcpScoreHistogram.__table__
+        rows = [{"level": level, "score": score, "count": delta} for score, delta in deltas.items()]
+        postgres = db.get_bind().dialect.name == "postgresql"
+
+        if postgres or bulk_upsert.SQLITE_SUPPORTS_UPSERT:
+            stmt = (pg_insert if postgres else sqlite_insert)(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["level", "score"],
+                set_={"count": table.c.count + stmt.excluded.count}
+            )
+            db.execute(stmt, rows)
+            return
+
+        # SQLite before 3.24: add to the scores that have a row, insert the rest
+        existing = {score for (score,) in db.query(IcpScoreHistogram.score).filter(
+            IcpScoreHistogram.level == level,
+            IcpScoreHistogram.score.in_(list(deltas))
+        )}
+        updates = [
+            {"row_level": row["level"], "row_score": row["score"], "delta": row["count"]}
+            for row in rows if row["score"] in existing
+        ]
+        if updates:
+            db.execute(
+                table.update().where(and_(
+                    table.c.level == bindparam("row_level"), table.c.score == bindparam("row_score")
+                )).values(count=table.c.count + bindparam("delta")),
+                updates
+            )
+        inserts = [row for row in rows if row["score"] not in existing]
+        if inserts:
+            db.execute(table.insert(), inserts)
+
+
+def _histogram_exists(db: Session, level: str) -> bool:
+    return db.query(IcpScoreHistogram.level).filter(
+        IcpScoreHistogram.level == level,
+        IcpScoreHistogram.score == UNSCORED
+    ).first() is not None
+
+
+def _bin(score: Optional[int]) -> int:
+    return 0 if score is None else score + 1
+
+
+def _count_new_rows(db: Session, model, rows: List[Dict[str, Any]]):
+    ids = [row["id"] for row in rows]
+    existing = set()
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        existing.update(
+            item_id for (item_id,) in db.query(model.id).filter(
+                model.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])
+            )
+        )
+    IcpStatsService.record_inserted(db, model, [None] * (len(ids) - len(existing)))
@@ -0,0 +1,105 @@
+"""
+Leases on background job rows shared by several worker processes.
+
+A sync or score job row records the process running it (lease_owner) and
+when that process last reported progress (heartbeat_at). Another process
+only takes a job over once its heartbeat is older than LEASE_SECONDS, so a
+restarting process never reruns a job a live process is still working on.
+"""
+
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+import os
+import socket
+import uuid
+
+# Identifies this process as the owner of the jobs it runs
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# A job whose owner hasn't heartbeated for this long is up for grabs; must
+# exceed the longest gap between progress commits (one sync slice or score chunk)
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+INTERRUPTED_STATUSES = ("queued", "running", "resuming")
+
+
+class LeaseLost(Exception):
+    """Another process took over a job after this process's lease expired."""
+
+
+def lease_expired(model, now: datetime):
+    """Filter for jobs whose owner stopped heartbeating (or that never had one)."""
+    return or_(model.heartbeat_at.is_(None), model.heartbeat_at < now - timedelta(seconds=LEASE_SECONDS))
+
+
+def acquire(db: Session, model, job_id: str) -> bool:
+    """
+    Take the lease on a job and mark it running.
+
+    Succeeds for jobs this process queued or claimed, for failed jobs being
+    retried, and for jobs whose previous owner's lease expired. A job running
+    under a live lease, or already succeeded, is left alone.
+
+    Returns:
+        True if this process now owns the job
+    """
+    now = datetime.utcnow()
+    updated = db.query(model).filter(
+        model.id == job_id,
+        model.status != "succeeded",
+        or_(
+            lease_expired(model, now),
+            and_(model.status != "running", or_(model.lease_owner.is_(None), model.lease_owner == PROCESS_ID)),
+        )
+    ).update({"status": "running", "lease_owner": PROCESS_ID, "heartbeat_at": now}, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+
+def heartbeat(db: Session, model, job_id: str):
+    """
+    Renew this process's lease; flushed with the caller's next commit.
+
+    Raises:
+        LeaseLost: If another process has taken the job over
+    """
+    updated = db.query(model).filter(
+        model.id == job_id,
+        model.lease_owner == PROCESS_ID
+    ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+    if not updated:
+        raise LeaseLost(f"Job {job_id} was taken over by another process")
+
+
+def claim_expired(db: Session, model) -> List[str]:
+    """
+    Claim queued or running jobs whose owner stopped heartbeating.
+
+    Each job is claimed with a conditional update so only one process
+    resumes it; the claim is itself a fresh lease held until run_job starts.
+    """
+    now = datetime.utcnow()
+    claimed = []
+    job_ids = [
+        job_id for (job_id,) in db.query(model.id).filter(
+            model.status.in_(INTERRUPTED_STATUSES),
+            lease_expired(model, now)
+        )
+    ]
+
+    for job_id in job_ids:
+        updated = db.query(model).filter(
+            model.id == job_id,
+            model.status.in_(INTERRUPTED_STATUSES),
+            lease_expired(model, now)
+        ).update(
+            {"status": "resuming", "lease_owner": PROCESS_ID, "heartbeat_at": now},
+            synchronize_session=False
+        )
+        if updated:
+            claimed.append(job_id)
+
+    db.commit()
+    return claimed
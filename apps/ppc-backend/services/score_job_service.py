@@ -0,0 +1,252 @@
+"""
+Background ICP scoring of every unscored keyword or search term.
+
+A job walks the table by primary key in fixed-size chunks, reading only ids,
+texts and metrics. Each chunk's scores and the job's keyset cursor are
+committed together, along with a renewal of the job's lease, so a job whose
+process died is taken over and resumes after its last committed chunk. With
+SCORE_JOB_PROCESSES > 1, chunks are scored on a process pool while the job
+keeps reading ahead, and results are still written in order.
+
+Publishing a lexicon queues a rescore job instead, which runs
+IcpLexiconService.rescore under the same lease and progress reporting.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+import os
+import uuid
+import logging
+
+from database import SessionLocal
+from models import ScoreJob
+from services.icp_cache_service import IcpCacheService
+from services.icp_lexicon_service import IcpLexiconService, DEFAULT_TENANT
+from services.icp_service import IcpLexicon, IcpScores, fetch_unscored, lexicon_version, score_batch, write_icp_scores
+from services.icp_stats_service import IcpStatsService, LEVEL_MODELS
+from services.job_lease import PROCESS_ID, LeaseLost, acquire, claim_expired, heartbeat
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("SCORE_JOB_CHUNK_SIZE", "5000"))
+
+# Scoring processes; 0 or 1 scores in the job's own thread through the score cache
+PROCESSES = int(os.getenv("SCORE_JOB_PROCESSES", "0"))
+
+# ScoreJob.level of jobs re-scoring rows for a newly published lexicon
+RESCORE_LEVEL = "rescore"
+
+# Lexicons compiled inside pool workers, by version
+_worker_lexicons: Dict[str, IcpLexicon] = {}
+
+
+def _score_in_worker(texts: List[str], clicks: List[int], settings: Tuple) -> IcpScores:
+    """Score a chunk in a pool worker; the lexicon is compiled on the worker's first chunk only."""
+    version = lexicon_version(*settings)
+    lexicon = _worker_lexicons.get(version)
+    if lexicon is None:
+        lexicon = _worker_lexicons[version] = IcpLexicon(*settings)
+    return score_batch(texts, [0] * len(texts), clicks, lexicon)
+
+
+class ScoreJobService:
+    """Runs whole-table ICP scoring as background jobs with progress and resume."""
+
+    @staticmethod
+    def create_job(db: Session, level: str, tenant: str = DEFAULT_TENANT, metrics_days: int = 30) -> ScoreJob:
+        """
+        Record a queued scoring job pinned to the tenant's active lexicon.
+
+        Args:
+            db: Database session
+            level: 'keyword' or 'term'
+            tenant: Tenant whose active lexicon to score with
+            metrics_days: Days of metrics behind confidence
+
+        Returns:
+            The new ScoreJob
+        """
+        job = ScoreJob(
+            id=str(uuid.uuid4()),
+            level=level,
+            tenant=tenant,
+            lexicon_version=IcpLexiconService.get_active(db, tenant).version,
+            metrics_days=metrics_days,
+            status="queued",
+            rows_processed=0,
+            rows_expected=int(IcpStatsService.get_histogram(db, level)[-1]),
+            lease_owner=PROCESS_ID,
+            heartbeat_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        return job
+
+    @staticmethod
+    def create_rescore_job(db: Session, tenant: str = DEFAULT_TENANT) -> ScoreJob:
+        """Record a queued job moving every scored row to the tenant's active lexicon."""
+        lexicon = IcpLexiconService.get_active(db, tenant)
+        job = ScoreJob(
+            id=str(uuid.uuid4()),
+            level=RESCORE_LEVEL,
+            tenant=tenant,
+            lexicon_version=lexicon.version,
+            status="queued",
+            rows_processed=0,
+            rows_expected=IcpLexiconService.count_outdated(db, lexicon.version),
+            lease_owner=PROCESS_ID,
+            heartbeat_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        return job
+
+    @staticmethod
+    def run_job(job_id: str, processes: int = PROCESSES):
+        """
+        Run (or resume) a scoring job to completion.
+
+        Called from the scheduler's worker threads with its own session. Jobs
+        another live process holds the lease on are skipped.
+        """
+        db = SessionLocal()
+
+        try:
+            if not acquire(db, ScoreJob, job_id):
+                return
+            job = db.query(ScoreJob).filter(ScoreJob.id == job_id).first()
+
+            lexicon = IcpLexiconService.get_version(db, job.lexicon_version, job.tenant)
+            if lexicon is None:
+                raise ValueError(f"Unknown ICP lexicon version {job.lexicon_version}")
+
+            job.started_at = job.started_at or datetime.utcnow()
+            job.error_message = None
+            db.commit()
+
+            if job.level == RESCORE_LEVEL:
+                ScoreJobService._rescore(db, job, lexicon)
+            else:
+                ScoreJobService._score_unscored(db, job, lexicon, processes)
+
+            job.status = "succeeded"
+            job.finished_at = datetime.utcnow()
+            job.lease_owner = None
+            db.commit()
+            logger.info(f"Score job {job_id} finished: {job.rows_processed} {job.level} rows")
+
+        except LeaseLost as e:
+            # The new owner resumes after the last committed chunk
+            logger.warning(str(e))
+            db.rollback()
+        except Exception as e:
+            logger.error(f"Score job {job_id} failed: {e}", exc_info=True)
+            db.rollback()
+            job = db.query(ScoreJob).filter(ScoreJob.id == job_id, ScoreJob.lease_owner == PROCESS_ID).first()
+            if job:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.finished_at = datetime.utcnow()
+                job.lease_owner = None
+                db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _score_unscored(db: Session, job: ScoreJob, lexicon: IcpLexicon, processes: int):
+        """Score the level's unscored rows chunk by chunk after the job's cursor."""
+        model = LEVEL_MODELS[job.level]
+        pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+        # IcpLexicon arguments; workers rebuild the same lexicon version from them
+        settings = (
+            lexicon.brand, lexicon.include, lexicon.exclude,
+            lexicon.similarity_weight, lexicon.similarity_threshold,
+        )
+
+        try:
+            # Chunks read but not yet written: (items, clicks, future or None)
+            in_flight = deque()
+            cursor = job.last_id
+            exhausted = False
+
+            while True:
+                while not exhausted and len(in_flight) < max(processes * 2, 1):
+                    items, clicks, _ = fetch_unscored(db, model, CHUNK_SIZE, cursor, job.metrics_days)
+                    if not items:
+                        exhausted = True
+                        break
+                    cursor = items[-1].id
+                    future = pool.submit(_score_in_worker, [item.text for item in items], clicks, settings) if pool else None
+                    in_flight.append((items, clicks, future))
+
+                if not in_flight:
+                    break
+
+                items, clicks, future = in_flight.popleft()
+                if future is not None:
+                    results = future.result()
+                else:
+                    results = IcpCacheService.score_texts(db, [item.text for item in items], clicks, lexicon)
+
+                write_icp_scores(db, model, [item.id for item in items], results, version=lexicon.version)
+                job.last_id = items[-1].id
+                job.rows_processed += len(items)
+                heartbeat(db, ScoreJob, job.id)
+                db.commit()
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _rescore(db: Session, job: ScoreJob, lexicon: IcpLexicon):
+        """Move scored rows to the job's lexicon, unless a newer publish has queued its own re-score."""
+        if IcpLexiconService.get_active(db, job.tenant).version != lexicon.version:
+            logger.info(f"Score job {job.id} skipped: lexicon {lexicon.version} is no longer active")
+            return
+
+        def on_progress(rows: int):
+            job.rows_processed += rows
+            heartbeat(db, ScoreJob, job.id)
+            db.commit()
+
+        IcpLexiconService.rescore(db, job.tenant, on_progress=on_progress)
+
+    @staticmethod
+    def claim_interrupted(db: Session) -> List[str]:
+        """Claim queued or running jobs whose owning process stopped heartbeating."""
+        return claim_expired(db, ScoreJob)
+
+    @staticmethod
+    def get_progress(job: ScoreJob) -> dict:
+        """Summarize a job's progress with throughput and ETA."""
+        rows_per_second = None
+        eta_seconds = None
+
+        if job.started_at:
+            finished = job.finished_at or datetime.utcnow()
+            elapsed = (finished - job.started_at).total_seconds()
+            if elapsed > 0:
+                rows_per_second = round(job.rows_processed / elapsed, 1)
+
+        if job.status == "running" and rows_per_second and job.rows_expected:
+            remaining = max(job.rows_expected - job.rows_processed, 0)
+            eta_seconds = round(remaining / rows_per_second)
+
+        return {
+            "id": job.id,
+            "level": job.level,
+            "status": job.status,
+            "lexicon_version": job.lexicon_version,
+            "rows_processed": job.rows_processed,
+            "rows_expected": job.rows_expected,
+            "rows_per_second": rows_per_second,
+            "eta_seconds": eta_seconds,
+            "last_id": job.last_id,
+            "error": job.error_message,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
@@ -0,0 +1,175 @@
+"""
+Background Google Ads sync jobs.
+
+POST /sync/jobs records a SyncJob and schedules run_job on the APScheduler
+instance. The job runs the SyncOrchestrator on a scheduler worker thread with
+its own session and commits its progress and a per-stage checkpoint after every
+committed date slice, renewing its lease. A job whose owning process stopped
+heartbeating is claimed by another process and resumes each stage after its
+last checkpointed slice.
+"""
+
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+import json
+import uuid
+import logging
+
+from database import SessionLocal
+from models import SyncJob, SyncState
+from ads.client import ads_client
+from services.job_lease import PROCESS_ID, LeaseLost, acquire, claim_expired, heartbeat
+from services.sync_service import SyncOrchestrator
+
+logger = logging.getLogger(__name__)
+
+
+class SyncJobService:
+    """Runs syncs as background jobs with pollable progress and resume checkpoints."""
+
+    @staticmethod
+    def create_job(db: Session, customer_id: str, stages: Dict[str, int], full_refresh: bool = False) -> SyncJob:
+        """
+        Record a queued sync job.
+
+        Args:
+            db: Database session
+            customer_id: Google Ads customer ID
+            stages: Stage name -> backfill days
+            full_refresh: Ignore sync watermarks
+
+        Returns:
+            The new SyncJob
+        """
+        # The previous run of these reports is the best guess at this one's size
+        previous = db.query(SyncState).filter(
+            SyncState.customer_id == customer_id,
+            SyncState.report_type.in_(list(stages))
+        ).all()
+
+        job = SyncJob(
+            id=str(uuid.uuid4()),
+            customer_id=customer_id,
+            stages_json=json.dumps(stages),
+            full_refresh=full_refresh,
+            status="queued",
+            rows_processed=0,
+            rows_expected=sum(state.rows_ingested or 0 for state in previous) or None,
+            checkpoint_json=json.dumps({}),
+            lease_owner=PROCESS_ID,
+            heartbeat_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        return job
+
+    @staticmethod
+    def run_job(job_id: str):
+        """
+        Run (or resume) a sync job to completion.
+
+        Called from the scheduler's worker threads with its own session. Stages
+        with a checkpoint restart after their last committed slice. Jobs
+        another live process holds the lease on are skipped.
+        """
+        db = SessionLocal()
+
+        try:
+            if not acquire(db, SyncJob, job_id):
+                return
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+
+            checkpoint = json.loads(job.checkpoint_json or "{}")
+            committed_rows = {stage: point["rows"] for stage, point in checkpoint.items()}
+            live_rows = dict(committed_rows)
+
+            job.started_at = job.started_at or datetime.utcnow()
+            job.error_message = None
+            db.commit()
+
+            def on_progress(stage: str, rows: int, committed_through: Optional[date]):
+                live_rows[stage] = committed_rows.get(stage, 0) + rows
+                if committed_through:
+                    checkpoint[stage] = {"through": committed_through.isoformat(), "rows": live_rows[stage]}
+                    job.checkpoint_json = json.dumps(checkpoint)
+                job.current_stage = stage
+                job.rows_processed = sum(live_rows.values())
+                heartbeat(db, SyncJob, job_id)
+                db.commit()
+
+            orchestrator = SyncOrchestrator(db, job.customer_id, ads_client.iter_query)
+            stages = json.loads(job.stages_json)
+            results = orchestrator.run(
+                list(stages),
+                days=stages,
+                full_refresh=job.full_refresh,
+                resume_after={stage: date.fromisoformat(point["through"]) for stage, point in checkpoint.items()},
+                on_progress=on_progress,
+            )
+
+            job.status = "succeeded"
+            job.current_stage = None
+            job.result_json = json.dumps(results)
+            job.finished_at = datetime.utcnow()
+            job.lease_owner = None
+            db.commit()
+            logger.info(f"Sync job {job_id} finished: {job.rows_processed} rows")
+
+        except LeaseLost as e:
+            # The new owner resumes from the last checkpoint; its status isn't ours to set
+            logger.warning(str(e))
+            db.rollback()
+        except Exception as e:
+            logger.error(f"Sync job {job_id} failed: {e}", exc_info=True)
+            db.rollback()
+            job = db.query(SyncJob).filter(SyncJob.id == job_id, SyncJob.lease_owner == PROCESS_ID).first()
+            if job:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.finished_at = datetime.utcnow()
+                job.lease_owner = None
+                db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def claim_interrupted(db: Session) -> List[str]:
+        """
+        Claim queued or running jobs whose owning process stopped heartbeating.
+
+        Jobs a live process is running keep their lease and are not claimed.
+        """
+        return claim_expired(db, SyncJob)
+
+    @staticmethod
+    def get_progress(job: SyncJob) -> dict:
+        """Summarize a job's progress with throughput and ETA."""
+        rows_per_second = None
+        eta_seconds = None
+
+        if job.started_at:
+            finished = job.finished_at or datetime.utcnow()
+            elapsed = (finished - job.started_at).total_seconds()
+            if elapsed > 0:
+                rows_per_second = round(job.rows_processed / elapsed, 1)
+
+        if job.status == "running" and rows_per_second and job.rows_expected:
+            remaining = max(job.rows_expected - job.rows_processed, 0)
+            eta_seconds = round(remaining / rows_per_second)
+
+        return {
+            "id": job.id,
+            "status": job.status,
+            "current_stage": job.current_stage,
+            "rows_processed": job.rows_processed,
+            "rows_expected": job.rows_expected,
+            "rows_per_second": rows_per_second,
+            "eta_seconds": eta_seconds,
+            "checkpoint": json.loads(job.checkpoint_json or "{}"),
+            "result": json.loads(job.result_json) if job.result_json else None,
+            "error": job.error_message,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
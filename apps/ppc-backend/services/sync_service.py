@@ -0,0 +1,565 @@
+"""
+Google Ads sync pipeline.
+
+Each report (campaigns, keywords, search terms) is a SyncStage: a set of GAQL
+queries plus a mapping from result rows to table rows. SyncOrchestrator runs
+the GAQL fetches of all requested stages concurrently on worker threads (the
+Google Ads SDK is blocking) and applies their writes on the calling thread in
+dependency order, so a full sync takes about as long as its slowest fetch
+plus the writes. A stage fetched while the writer is still busy with an earlier
+one spills its overflow to a temporary file rather than waiting.
+
+Each stage's window is fetched oldest first in date slices; once a slice is
+committed the stage's watermark moves to its last day, so an interrupted run
+picks up from the last committed slice instead of starting over.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Campaign, AdGroup, Keyword, SearchTerm, DailyMetric
+from services.bulk_upsert import UpsertBuffer, DEFAULT_CHUNK_SIZE
+from services.dirty_set_service import DirtySetService
+from services.icp_ingest_service import IcpIngestScorer, SCORE_ON_INGEST
+from services.icp_stats_service import IcpStatsService
+from services.sync_state_service import SyncStateService, gaql_date_range
+
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = [
+    "impressions", "clicks", "cost_micros", "conversions", "conversions_value",
+    "ctr", "cpc_micros", "conversion_rate",
+]
+
+# Fetched-but-unwritten chunks held in memory per stage; beyond that the stage
+# being written waits for the writer and the others spill to a temporary file
+PREFETCH_CHUNKS = int(os.getenv("SYNC_PREFETCH_CHUNKS", "8"))
+
+# Days per GAQL request; each committed slice is a resume point
+SLICE_DAYS = int(os.getenv("SYNC_SLICE_DAYS", "7"))
+
+Record = Tuple[Any, Dict[str, Any]]  # (model, row values)
+QueryFn = Callable[[str, str], Iterable[Any]]
+# (stage name, rows processed by this run, last committed date or None)
+ProgressFn = Callable[[str, int, Optional[date]], None]
+
+
+def create_search_term_id(term: str, ad_group_id: str) -> str:
+    """Create a unique ID for search terms."""
+    content = f"{term}_{ad_group_id}"
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def metric_values(impressions: int, clicks: int, cost_micros: int,
+                  conversions: float, conversions_value: float) -> dict:
+    """Build DailyMetric column values, including the derived rates."""
+    return {
+        "impressions": impressions,
+        "clicks": clicks,
+        "cost_micros": cost_micros,
+        "conversions": conversions,
+        "conversions_value": conversions_value,
+        "ctr": clicks / max(impressions, 1) * 100,
+        "cpc_micros": cost_micros // max(clicks, 1),
+        "conversion_rate": conversions / max(clicks, 1) * 100,
+    }
+
+
+def metric_row(level: str, ref_id: str, day, metrics) -> dict:
+    """Build a DailyMetric row from a GAQL metrics message for one entity and day."""
+    return {
+        "level": level,
+        "ref_id": ref_id,
+        "date": day,
+        **metric_values(
+            metrics.impressions, metrics.clicks, metrics.cost_micros,
+            metrics.conversions, metrics.conversions_value,
+        ),
+    }
+
+
+def sum_metric_rows(existing: dict, row: dict) -> dict:
+    """
+    Combine two GAQL rows that map onto the same (level, ref_id, date).
+
+    Search term rows repeat per matched keyword and criterion ids can repeat
+    across ad groups; UpsertBuffer applies this within and across chunks.
+    """
+    return {
+        **row,
+        **metric_values(*(
+            existing[column] + row[column]
+            for column in ("impressions", "clicks", "cost_micros", "conversions", "conversions_value")
+        )),
+    }
+
+
+def parse_segment_date(value) -> date:
+    """GAQL returns segments.date as an ISO string."""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+# --- Row mappers -------------------------------------------------------------
+
+def _campaign_records(row) -> List[Record]:
+    campaign_id = str(row.campaign.id)
+    return [
+        (Campaign, {
+            "id": campaign_id,
+            "name": row.campaign.name,
+            "status": row.campaign.status.name,
+            "daily_budget_micros": row.campaign_budget.amount_micros,
+        }),
+        (DailyMetric, metric_row("campaign", campaign_id, parse_segment_date(row.segments.date), row.metrics)),
+    ]
+
+
+def _keyword_records(row) -> List[Record]:
+    campaign_id = str(row.campaign.id)
+    ad_group_id = str(row.ad_group.id)
+    keyword_id = str(row.ad_group_criterion.criterion_id)
+    return [
+        (Campaign, {
+            "id": campaign_id,
+            "name": row.campaign.name,
+            "status": row.campaign.status.name,
+        }),
+        (AdGroup, {
+            "id": ad_group_id,
+            "campaign_id": campaign_id,
+            "name": row.ad_group.name,
+            "status": row.ad_group.status.name,
+        }),
+        (Keyword, {
+            "id": keyword_id,
+            "ad_group_id": ad_group_id,
+            "text": row.ad_group_criterion.keyword.text,
+            "match_type": row.ad_group_criterion.keyword.match_type.name,
+            "status": row.ad_group_criterion.status.name,
+            "cpc_bid_micros": getattr(row.ad_group_criterion, 'cpc_bid_micros', None),
+        }),
+        (DailyMetric, metric_row("keyword", keyword_id, parse_segment_date(row.segments.date), row.metrics)),
+    ]
+
+
+def _ad_group_metric_records(row) -> List[Record]:
+    return [
+        (DailyMetric, metric_row("ad_group", str(row.ad_group.id), parse_segment_date(row.segments.date), row.metrics)),
+    ]
+
+
+def _search_term_records(row) -> List[Record]:
+    ad_group_id = str(row.ad_group.id)
+    search_term = row.search_term_view.search_term
+    search_term_id = create_search_term_id(search_term, ad_group_id)
+    day = parse_segment_date(row.segments.date)
+    return [
+        (SearchTerm, {
+            "id": search_term_id,
+            "ad_group_id": ad_group_id,
+            "text": search_term,
+            "matched_keyword_text": getattr(row.ad_group_criterion.keyword, 'text', None),
+            "last_seen": day,
+        }),
+        (DailyMetric, metric_row("search_term", search_term_id, day, row.metrics)),
+    ]
+
+
+# --- Stages --------------------------------------------------------------------
+
+@dataclass
+class SyncStage:
+    """One report: its GAQL queries, row mappers and upsert policy."""
+    name: str
+    default_days: int
+    queries: Sequence[Tuple[str, Callable[[Any], List[Record]]]]  # (GAQL template, mapper)
+    register: Callable[[UpsertBuffer], UpsertBuffer]
+
+    def build_queries(self, start_date: date, end_date: date) -> List[Tuple[str, Callable]]:
+        condition = gaql_date_range(start_date, end_date)
+        return [(template.format(date_range=condition), mapper) for template, mapper in self.queries]
+
+
+def date_slices(start_date: date, end_date: date, days: int = SLICE_DAYS) -> List[Tuple[date, date]]:
+    """Split an inclusive date range into consecutive slices, oldest first."""
+    slices = []
+    while start_date <= end_date:
+        slice_end = min(start_date + timedelta(days=days - 1), end_date)
+        slices.append((start_date, slice_end))
+        start_date = slice_end + timedelta(days=1)
+    return slices
+
+
+CAMPAIGN_STAGE = SyncStage(
+    name="campaigns",
+    default_days=30,
+    queries=[("""
+        SELECT
+          campaign.id, campaign.name, campaign.status,
+          campaign_budget.amount_micros, campaign_budget.status,
+          segments.date,
+          metrics.impressions, metrics.clicks, metrics.cost_micros,
+          metrics.conversions, metrics.conversions_value
+        FROM campaign
+        WHERE {date_range}
+        """, _campaign_records)],
+    register=lambda upserts: (
+        upserts
+        .register(Campaign, update_columns=["name", "status", "daily_budget_micros"])
+        .register(DailyMetric, update_columns=METRIC_COLUMNS, merge=sum_metric_rows)
+    ),
+)
+
+KEYWORD_STAGE = SyncStage(
+    name="keywords",
+    default_days=90,
+    queries=[
+        ("""
+        SELECT
+          customer.id,
+          campaign.id, campaign.name, campaign.status,
+          ad_group.id, ad_group.name, ad_group.status,
+          ad_group_criterion.criterion_id,
+          ad_group_criterion.keyword.text,
+          ad_group_criterion.keyword.match_type,
+          ad_group_criterion.status,
+          ad_group_criterion.cpc_bid_micros,
+          segments.date,
+          metrics.impressions, metrics.clicks, metrics.cost_micros,
+          metrics.conversions, metrics.conversions_value
+        FROM keyword_view
+        WHERE {date_range}
+        """, _keyword_records),
+        # Ad group totals include traffic from criteria that keyword_view omits
+        ("""
+        SELECT
+          ad_group.id, segments.date,
+          metrics.impressions, metrics.clicks, metrics.cost_micros,
+          metrics.conversions, metrics.conversions_value
+        FROM ad_group
+        WHERE {date_range}
+        """, _ad_group_metric_records),
+    ],
+    # Parents are registered first so every chunk flushes campaigns -> ad groups -> keywords
+    register=lambda upserts: (
+        upserts
+        .register(Campaign, update_columns=["name", "status"])
+        .register(AdGroup, update_columns=["campaign_id", "name", "status"])
+        .register(Keyword, update_columns=["ad_group_id", "text", "match_type", "status", "cpc_bid_micros"])
+        .register(DailyMetric, update_columns=METRIC_COLUMNS, merge=sum_metric_rows)
+    ),
+)
+
+SEARCH_TERM_STAGE = SyncStage(
+    name="search_terms",
+    default_days=30,
+    queries=[("""
+        SELECT
+          search_term_view.search_term,
+          ad_group.id, ad_group.name,
+          ad_group_criterion.keyword.text,
+          segments.date,
+          metrics.impressions, metrics.clicks, metrics.cost_micros,
+          metrics.conversions, metrics.conversions_value
+        FROM search_term_view
+        WHERE {date_range}
+        """, _search_term_records)],
+    # Existing terms only ever move last_seen forward
+    register=lambda upserts: (
+        upserts
+        .register(SearchTerm, keep_max=["last_seen"])
+        .register(DailyMetric, update_columns=METRIC_COLUMNS, merge=sum_metric_rows)
+    ),
+)
+
+# Write order: campaigns -> ad groups -> keywords -> search terms
+STAGES: Dict[str, SyncStage] = {
+    stage.name: stage for stage in (CAMPAIGN_STAGE, KEYWORD_STAGE, SEARCH_TERM_STAGE)
+}
+
+
+# --- Orchestration ---------------------------------------------------------------
+
+_END = object()
+
+
+@dataclass
+class _SliceDone:
+    end_date: date
+
+
+class _ChunkSpool:
+    """
+    A stage's fetched items, handed from its fetch thread to the writer in order.
+
+    Up to ``limit`` items wait in memory. Until the writer reaches the stage,
+    further items are pickled to a temporary file instead of blocking the
+    fetch; the writer drains memory first, then the file. Once the stage is
+    being written and the file is drained, the fetcher waits for free memory
+    slots again. The last item (end of stream or an error) is never pickled.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.spilled_total = 0
+        self._memory: deque = deque()
+        self._file = None
+        self._spilled = 0
+        self._read_offset = 0
+        self._last = None
+        self._writing = False
+        self._changed = threading.Condition()
+
+    def put(self, item, stop: threading.Event):
+        with self._changed:
+            if stop.is_set():
+                return
+            while self._writing and (self._spilled or len(self._memory) >= self.limit):
+                if stop.is_set():
+                    return
+                self._changed.wait(0.5)
+            if self._spilled or len(self._memory) >= self.limit:
+                self._spill(item)
+            else:
+                self._memory.append(item)
+            self._changed.notify_all()
+
+    def close(self, last):
+        """Queue the end-of-stream marker or the fetch error, after everything put so far."""
+        with self._changed:
+            self._last = last
+            self._changed.notify_all()
+
+    def start_writing(self):
+        with self._changed:
+            self._writing = True
+            self._changed.notify_all()
+
+    def get(self):
+        with self._changed:
+            while not self._memory and not self._spilled and self._last is None:
+                self._changed.wait()
+            if self._memory:
+                item = self._memory.popleft()
+            elif self._spilled:
+                item = self._unspill()
+            else:
+                item = self._last
+            self._changed.notify_all()
+            return item
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _spill(self, item):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="sync-spool-")
+        self._file.seek(0, os.SEEK_END)
+        pickle.dump(item, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spilled += 1
+        self.spilled_total += 1
+
+    def _unspill(self):
+        self._file.seek(self._read_offset)
+        item = pickle.load(self._file)
+        self._read_offset = self._file.tell()
+        self._spilled -= 1
+        if not self._spilled:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_offset = 0
+        return item
+
+
+@dataclass
+class _StageRun:
+    stage: SyncStage
+    start_date: date
+    end_date: date
+    chunks: _ChunkSpool = field(default_factory=lambda: _ChunkSpool(PREFETCH_CHUNKS))
+    fetch_seconds: float = 0.0
+    write_seconds: float = 0.0
+    rows_processed: int = 0
+
+
+class SyncOrchestrator:
+    """
+    Runs sync stages with concurrent GAQL fetches and ordered writes.
+
+    Fetch threads map rows to table records and hand them over in chunks
+    through per-stage spools; the calling thread owns the database session and
+    writes stage by stage in STAGES order. Stages waiting for the writer keep
+    fetching, spilling to disk, so their fetches overlap the earlier writes.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        customer_id: str,
+        query_fn: QueryFn,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        score_on_ingest: bool = SCORE_ON_INGEST,
+    ):
+        self.db = db
+        self.customer_id = customer_id
+        self.query_fn = query_fn
+        self.chunk_size = chunk_size
+        self.score_on_ingest = score_on_ingest
+        self.on_progress: Optional[ProgressFn] = None
+        self._stop = threading.Event()
+
+    def run(
+        self,
+        stage_names: Sequence[str],
+        days: Optional[Dict[str, int]] = None,
+        full_refresh: bool = False,
+        resume_after: Optional[Dict[str, date]] = None,
+        on_progress: Optional[ProgressFn] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Sync the given stages and return per-stage results with timings.
+
+        Args:
+            stage_names: Stage names from STAGES; written in STAGES order
+            days: Optional backfill window per stage, defaults to stage.default_days
+            full_refresh: Ignore sync watermarks
+            resume_after: Last committed date per stage of an interrupted run
+            on_progress: Called on the writing thread after every committed chunk
+        """
+        days = days or {}
+        resume_after = resume_after or {}
+        self.on_progress = on_progress
+        runs = []
+        for name, stage in STAGES.items():
+            if name not in stage_names:
+                continue
+            start_date, end_date = SyncStateService.get_window(
+                self.db, self.customer_id, name, days.get(name, stage.default_days), full_refresh
+            )
+            if name in resume_after:
+                start_date = max(start_date, resume_after[name] + timedelta(days=1))
+            runs.append(_StageRun(stage=stage, start_date=start_date, end_date=end_date))
+
+        self._stop.clear()
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(runs), 1), thread_name_prefix="gaql-fetch") as pool:
+                for run in runs:
+                    pool.submit(self._fetch, run)
+                try:
+                    return {run.stage.name: self._write(run) for run in runs}
+                except BaseException:
+                    self._stop.set()
+                    raise
+        finally:
+            # Fetch threads have exited once the pool is shut down
+            for run in runs:
+                run.chunks.discard()
+
+    def _fetch(self, run: _StageRun):
+        """Stream a stage's queries on a worker thread, spooling mapped chunks."""
+        started = time.monotonic()
+        try:
+            chunk: List[Record] = []
+            rows = 0
+            for slice_start, slice_end in date_slices(run.start_date, run.end_date):
+                for query, mapper in run.stage.build_queries(slice_start, slice_end):
+                    stream = self.query_fn(query, self.customer_id)
+                    try:
+                        for row in stream:
+                            # The writer failed: stop pulling rows nobody will write
+                            if self._stop.is_set():
+                                return
+                            chunk.extend(mapper(row))
+                            rows += 1
+                            if rows % self.chunk_size == 0:
+                                self._put(run, (rows, chunk))
+                                chunk = []
+                    finally:
+                        # Cancels the underlying GAQL stream when abandoned early
+                        close = getattr(stream, "close", None)
+                        if close:
+                            close()
+                    if self._stop.is_set():
+                        return
+                self._put(run, (rows, chunk))
+                self._put(run, _SliceDone(slice_end))
+                chunk = []
+            run.fetch_seconds = time.monotonic() - started
+            run.chunks.close(_END)
+        except Exception as e:
+            run.fetch_seconds = time.monotonic() - started
+            run.chunks.close(e)
+
+    def _report(self, run: _StageRun, committed_through: Optional[date]):
+        if self.on_progress:
+            self.on_progress(run.stage.name, run.rows_processed, committed_through)
+
+    def _put(self, run: _StageRun, item):
+        run.chunks.put(item, self._stop)
+
+    def _write(self, run: _StageRun) -> Dict[str, Any]:
+        """Drain a stage's spool into the database and advance its watermark."""
+        run.chunks.start_writing()
+        upserts = run.stage.register(UpsertBuffer(self.db, self.chunk_size, commit=True))
+        # Written entities need their recommendations re-evaluated
+        DirtySetService.track(upserts)
+        scorer = IcpIngestScorer(self.db) if self.score_on_ingest else None
+        if scorer:
+            scorer.attach(upserts)
+        else:
+            # New keywords and search terms arrive unscored
+            IcpStatsService.track_inserts(upserts)
+
+        while True:
+            item = run.chunks.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            started = time.monotonic()
+            if isinstance(item, _SliceDone):
+                # Metric keys carry their date, so later slices never repeat this one's
+                upserts.forget_written()
+                SyncStateService.mark_synced(
+                    self.db, self.customer_id, run.stage.name, item.end_date, run.rows_processed
+                )
+                self._report(run, item.end_date)
+            else:
+                run.rows_processed, records = item
+                chunks_before = upserts.chunks_written
+                for model, values in records:
+                    upserts.add(model, values)
+                if upserts.chunks_written != chunks_before:
+                    self._report(run, None)
+            run.write_seconds += time.monotonic() - started
+
+        self.db.commit()
+
+        result = {
+            "status": "success",
+            "date_range": [run.start_date.isoformat(), run.end_date.isoformat()],
+            "rows_written": upserts.written,
+            "chunks_committed": upserts.chunks_written,
+            "total_rows_processed": run.rows_processed,
+            "fetch_seconds": round(run.fetch_seconds, 3),
+            "write_seconds": round(run.write_seconds, 3),
+            "chunks_spilled": run.chunks.spilled_total,
+        }
+        if scorer:
+            result["rows_scored"] = scorer.scored
+        return result
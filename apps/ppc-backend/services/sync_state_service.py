@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+from typing import Tuple
+from sqlalchemy.orm import Session
+import os
+import logging
+
+from models import SyncState
+
+logger = logging.getLogger(__name__)
+
+
+class SyncStateService:
+    """Tracks per-account sync high-water marks so runs only pull new dates."""
+    
+    # Days re-pulled behind the watermark so late conversions get restated
+    LOOKBACK_DAYS = int(os.getenv("SYNC_LOOKBACK_DAYS", "3"))
+    
+    @staticmethod
+    def get_window(
+        db: Session,
+        customer_id: str,
+        report_type: str,
+        max_days: int,
+        full_refresh: bool = False
+    ) -> Tuple[date, date]:
+        """
+        Get the date range the next sync of a report should query.
+        
+        Args:
+            db: Database session
+            customer_id: Google Ads customer ID
+            report_type: Report name, e.g. 'keywords'
+            max_days: Backfill window used when there is no watermark yet
+            full_refresh: Ignore the watermark and re-pull the full window
+            
+        Returns:
+            (start_date, end_date), both inclusive
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=max_days - 1)
+        
+        if full_refresh:
+            return start_date, end_date
+        
+        state = db.query(SyncState).filter(
+            SyncState.customer_id == customer_id,
+            SyncState.report_type == report_type
+        ).first()
+        
+        if state:
+            restated_from = state.last_synced_date - timedelta(days=SyncStateService.LOOKBACK_DAYS)
+            start_date = min(max(start_date, restated_from), end_date)
+        
+        return start_date, end_date
+    
+    @staticmethod
+    def mark_synced(
+        db: Session,
+        customer_id: str,
+        report_type: str,
+        synced_through: date,
+        rows_ingested: int
+    ) -> SyncState:
+        """Advance the watermark after a report has been fully ingested."""
+        state = db.query(SyncState).filter(
+            SyncState.customer_id == customer_id,
+            SyncState.report_type == report_type
+        ).first()
+        
+        if not state:
+            state = SyncState(customer_id=customer_id, report_type=report_type)
+            db.add(state)
+        
+        if state.last_synced_date is None or synced_through > state.last_synced_date:
+            state.last_synced_date = synced_through
+        state.rows_ingested = rows_ingested
+        state.last_run_at = datetime.utcnow()
+        
+        db.commit()
+        logger.info(f"Sync watermark for {customer_id}/{report_type} now {state.last_synced_date}")
+        return state
+
+
+def gaql_date_range(start_date: date, end_date: date) -> str:
+    """GAQL condition restricting segments.date to an inclusive range."""
+    return f"segments.date BETWEEN '{start_date.isoformat()}' AND '{end_date.isoformat()}'"
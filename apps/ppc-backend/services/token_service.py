@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import select
+import dataclasses
 import uuid
 import logging
 
@@ -27,9 +28,23 @@ class TokenService:
             scopes=app_cred_model.scopes or [],
             developer_token=crypto_service.decrypt(app_cred_model.developer_token_ciphertext) if app_cred_model.developer_token_ciphertext else None,
             login_customer_id=app_cred_model.login_customer_id,
-            metadata=app_cred_model.metadata or {},
+            metadata=app_cred_model.extra_metadata or {},
         )
     
+    @staticmethod
+    def get_connection_credentials(connection: AdAccountConnection) -> OAuthAppCredentials:
+        """
+        Decrypted app credentials for calling the API as a connection.
+        
+        Accounts linked through a manager account log in as that manager.
+        """
+        app_cred = TokenService._decrypt_app_credentials(connection.oauth_app_credential)
+        if connection.manager_customer_id:
+            app_cred = dataclasses.replace(
+                app_cred, login_customer_id=connection.manager_customer_id.replace("-", "")
+            )
+        return app_cred
+    
     @staticmethod
     async def get_valid_access_token(
         db: Session,
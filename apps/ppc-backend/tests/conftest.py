@@ -0,0 +1,117 @@
+"""
+Shared test fixtures.
+
+Tests run against a throwaway SQLite database file (shared by every session,
+so code that opens its own SessionLocal sees the same data). Each test gets
+freshly created tables.
+"""
+
+import os
+import re
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="ppc-backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import SessionLocal, engine  # noqa: E402
+from models import Base  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session on empty tables."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class Enum:
+    """Stand-in for a Google Ads enum value."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+def gaql_metrics(clicks: int = 0, cost_micros: int = 0, conversions: float = 0.0, impressions: int = 100):
+    return SimpleNamespace(
+        impressions=impressions, clicks=clicks, cost_micros=cost_micros,
+        conversions=conversions, conversions_value=conversions * 10,
+    )
+
+
+def keyword_row(keyword_id: int, day: date, ad_group_id: int = 20, campaign_id: int = 10,
+                text: str = "code search", **metrics):
+    """A keyword_view GAQL row."""
+    return SimpleNamespace(
+        customer=SimpleNamespace(id=1),
+        campaign=SimpleNamespace(id=campaign_id, name=f"campaign {campaign_id}", status=Enum("ENABLED")),
+        ad_group=SimpleNamespace(id=ad_group_id, name=f"ad group {ad_group_id}", status=Enum("ENABLED")),
+        ad_group_criterion=SimpleNamespace(
+            criterion_id=keyword_id,
+            keyword=SimpleNamespace(text=text, match_type=Enum("EXACT")),
+            status=Enum("ENABLED"),
+            cpc_bid_micros=1_000_000,
+        ),
+        segments=SimpleNamespace(date=day.isoformat()),
+        metrics=gaql_metrics(**metrics),
+    )
+
+
+def search_term_row(term: str, day: date, ad_group_id: int = 20, keyword_text: str = "code search", **metrics):
+    """A search_term_view GAQL row."""
+    return SimpleNamespace(
+        search_term_view=SimpleNamespace(search_term=term),
+        ad_group=SimpleNamespace(id=ad_group_id, name=f"ad group {ad_group_id}"),
+        ad_group_criterion=SimpleNamespace(keyword=SimpleNamespace(text=keyword_text)),
+        segments=SimpleNamespace(date=day.isoformat()),
+        metrics=gaql_metrics(**metrics),
+    )
+
+
+def campaign_row(campaign_id: int, day: date, budget_micros: int = 50_000_000, **metrics):
+    """A campaign GAQL row."""
+    return SimpleNamespace(
+        campaign=SimpleNamespace(id=campaign_id, name=f"campaign {campaign_id}", status=Enum("ENABLED")),
+        campaign_budget=SimpleNamespace(amount_micros=budget_micros),
+        segments=SimpleNamespace(date=day.isoformat()),
+        metrics=gaql_metrics(**metrics),
+    )
+
+
+class FakeGoogleAds:
+    """
+    query_fn for SyncOrchestrator serving canned GAQL rows per report.
+
+    Rows are filtered to the query's segments.date range, like the API does.
+    """
+
+    def __init__(self, rows_by_resource):
+        self.rows_by_resource = rows_by_resource
+        self.queries = []
+
+    def __call__(self, query: str, customer_id: str):
+        self.queries.append(query)
+        resource = re.search(r"FROM\s+(\w+)", query).group(1)
+        start, end = _date_range(query)
+        for row in self.rows_by_resource.get(resource, []):
+            if start <= row.segments.date <= end:
+                yield row
+
+    def queried_ranges(self):
+        """Distinct (start, end) dates queried; a stage may run several queries per slice."""
+        return {tuple(map(date.fromisoformat, _date_range(query))) for query in self.queries}
+
+
+def _date_range(query: str):
+    return re.search(r"BETWEEN '([\d-]+)' AND '([\d-]+)'", query).groups()
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from models import AdGroup, Campaign, DailyMetric, Keyword
+from services.account_snapshot import build_snapshot, conversion_rate_percentile
+
+TODAY = date.today()
+
+
+def _keyword_metrics(db, keyword_id: str, *days_clicks_conversions):
+    for days_ago, clicks, conversions in days_clicks_conversions:
+        db.add(DailyMetric(
+            level="keyword", ref_id=keyword_id, date=TODAY - timedelta(days=days_ago),
+            impressions=clicks * 10, clicks=clicks, cost_micros=clicks * 1_000_000, conversions=conversions,
+        ))
+
+
+@pytest.mark.parametrize("percentile", [0, 25, 50, 90, 100])
+def test_percentile_matches_numpy_over_per_keyword_totals(db, percentile):
+    rng = np.random.default_rng(3)
+    expected_rates = []
+    for k in range(40):
+        days = [(1, int(rng.integers(1, 80)), float(rng.integers(0, 4))), (12, int(rng.integers(1, 80)), 1.0)]
+        _keyword_metrics(db, f"kw-{k}", *days)
+        clicks, conversions = sum(day[1] for day in days), sum(day[2] for day in days)
+        expected_rates.append(conversions / clicks * 100)
+    db.commit()
+
+    assert conversion_rate_percentile(db, 30, percentile) == pytest.approx(np.percentile(expected_rates, percentile))
+
+
+def test_percentile_skips_keywords_without_conversions_or_in_window_metrics(db):
+    _keyword_metrics(db, "converting", (1, 10, 1.0), (5, 10, 1.0))   # 10%
+    _keyword_metrics(db, "also-converting", (2, 50, 10.0))           # 20%
+    _keyword_metrics(db, "no-conversions", (1, 40, 0.0))
+    _keyword_metrics(db, "stale", (45, 10, 9.0))
+    db.add(DailyMetric(
+        level="campaign", ref_id="converting", date=TODAY, impressions=10, clicks=1, cost_micros=0, conversions=1.0,
+    ))
+    db.commit()
+
+    assert conversion_rate_percentile(db, 30, 50) == pytest.approx(15.0)
+    assert conversion_rate_percentile(db, 7, 0) == pytest.approx(10.0)
+    assert conversion_rate_percentile(db, 30, 100) == pytest.approx(20.0)
+
+
+def test_percentile_is_none_without_conversions(db):
+    assert conversion_rate_percentile(db, 30, 25) is None
+
+    _keyword_metrics(db, "kw", (1, 40, 0.0))
+    db.commit()
+    assert conversion_rate_percentile(db, 30, 25) is None
+
+
+def test_scoped_snapshot_uses_the_same_figure_as_a_full_one(db):
+    rng = np.random.default_rng(11)
+    db.add(Campaign(id="10", name="campaign", status="ENABLED"))
+    db.add(AdGroup(id="20", campaign_id="10", name="ad group", status="ENABLED"))
+    for k in range(25):
+        db.add(Keyword(id=f"kw-{k}", ad_group_id="20", text=f"keyword {k}", match_type="EXACT", status="ENABLED"))
+        _keyword_metrics(db, f"kw-{k}", *[
+            (days_ago, int(rng.integers(1, 60)), float(rng.integers(0, 3))) for days_ago in (1, 10, 20)
+        ])
+    db.commit()
+
+    full = build_snapshot(db)
+    scoped = build_snapshot(db, scope={"campaign": set(), "keyword": {"kw-3"}, "search_term": set()})
+
+    assert scoped.scoped
+    assert len(scoped.keywords) == 1
+    assert full.keyword_p25_conv_rate is not None
+    assert scoped.keyword_p25_conv_rate == pytest.approx(full.keyword_p25_conv_rate)
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from ads.providers import ProviderManager, TokenBundle
+from database import SessionLocal, engine
+from models_vault import (
+    AdAccountConnection, Base as VaultBase, ConnectionStatus, OAuthAppCredential, OAuthTokenVault,
+    Platform, PlatformType,
+)
+from services.account_sync_service import AccountSyncService
+from services.crypto_service import crypto_service
+from services.token_service import TokenService
+
+
+@pytest.fixture
+def vault():
+    """Session on empty credential vault tables."""
+    VaultBase.metadata.drop_all(bind=engine)
+    VaultBase.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _connection(db, platform, app_cred, account_id: str, access_token: str, expires_in: timedelta,
+                manager_id: str = None) -> AdAccountConnection:
+    connection = AdAccountConnection(
+        id=str(uuid.uuid4()), platform_id=platform.id, oauth_app_credentials_id=app_cred.id,
+        external_account_id=account_id, account_name=f"account {account_id}",
+        manager_customer_id=manager_id, status=ConnectionStatus.ACTIVE,
+    )
+    db.add(connection)
+    db.add(OAuthTokenVault(
+        id=str(uuid.uuid4()), ad_account_connection_id=connection.id,
+        access_token_ciphertext=crypto_service.encrypt(access_token),
+        refresh_token_ciphertext=crypto_service.encrypt(f"refresh-{account_id}"),
+        expires_at=datetime.utcnow() + expires_in,
+    ))
+    return connection
+
+
+def test_units_refresh_tokens_in_their_own_sessions(vault, monkeypatch):
+    platform = Platform(id=str(uuid.uuid4()), name=PlatformType.GOOGLE_ADS)
+    app_cred = OAuthAppCredential(
+        id=str(uuid.uuid4()), platform_id=platform.id, label="default", client_id="client",
+        client_secret_ciphertext=crypto_service.encrypt("secret"), redirect_uri="http://localhost",
+    )
+    vault.add_all([platform, app_cred])
+    fresh = _connection(vault, platform, app_cred, "111-111-1111", "fresh-token", timedelta(hours=1), "999-999-9999")
+    expired = _connection(vault, platform, app_cred, "222-222-2222", "old-token", timedelta(minutes=-1))
+    vault.commit()
+
+    async def refresh_tokens(app_cred, refresh_token):
+        # Let the other account's units run while this refresh is in flight
+        await asyncio.sleep(0.05)
+        return TokenBundle(
+            access_token="new-token", refresh_token=refresh_token, token_type="Bearer", expires_in=3600
+        )
+
+    monkeypatch.setattr(ProviderManager.get_provider("google_ads"), "refresh_tokens", refresh_tokens)
+    calls = []
+    monkeypatch.setattr(
+        AccountSyncService, "_run_stage",
+        staticmethod(lambda customer_id, stage, token, cred: calls.append(
+            (customer_id, stage, token, cred.login_customer_id)
+        ) or {"stage": stage}),
+    )
+
+    results = asyncio.run(AccountSyncService.sync_active_connections(vault, max_workers=2))
+
+    assert {result["status"] for result in results.values()} == {"success"}
+    assert {(customer, token, login) for customer, _, token, login in calls} == {
+        ("1111111111", "fresh-token", "9999999999"),
+        ("2222222222", "new-token", None),
+    }
+    assert len(calls) == 6
+
+    check = SessionLocal()
+    try:
+        assert asyncio.run(TokenService.get_valid_access_token(check, expired.id)) == "new-token"
+        assert asyncio.run(TokenService.get_valid_access_token(check, fresh.id)) == "fresh-token"
+    finally:
+        check.close()
@@ -0,0 +1,157 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import FakeGoogleAds, keyword_row
+from models import AdGroup, Campaign, DailyMetric, Keyword, SearchTerm
+from services import bulk_upsert
+from services.bulk_upsert import UpsertBuffer
+from services.sync_service import SyncOrchestrator
+
+TODAY = date.today()
+
+
+def _campaign(campaign_id: str, name: str, budget: int = 100) -> dict:
+    return {"id": campaign_id, "name": name, "status": "ENABLED", "daily_budget_micros": budget}
+
+
+@pytest.fixture(params=[True, False], ids=["on-conflict", "sqlite-pre-3.24"])
+def upsert_dialect(request, monkeypatch):
+    """Run with native SQLite upserts and with the pre-3.24 fallback."""
+    monkeypatch.setattr(bulk_upsert, "SQLITE_SUPPORTS_UPSERT", request.param)
+    return request.param
+
+
+def test_conflicts_update_only_the_registered_columns(db, upsert_dialect):
+    upserts = UpsertBuffer(db).register(Campaign, update_columns=["name", "status", "daily_budget_micros"])
+    upserts.add(Campaign, _campaign("1", "old"))
+    upserts.add(Campaign, _campaign("2", "other"))
+    upserts.flush()
+
+    upserts.add(Campaign, _campaign("1", "new", budget=200))
+    upserts.flush()
+
+    campaigns = {c.id: c for c in db.query(Campaign)}
+    assert (campaigns["1"].name, campaigns["1"].daily_budget_micros) == ("new", 200)
+    assert campaigns["2"].name == "other"
+    assert upserts.written == {"campaigns": 3}
+
+
+def test_rows_sharing_a_key_in_a_chunk_collapse_to_the_last(db):
+    upserts = UpsertBuffer(db).register(Campaign, update_columns=["name"])
+    for name in ("first", "second", "third"):
+        upserts.add(Campaign, _campaign("1", name))
+    upserts.flush()
+
+    assert [c.name for c in db.query(Campaign)] == ["third"]
+    assert upserts.written == {"campaigns": 1}
+
+
+def test_without_update_columns_existing_rows_are_left_alone(db, upsert_dialect):
+    upserts = UpsertBuffer(db).register(Campaign)
+    upserts.add(Campaign, _campaign("1", "kept"))
+    upserts.flush()
+    upserts.add(Campaign, _campaign("1", "ignored"))
+    upserts.flush()
+
+    assert db.query(Campaign).one().name == "kept"
+
+
+def test_keep_max_columns_only_move_forward(db, upsert_dialect):
+    db.add(Campaign(id="1", name="c", status="ENABLED"))
+    db.add(AdGroup(id="2", campaign_id="1", name="g", status="ENABLED"))
+    db.commit()
+    upserts = UpsertBuffer(db).register(SearchTerm, update_columns=["text"], keep_max=["last_seen"])
+
+    def term(last_seen: date) -> dict:
+        return {"id": "t", "ad_group_id": "2", "text": "code search", "last_seen": last_seen}
+
+    upserts.add(SearchTerm, term(TODAY))
+    upserts.add(SearchTerm, term(TODAY - timedelta(days=3)))  # Older row in the same chunk
+    upserts.flush()
+    upserts.add(SearchTerm, term(TODAY - timedelta(days=1)))  # Older row in a later chunk
+    upserts.flush()
+
+    assert db.query(SearchTerm).one().last_seen == TODAY
+
+
+def test_update_where_skips_rows_failing_the_condition(db, upsert_dialect):
+    upserts = UpsertBuffer(db).register(
+        Campaign, update_columns=["name"], update_where=lambda current, incoming: current.status == "ENABLED"
+    )
+    upserts.add(Campaign, _campaign("1", "old"))
+    upserts.add(Campaign, {**_campaign("2", "old"), "status": "REMOVED"})
+    upserts.flush()
+
+    upserts.add(Campaign, _campaign("1", "new"))
+    upserts.add(Campaign, {**_campaign("2", "new"), "status": "REMOVED"})
+    upserts.flush()
+
+    assert {c.id: c.name for c in db.query(Campaign)} == {"1": "new", "2": "old"}
+
+
+def test_columns_missing_from_the_batch_are_kept(db, upsert_dialect):
+    db.add(Campaign(id="1", name="c", status="ENABLED"))
+    db.add(AdGroup(id="2", campaign_id="1", name="g", status="ENABLED"))
+    db.add(Keyword(id="3", ad_group_id="2", text="code search", match_type="EXACT", status="ENABLED", icp_score=80))
+    db.commit()
+    upserts = UpsertBuffer(db).register(Keyword, update_columns=["status"])
+
+    upserts.add(Keyword, {"id": "3", "ad_group_id": "2", "text": "code search", "match_type": "EXACT", "status": "PAUSED"})
+    upserts.flush()
+    db.expire_all()
+
+    keyword = db.query(Keyword).one()
+    assert (keyword.status, keyword.icp_score) == ("PAUSED", 80)
+
+
+def test_after_write_reports_inserted_and_changed_rows(db, upsert_dialect):
+    upserts = UpsertBuffer(db).register(Campaign, update_columns=["name", "status"])
+    reported = []
+    upserts.after_write(Campaign, lambda rows: reported.append(sorted(row["id"] for row in rows)))
+
+    upserts.add(Campaign, _campaign("1", "a"))
+    upserts.add(Campaign, _campaign("2", "b"))
+    upserts.flush()
+    upserts.add(Campaign, _campaign("1", "a"))  # Unchanged
+    upserts.add(Campaign, _campaign("2", "renamed"))
+    upserts.add(Campaign, _campaign("3", "c"))
+    upserts.flush()
+
+    # Without ON CONFLICT there's no RETURNING either, so every written row is reported
+    assert reported == [["1", "2"], ["2", "3"] if upsert_dialect else ["1", "2", "3"]]
+    assert {c.id: c.name for c in db.query(Campaign)} == {"1": "a", "2": "renamed", "3": "c"}
+
+
+def test_parents_are_written_before_children_in_every_chunk(db):
+    upserts = UpsertBuffer(db, chunk_size=2, commit=True).register(Campaign, update_columns=["name"]).register(
+        AdGroup, update_columns=["name"]
+    )
+    written = []
+    upserts.before_write(Campaign, lambda rows: written.append("campaigns"))
+    upserts.before_write(AdGroup, lambda rows: written.append("ad_groups"))
+
+    for i in range(3):
+        upserts.add(AdGroup, {"id": f"g{i}", "campaign_id": f"c{i}", "name": "g", "status": "ENABLED"})
+        upserts.add(Campaign, _campaign(f"c{i}", "c"))
+    upserts.flush()
+
+    assert written == ["campaigns", "ad_groups"] * 2
+    assert db.query(AdGroup).count() == 3
+    assert upserts.chunks_written == 2
+
+
+def test_keyword_sync_writes_each_entity_once_per_chunk(db):
+    days = 10
+    ads = FakeGoogleAds({"keyword_view": [
+        keyword_row(keyword_id, TODAY - timedelta(days=offset), ad_group_id=20 + keyword_id % 2, clicks=keyword_id)
+        for keyword_id in range(1, 6) for offset in range(days)
+    ]})
+
+    result = SyncOrchestrator(db, "123", ads, chunk_size=1000).run(["keywords"], days={"keywords": days})["keywords"]
+
+    assert (db.query(Campaign).count(), db.query(AdGroup).count(), db.query(Keyword).count()) == (1, 2, 5)
+    assert db.query(DailyMetric).count() == 5 * days
+    # Keywords repeat on every date but are written once per chunk
+    assert result["rows_written"]["keywords"] < 5 * days
+    assert db.query(Keyword).filter(Keyword.id == "3").one().ad_group_id == "21"
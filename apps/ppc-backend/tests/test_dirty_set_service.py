@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+
+from conftest import FakeGoogleAds, keyword_row, search_term_row
+from models import DirtyEntity, Keyword
+from services.account_snapshot import dirty_scope
+from services.dirty_set_service import ALL, DirtySetService
+from services.icp_service import clear_icp_scores, score_batch, write_icp_scores
+from services.sync_service import SyncOrchestrator, create_search_term_id
+
+TODAY = date.today()
+
+
+def _sync(db, keyword_2_clicks: int = 0):
+    ads = FakeGoogleAds({
+        "keyword_view": [
+            keyword_row(1, TODAY, campaign_id=10),
+            keyword_row(2, TODAY, ad_group_id=21, campaign_id=11, clicks=keyword_2_clicks),
+        ],
+        "search_term_view": [search_term_row("code search tool", TODAY)],
+    })
+    SyncOrchestrator(db, "123", ads).run(["keywords", "search_terms"], days={"keywords": 1, "search_terms": 1})
+
+
+def test_sync_marks_the_entities_it_writes(db):
+    _sync(db)
+
+    assert DirtySetService.by_level(DirtySetService.pending(db)) == {
+        "campaign": {"10", "11"},
+        "keyword": {"1", "2"},
+        "search_term": {create_search_term_id("code search tool", "20")},
+    }
+
+
+def test_resync_marks_only_entities_whose_rows_or_metrics_changed(db):
+    _sync(db)
+    DirtySetService.clear(db, DirtySetService.pending(db))
+    db.commit()
+
+    _sync(db)
+    assert DirtySetService.pending(db) == []
+
+    _sync(db, keyword_2_clicks=7)
+    assert DirtySetService.by_level(DirtySetService.pending(db)) == {
+        "campaign": set(), "keyword": {"2"}, "search_term": set(),
+    }
+
+
+def test_score_writes_mark_rows_and_clearing_a_level_marks_all_of_it(db):
+    _sync(db)
+    DirtySetService.clear(db, DirtySetService.pending(db))
+
+    write_icp_scores(db, Keyword, ["1"], score_batch(["code search"], [0], [1]))
+    assert DirtySetService.by_level(DirtySetService.pending(db))["keyword"] == {"1"}
+
+    clear_icp_scores(db, Keyword)
+    dirty = DirtySetService.by_level(DirtySetService.pending(db))
+    assert ALL in dirty["keyword"]
+    assert dirty_scope(db, dirty) is None
+
+
+def test_scope_adds_the_campaigns_of_dirty_keywords(db):
+    _sync(db)
+
+    assert dirty_scope(db, {"keyword": {"2"}, "search_term": {"t"}}) == {
+        "campaign": {"11"},
+        "keyword": {"2"},
+        "search_term": {"t"},
+    }
+
+
+def test_clear_keeps_marks_renewed_after_they_were_read(db):
+    DirtySetService.mark(db, "keyword", ["a", "b"])
+    db.commit()
+    marks = DirtySetService.pending(db)
+
+    # Renewed while a regeneration run was in flight
+    db.query(DirtyEntity).filter(DirtyEntity.ref_id == "b").update(
+        {"marked_at": marks[0][2] + timedelta(seconds=1)}
+    )
+    DirtySetService.clear(db, marks)
+    db.commit()
+
+    assert [ref_id for _, ref_id, _ in DirtySetService.pending(db)] == ["b"]
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ads.providers import google
+from ads.providers.base import OAuthAppCredentials
+from ads.providers.google import GoogleAdsClientCache, GoogleAdsProvider
+
+QUERY = "SELECT campaign.id FROM campaign"
+
+
+class FakePager:
+    """Stand-in for the SDK's SearchPager: every page after the first is another RPC."""
+
+    def __init__(self, pages, page_seconds: float):
+        self._pages = pages
+        self.page_seconds = page_seconds
+        self.fetched = 0
+
+    @property
+    def pages(self):
+        for page in self._pages:
+            if self.fetched:
+                time.sleep(self.page_seconds)
+            self.fetched += 1
+            yield SimpleNamespace(results=page)
+
+
+class FakeClient:
+    def __init__(self, pager: FakePager):
+        self.pager = pager
+
+    def get_service(self, name: str):
+        return SimpleNamespace(search=lambda customer_id, query, timeout: self.pager)
+
+
+@pytest.fixture
+def short_timeouts(monkeypatch):
+    monkeypatch.setattr(google, "RPC_TIMEOUT_SLACK_SECONDS", 0)
+
+    def set_timeout(seconds: float):
+        monkeypatch.setattr(google, "RPC_TIMEOUT_SECONDS", seconds)
+    return set_timeout
+
+
+def test_search_times_out_per_page_not_per_search(short_timeouts):
+    short_timeouts(0.3)
+    # ~0.4s in total, past one timeout, but every page is well within it
+    pager = FakePager([[1, 2], [3], [4, 5], [6], [7]], page_seconds=0.1)
+
+    rows = asyncio.run(GoogleAdsProvider()._search(FakeClient(pager), "123", QUERY))
+
+    assert rows == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_stuck_page_times_out_and_stops_paging(short_timeouts):
+    short_timeouts(0.05)
+    pager = FakePager([[1], [2], [3]], page_seconds=0.3)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(GoogleAdsProvider()._search(FakeClient(pager), "123", QUERY))
+
+    # The stuck page finishes on its worker thread; no further page is requested
+    time.sleep(0.5)
+    assert pager.fetched == 2
+
+
+APP = OAuthAppCredentials(
+    client_id="client", client_secret="secret", redirect_uri="https://example.com/callback",
+    scopes=[GoogleAdsProvider.OAUTH_SCOPE], developer_token="dev-token", login_customer_id="123",
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock for the client cache, advanced by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(google, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Provider whose client builds are recorded instead of reaching the SDK."""
+    monkeypatch.setenv("GOOGLE_ADS_CLIENT_CACHE_SIZE", "2")
+    monkeypatch.setenv("GOOGLE_ADS_CLIENT_CACHE_TTL", "60")
+    provider = GoogleAdsProvider()
+    provider.built = []
+
+    def create_client(access_token, app_cred):
+        provider.built.append(access_token)
+        return SimpleNamespace(get_service=lambda name, **kwargs: object())
+
+    monkeypatch.setattr(provider, "_create_client", create_client)
+    return provider
+
+
+def test_client_is_reused_until_its_ttl_expires(provider, clock):
+    client = provider.build_client("token-a", APP)
+    clock[0] += 59
+    assert provider.build_client("token-a", APP) is client
+
+    clock[0] += 1
+    assert provider.build_client("token-a", APP) is not client
+    assert provider.built == ["token-a", "token-a"]
+
+
+def test_least_recently_used_client_is_evicted(provider, clock):
+    a = provider.build_client("token-a", APP)
+    b = provider.build_client("token-b", APP)
+    # Touching a leaves b as the oldest entry
+    assert provider.build_client("token-a", APP) is a
+    provider.build_client("token-c", APP)
+
+    assert provider.build_client("token-a", APP) is a
+    assert provider.build_client("token-b", APP) is not b
+    assert provider.built == ["token-a", "token-b", "token-c", "token-b"]
+
+
+def test_refreshed_token_misses_the_cache(provider, clock):
+    stale = provider.build_client("token-a", APP)
+
+    assert provider.build_client("token-a-refreshed", APP) is not stale
+    assert GoogleAdsClientCache.make_key("token-a", APP) != GoogleAdsClientCache.make_key("token-a-refreshed", APP)
+    # The key holds a fingerprint, never the token itself
+    assert "token-a" not in GoogleAdsClientCache.make_key("token-a", APP)
+    assert provider.built == ["token-a", "token-a-refreshed"]
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+import pytest
+
+from models import IcpScoreCache
+from services import icp_cache_service
+from services.icp_cache_service import IcpCacheService
+from services.icp_service import IcpLexicon, score_batch
+
+TEXTS = ["sourcegraph pricing", "Code Search tool ", "free python course", "code search tool"]
+CLICKS = [3, 40, 0, 12]
+
+
+@pytest.fixture(autouse=True)
+def empty_lru(monkeypatch):
+    monkeypatch.setattr(icp_cache_service, "_lru", OrderedDict())
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    """Texts passed to the scorer, per call."""
+    calls = []
+
+    def counting_score_batch(texts, *args):
+        calls.append(list(texts))
+        return score_batch(texts, *args)
+
+    monkeypatch.setattr(icp_cache_service, "score_batch", counting_score_batch)
+    return calls
+
+
+def _lexicon(include=("code search",)) -> IcpLexicon:
+    return IcpLexicon(["sourcegraph"], list(include), ["free"])
+
+
+def test_cached_scores_match_direct_scoring_and_skip_the_scorer(db, scored):
+    lexicon = _lexicon()
+    expected = score_batch(TEXTS, [0] * len(TEXTS), CLICKS, lexicon)
+
+    first = IcpCacheService.score_texts(db, TEXTS, CLICKS, lexicon)
+    db.commit()
+    # Texts differing only in case and whitespace share one entry
+    assert [len(texts) for texts in scored] == [3]
+    assert db.query(IcpScoreCache).count() == 3
+
+    # From the in-process LRU, then from the table alone
+    second = IcpCacheService.score_texts(db, TEXTS, CLICKS, lexicon)
+    icp_cache_service._lru.clear()
+    third = IcpCacheService.score_texts(db, TEXTS, CLICKS, lexicon)
+
+    assert len(scored) == 1
+    for result in (first, second, third):
+        assert result.scores.tolist() == expected.scores.tolist()
+        assert result.rationales == expected.rationales
+        assert result.confidences.tolist() == expected.confidences.tolist()
+
+
+def test_a_new_lexicon_version_misses_the_cache(db, scored):
+    old, new = _lexicon(), _lexicon(include=("python",))
+    assert old.version != new.version
+
+    IcpCacheService.score_texts(db, TEXTS, CLICKS, old)
+    db.commit()
+    result = IcpCacheService.score_texts(db, TEXTS, CLICKS, new)
+    db.commit()
+
+    assert [len(texts) for texts in scored] == [3, 3]
+    assert result.scores.tolist() == score_batch(TEXTS, [0] * len(TEXTS), CLICKS, new).scores.tolist()
+    versions = {version for (version,) in db.query(IcpScoreCache.lexicon_version)}
+    assert versions == {old.version, new.version}
+
+    # The old version's entries are still served without rescoring
+    IcpCacheService.score_texts(db, TEXTS, CLICKS, old)
+    assert len(scored) == 2
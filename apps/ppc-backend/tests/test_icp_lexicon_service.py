@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from models import AdGroup, Campaign, IcpLexiconVersion, Keyword, ScoreJob
+from services import icp_lexicon_service
+from services.icp_lexicon_service import IcpLexiconService, candidate_filter, changed_terms, impacted_texts
+from services.icp_service import DEFAULT_LEXICON, IcpLexicon, score_batch, write_icp_scores
+from services.score_job_service import ScoreJobService
+
+TEXTS = ["sourcegraph pricing", "code search tool", "free python course", "enterprise code intelligence", "jobs"]
+
+
+def _lexicon(brand=("sourcegraph",), include=("code search", "enterprise"), exclude=("free", "jobs")) -> IcpLexicon:
+    return IcpLexicon(list(brand), list(include), list(exclude))
+
+
+def test_changed_terms_are_added_removed_and_reordered_terms():
+    old = _lexicon()
+
+    assert changed_terms(old, _lexicon()) == {"brand": [], "include": [], "exclude": []}
+    assert changed_terms(old, _lexicon(include=("code search", "enterprise", "devtools"), exclude=("free",))) == {
+        "brand": [], "include": ["devtools"], "exclude": ["jobs"],
+    }
+    # Swapping two kept terms can change which one matches first
+    assert changed_terms(old, _lexicon(include=("enterprise", "code search")))["include"] == ["code search", "enterprise"]
+
+
+def test_impacted_texts_are_those_matching_a_changed_term():
+    changed = {"brand": [], "include": ["intelligence"], "exclude": ["course"]}
+
+    assert impacted_texts(TEXTS, changed).tolist() == [False, False, True, True, False]
+    assert not impacted_texts(TEXTS, {"brand": [], "include": [], "exclude": []}).any()
+    # Typos and inflections of a changed term count, as they do when scoring
+    assert impacted_texts(["free python courses", "entreprise code inteligence"], changed).tolist() == [True, True]
+
+
+def test_rows_from_an_older_matcher_compile_once(db, monkeypatch):
+    monkeypatch.setattr(icp_lexicon_service, "_compiled", {DEFAULT_LEXICON.version: DEFAULT_LEXICON})
+    built = []
+
+    def counting_lexicon(*terms):
+        built.append(terms)
+        return IcpLexicon(*terms)
+
+    monkeypatch.setattr(icp_lexicon_service, "IcpLexicon", counting_lexicon)
+    lexicon = _lexicon()
+    db.add(IcpLexiconVersion(
+        tenant="acme", version="published-by-matcher-2", is_active=True,
+        brand_terms_json=json.dumps(lexicon.brand),
+        include_terms_json=json.dumps(lexicon.include),
+        exclude_terms_json=json.dumps(lexicon.exclude),
+    ))
+    db.commit()
+
+    for _ in range(3):
+        assert IcpLexiconService.get_active(db, "acme").version == lexicon.version
+    assert len(built) == 1
+    # Scores labeled with the old version can't be reproduced and diffed
+    assert IcpLexiconService.get_version(db, "published-by-matcher-2", "acme") is None
+    assert IcpLexiconService.get_version(db, lexicon.version, "acme").version == lexicon.version
+    assert len(built) == 1
+
+
+@pytest.fixture
+def scored(db):
+    """Keywords scored with the built-in lexicon."""
+    db.add(Campaign(id="10", name="campaign", status="ENABLED"))
+    db.add(AdGroup(id="20", campaign_id="10", name="ad group", status="ENABLED"))
+    texts = TEXTS + [f"filler keyword {i}" for i in range(20)]
+    ids = [f"k{i:02d}" for i in range(len(texts))]
+    for item_id, text in zip(ids, texts):
+        db.add(Keyword(id=item_id, ad_group_id="20", text=text, match_type="EXACT", status="ENABLED"))
+    db.flush()
+    write_icp_scores(db, Keyword, ids, score_batch(texts, [0] * len(texts), [0] * len(texts), DEFAULT_LEXICON))
+    db.commit()
+    return db
+
+
+def _publish_with(db, *include) -> IcpLexicon:
+    return IcpLexiconService.publish(
+        db, DEFAULT_LEXICON.brand, DEFAULT_LEXICON.include + list(include), DEFAULT_LEXICON.exclude
+    )
+
+
+def _assert_scored_with(db, lexicon: IcpLexicon):
+    rows = db.query(Keyword).order_by(Keyword.id).all()
+    expected = score_batch([row.text for row in rows], [0] * len(rows), [0] * len(rows), lexicon)
+    assert [row.icp_lexicon_version for row in rows] == [lexicon.version] * len(rows)
+    assert [row.icp_score for row in rows] == expected.scores.tolist()
+    assert [row.icp_rationale for row in rows] == expected.rationales
+
+
+def test_rescore_reads_only_rows_that_can_match_a_changed_term(scored):
+    lexicon = _publish_with(scored, "python course")
+
+    summary = IcpLexiconService.rescore(scored)
+
+    _assert_scored_with(scored, lexicon)
+    # Only "free python course" contains a fragment of the new term
+    assert summary["keywords"] == {"scanned": 1, "rescored": 1, "relabeled": len(TEXTS) + 19}
+
+
+def test_candidate_filter_falls_back_to_a_full_scan(scored):
+    assert candidate_filter(Keyword, {"brand": [], "include": [], "exclude": []}) is not None
+    assert candidate_filter(Keyword, {"brand": [], "include": [""], "exclude": []}) is None
+    assert candidate_filter(Keyword, {"brand": [], "include": ["código"], "exclude": []}) is None
+
+
+def test_rescore_job_moves_every_row_to_the_published_version(scored):
+    lexicon = _publish_with(scored, "intelligence")
+    job_id = ScoreJobService.create_rescore_job(scored).id
+    assert scored.get(ScoreJob, job_id).rows_expected == len(TEXTS) + 20
+
+    ScoreJobService.run_job(job_id)
+    scored.expire_all()
+
+    job = scored.get(ScoreJob, job_id)
+    assert (job.status, job.rows_processed, job.lease_owner) == ("succeeded", len(TEXTS) + 20, None)
+    _assert_scored_with(scored, lexicon)
+
+    # A job queued for a lexicon that has since been replaced leaves scores alone
+    stale = ScoreJobService.create_rescore_job(scored).id
+    newer = _publish_with(scored, "devtools")
+    ScoreJobService.run_job(stale)
+    scored.expire_all()
+    assert scored.get(ScoreJob, stale).rows_processed == 0
+    assert IcpLexiconService.count_outdated(scored, newer.version) == len(TEXTS) + 20
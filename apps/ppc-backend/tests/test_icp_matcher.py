@@ -0,0 +1,140 @@
+import random
+
+import numpy as np
+import pytest
+
+from services.icp_matcher import LexiconMatcher, edit_distance, required_fragments
+from services.icp_service import (
+    BRAND_TERMS, INCLUDE_TERMS, EXCLUDE_TERMS, DEFAULT_LEXICON, calculate_icp_score, fuzzy_match, score_batch,
+)
+
+LEXICONS = {"brand": BRAND_TERMS, "include": INCLUDE_TERMS, "exclude": EXCLUDE_TERMS}
+FILLER = ["for", "best", "the", "tool", "python", "github", "enterprise", "free", "open", "source", "2024"]
+
+
+def _mutate(word: str, rng: random.Random) -> str:
+    if len(word) < 2:
+        return word
+    position = rng.randrange(len(word))
+    operation = rng.choice(["delete", "insert", "substitute", "transpose", "suffix"])
+    if operation == "delete":
+        return word[:position] + word[position + 1:]
+    if operation == "insert":
+        return word[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[position:]
+    if operation == "substitute":
+        return word[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[position + 1:]
+    if operation == "transpose" and position < len(word) - 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word + rng.choice(["s", "es", "ing", "ed"])
+
+
+def fuzzed_texts(count: int, seed: int = 7):
+    """Texts built from lexicon words (some mistyped) and filler words."""
+    rng = random.Random(seed)
+    vocabulary = sorted({word for terms in LEXICONS.values() for term in terms for word in term.split()})
+    texts = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(0, 5)):
+            word = rng.choice(vocabulary) if rng.random() < 0.7 else rng.choice(FILLER)
+            words.append(_mutate(word, rng) if rng.random() < 0.4 else word)
+        texts.append(" ".join(words))
+    return texts
+
+
+def reference_match(text: str):
+    """First term per category that fuzzy_match accepts, term by term."""
+    return {
+        name: next((term for term in terms if fuzzy_match(text, term)), None)
+        for name, terms in LEXICONS.items()
+    }
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("sourcegraph", "sourcegraph", 0),
+    ("sourcegrpah", "sourcegraph", 1),  # transposition
+    ("sourcegraf", "sourcegraph", 2),
+    ("course", "source", 2),
+    ("abc", "abcdef", 3),  # over the limit
+])
+def test_edit_distance(a, b, expected):
+    assert edit_distance(a, b, 2) == min(expected, 3)
+
+
+def test_match_agrees_with_fuzzy_match_term_by_term():
+    matcher = LexiconMatcher(LEXICONS)
+    for text in fuzzed_texts(3000):
+        assert matcher.match(text) == reference_match(text), text
+
+
+def test_match_batch_agrees_with_match():
+    matcher = LexiconMatcher(LEXICONS)
+    texts = fuzzed_texts(3000, seed=11)
+    positions = matcher.match_batch(texts)
+    for row, text in enumerate(texts):
+        expected = matcher.match(text)
+        for name, terms in LEXICONS.items():
+            position = positions[name][row]
+            assert (terms[position] if position >= 0 else None) == expected[name], text
+
+
+def test_empty_terms_match_everything():
+    matcher = LexiconMatcher({"include": ["", "code search"], "exclude": []})
+    assert matcher.match("anything") == {"include": "", "exclude": None}
+    assert matcher.match_batch(["anything"])["exclude"].tolist() == [-1]
+
+
+def test_score_batch_matches_calculate_icp_score():
+    texts = fuzzed_texts(2000, seed=3) + ["", "  Sourcegraph Enterprise  ", "free open source code search"]
+    rng = np.random.default_rng(5)
+    clicks = rng.integers(0, 500, len(texts)).tolist()
+
+    batch = score_batch(texts, [0] * len(texts), clicks, DEFAULT_LEXICON)
+
+    for row, text in enumerate(texts):
+        score, rationale, confidence = calculate_icp_score(text, 0, clicks[row])
+        assert batch.scores[row] == score, text
+        assert batch.rationales[row] == rationale, text
+        assert batch.confidences[row] == pytest.approx(confidence)
+
+
+@pytest.mark.parametrize("text, brand, exclude", [
+    # Brand typos within the long-word edit budget
+    ("sourcegrpah", "sourcegraph", None),
+    ("sourcegraf code search", "sourcegraph", None),
+    # Plurals and inflections of short exclude words
+    ("sourcegraph jobs", "sourcegraph", "job"),
+    ("python courses", None, "course"),
+    ("code search for students", None, "student"),
+    ("learning python", None, "learn"),
+    ("student's code search", None, "student"),
+    ("free downloads", None, "free download"),
+    # Short words get no edits, so neither of these is an exclude hit
+    ("elearning platform", None, None),
+    ("source code search", None, None),
+])
+def test_typos_and_inflections(text, brand, exclude):
+    matches = DEFAULT_LEXICON.matcher.match(text)
+    assert matches["brand"] == brand
+    assert matches["exclude"] == exclude
+    assert reference_match(text) == matches
+
+
+def test_inflected_exclude_words_lower_the_score():
+    assert calculate_icp_score("sourcegraph jobs")[0] == 60
+    assert calculate_icp_score("python courses")[0] == 20
+    assert calculate_icp_score("elearning platform")[0] == 50
+
+
+def test_every_hitting_text_word_contains_a_required_fragment():
+    matcher = LexiconMatcher(LEXICONS)
+    rng = random.Random(11)
+    tokens = {token for text in fuzzed_texts(3000) for token in text.split()}
+    tokens |= {_mutate(_mutate(token, rng), rng) for token in list(tokens)}  # Two edits for long words
+
+    hits = 0
+    for token in tokens:
+        for word_id in matcher.token_hits(token):
+            hits += 1
+            assert any(piece in token for piece in required_fragments(matcher.words[word_id])), token
+    assert hits > 500
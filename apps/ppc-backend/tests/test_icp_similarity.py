@@ -0,0 +1,120 @@
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from services import icp_similarity
+from services.icp_service import IcpLexicon, similarity_adjustments
+from services.icp_similarity import BATCH_BLOCK_SIZE, MAX_TEXT_LENGTH, NGRAM_SIZES, NgramSimilarity
+
+INCLUDE = ["code search", "code intelligence"]
+EXCLUDE = ["free course", "jobs"]
+THRESHOLD = 0.2
+
+
+def _ngrams(text: str) -> Counter:
+    padded = f" {text[:MAX_TEXT_LENGTH - 2]} "
+    return Counter(padded[i:i + size] for size in NGRAM_SIZES for i in range(len(padded) - size + 1))
+
+
+def reference_similarities(exemplars, texts):
+    """Best cosine per category, computed one text and exemplar at a time."""
+    documents = [_ngrams(text) for terms in exemplars.values() for text in terms]
+    frequency = Counter(gram for document in documents for gram in document)
+    idf = {gram: math.log((1 + len(documents)) / (1 + count)) + 1 for gram, count in frequency.items()}
+    unseen = math.log(1 + len(documents)) + 1
+
+    vectors = []
+    for document in documents:
+        vector = {gram: count * idf[gram] for gram, count in document.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        vectors.append({gram: value / norm for gram, value in vector.items()})
+
+    best = {}
+    start = 0
+    for name, terms in exemplars.items():
+        columns = vectors[start:start + len(terms)]
+        start += len(terms)
+        scores = []
+        for text in texts:
+            vector = {gram: count * idf.get(gram, unseen) for gram, count in _ngrams(text).items()}
+            norm = math.sqrt(sum(value * value for value in vector.values())) or 1
+            scores.append(max(
+                (sum(value * column.get(gram, 0) for gram, value in vector.items()) / norm for column in columns),
+                default=0.0,
+            ))
+        best[name] = scores
+    return best
+
+
+def _random_texts(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    words = ["code", "search", "searching", "intelligence", "free", "course", "jobs", "python", "paris", "tool", "x"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(0, 4))) for _ in range(count)]
+
+
+def test_similarities_match_a_reference_tf_idf_cosine():
+    exemplars = {"include": INCLUDE, "exclude": EXCLUDE}
+    texts = _random_texts(300) + ["", "a" * 200]
+
+    best = NgramSimilarity(exemplars).similarities(texts)
+    reference = reference_similarities(exemplars, texts)
+
+    for name in exemplars:
+        np.testing.assert_allclose(best[name][0], reference[name], atol=1e-9)
+
+
+def test_near_synonyms_clear_the_threshold_and_unrelated_texts_do_not():
+    best = NgramSimilarity({"include": INCLUDE, "exclude": EXCLUDE}).similarities(
+        ["source code searcher", "coding jobs", "cheap flights to paris"]
+    )
+
+    similarity, positions = best["include"]
+    assert similarity[0] >= THRESHOLD and INCLUDE[positions[0]] == "code search"
+    assert best["exclude"][0][1] >= THRESHOLD and EXCLUDE[best["exclude"][1][1]] == "jobs"
+    assert all(best[name][0][2] < THRESHOLD for name in best)
+
+
+def test_empty_categories_never_match():
+    best = NgramSimilarity({"include": INCLUDE, "exclude": []}).similarities(["free course", "code search"])
+
+    assert best["exclude"][0].tolist() == [0.0, 0.0]
+    assert best["exclude"][1].tolist() == [-1, -1]
+
+    lexicon = IcpLexicon(["sourcegraph"], INCLUDE, [], similarity_weight=20, similarity_threshold=THRESHOLD)
+    adjustments, notes = similarity_adjustments(lexicon, ["free courses", "code searching"])
+    assert adjustments[0] == 0 and notes[0] == ""
+    assert adjustments[1] > 0 and notes[1].startswith("Similar to include term 'code search'")
+
+
+def test_adjustments_move_scores_by_similarity_times_weight():
+    lexicon = IcpLexicon(["sourcegraph"], INCLUDE, EXCLUDE, similarity_weight=20, similarity_threshold=THRESHOLD)
+    texts = ["code searching", "course free", "cheap flights to paris"]
+    best = lexicon.similarity.similarities(texts)
+
+    adjustments, notes = similarity_adjustments(lexicon, texts)
+
+    assert adjustments.tolist() == [
+        round(best["include"][0][0] * 20), -round(best["exclude"][0][1] * 20), 0,
+    ]
+    assert notes[1] == f"Similar to exclude term 'free course' ({adjustments[1]:+d})"
+    assert notes[2] == ""
+
+
+@pytest.mark.parametrize("block_size", [BATCH_BLOCK_SIZE, 7])
+def test_inputs_spanning_several_blocks_score_like_one(monkeypatch, block_size):
+    similarity = NgramSimilarity({"include": INCLUDE, "exclude": EXCLUDE})
+    texts = _random_texts(50)
+    expected = similarity.similarities(texts)
+    if block_size == BATCH_BLOCK_SIZE:
+        # Pad past a real block boundary and check the texts on both sides of it
+        texts = ["jobs"] * (BATCH_BLOCK_SIZE - 25) + texts
+    monkeypatch.setattr(icp_similarity, "BATCH_BLOCK_SIZE", block_size)
+
+    best = similarity.similarities(texts)
+
+    for name, (scores, positions) in expected.items():
+        assert np.array_equal(best[name][0][-50:], scores)
+        assert np.array_equal(best[name][1][-50:], positions)
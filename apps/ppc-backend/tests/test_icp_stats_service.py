@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from conftest import FakeGoogleAds, keyword_row, search_term_row
+from models import Keyword, SearchTerm
+from routers.score import get_icp_stats
+from services import bulk_upsert
+from services.icp_service import clear_icp_scores, score_batch, write_icp_scores
+from services.icp_stats_service import IcpStatsService, LEVEL_MODELS, MAX_SCORE
+from services.sync_service import SyncOrchestrator
+
+TODAY = date.today()
+TEXTS = ["sourcegraph", "code search tool", "free python course", "enterprise code intelligence", "jobs"]
+
+
+def _ads(days: int = 3) -> FakeGoogleAds:
+    keywords, terms = [], []
+    for offset in range(days):
+        day = TODAY - timedelta(days=offset)
+        keywords += [keyword_row(i, day, text=text, clicks=1) for i, text in enumerate(TEXTS)]
+        terms += [search_term_row(f"{text} {offset}", day, clicks=1) for text in TEXTS]
+    return FakeGoogleAds({"keyword_view": keywords, "search_term_view": terms})
+
+
+def _sync(db, ads: FakeGoogleAds, score_on_ingest: bool = False):
+    SyncOrchestrator(db, "123", ads, chunk_size=4, score_on_ingest=score_on_ingest).run(
+        ["keywords", "search_terms"], days={"keywords": 3, "search_terms": 3}
+    )
+
+
+def assert_histograms_match_tables(db):
+    for level in LEVEL_MODELS:
+        maintained = IcpStatsService.get_histogram(db, level)
+        IcpStatsService.rebuild(db, level)
+        assert maintained.tolist() == IcpStatsService.get_histogram(db, level).tolist(), level
+
+
+def _score(db, model, ids):
+    texts = [text for (text,) in db.query(model.text).filter(model.id.in_(ids)).order_by(model.id)]
+    ids = sorted(ids)
+    write_icp_scores(db, model, ids, score_batch(texts, [0] * len(ids), [1] * len(ids)))
+    db.commit()
+
+
+@pytest.fixture(params=[True, False], ids=["on-conflict", "sqlite-pre-3.24"])
+def upsert_dialect(request, monkeypatch):
+    """Run with native SQLite upserts and with the pre-3.24 fallback."""
+    monkeypatch.setattr(bulk_upsert, "SQLITE_SUPPORTS_UPSERT", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("score_on_ingest", [False, True])
+def test_sync_inserts_keep_histogram_consistent(db, upsert_dialect, score_on_ingest):
+    ads = _ads()
+    # Built before anything exists, so every count comes from maintained deltas
+    IcpStatsService.get_histogram(db, "keyword")
+    IcpStatsService.get_histogram(db, "term")
+    db.commit()
+
+    _sync(db, ads, score_on_ingest)
+    assert_histograms_match_tables(db)
+    unscored = IcpStatsService.get_histogram(db, "term")[MAX_SCORE + 1]
+    assert unscored == (0 if score_on_ingest else db.query(SearchTerm).count())
+
+    # Rows seen again are updates, not inserts
+    _sync(db, ads, score_on_ingest)
+    assert_histograms_match_tables(db)
+
+
+def test_score_writes_and_clears_keep_histogram_consistent(db, upsert_dialect):
+    _sync(db, _ads())
+    keyword_ids = sorted(item_id for (item_id,) in db.query(Keyword.id))
+    term_ids = sorted(item_id for (item_id,) in db.query(SearchTerm.id))
+
+    _score(db, Keyword, keyword_ids[:3])
+    _score(db, SearchTerm, term_ids)
+    assert_histograms_match_tables(db)
+
+    _score(db, Keyword, keyword_ids)  # Rescoring moves rows between scores
+    clear_icp_scores(db, SearchTerm, term_ids[:4])
+    db.commit()
+    assert_histograms_match_tables(db)
+
+    clear_icp_scores(db, Keyword)
+    db.commit()
+    assert_histograms_match_tables(db)
+    assert IcpStatsService.get_histogram(db, "keyword")[MAX_SCORE + 1] == len(keyword_ids)
+
+
+def test_bucket_counts_sum_scored_rows():
+    histogram = np.zeros(MAX_SCORE + 2, dtype=np.int64)
+    histogram[[10, 39, 40, 69, 70, 100]] = [1, 2, 3, 4, 5, 6]
+    histogram[MAX_SCORE + 1] = 99  # Unscored rows aren't in any bucket
+
+    assert IcpStatsService.bucket_counts(histogram, [40, 70]) == [3, 7, 11]
+
+
+def test_stats_describe_the_buckets_they_count(db):
+    _sync(db, _ads())
+    _score(db, Keyword, sorted(item_id for (item_id,) in db.query(Keyword.id)))
+
+    default = get_icp_stats(boundaries=None, db=db)
+    assert default["scoring_criteria"] == {
+        "high_fit": "70-100 (strong ICP match)",
+        "medium_fit": "40-69 (moderate ICP match)",
+        "low_fit": "0-39 (poor ICP match)",
+    }
+
+    custom = get_icp_stats(boundaries="30,60,90", db=db)
+    assert custom["scoring_criteria"] == {
+        "bucket_1": "0-29", "bucket_2": "30-59", "bucket_3": "60-89", "bucket_4": "90-100",
+    }
+    assert list(custom["keywords"]) == ["0-29", "30-59", "60-89", "90-100", "unscored"]
+    assert sum(custom["keywords"].values()) == db.query(Keyword).count()
@@ -0,0 +1,324 @@
+import json
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from models import AdGroup, Campaign, DailyMetric, Keyword, Recommendation, SearchTerm
+from routers.recommend import generate_recommendations
+from services.dirty_set_service import DirtySetService
+
+TODAY = date.today()
+
+
+def _generate(db, types: str = "neg", incremental: bool = False, force_refresh: bool = False) -> dict:
+    return generate_recommendations(types=types, force_refresh=force_refresh, incremental=incremental, db=db)
+
+
+def _campaign(db, campaign_id: str, *ad_group_ids: str):
+    db.add(Campaign(id=campaign_id, name=f"campaign {campaign_id}", status="ENABLED"))
+    for ad_group_id in ad_group_ids:
+        db.add(AdGroup(id=ad_group_id, campaign_id=campaign_id, name=f"ad group {ad_group_id}", status="ENABLED"))
+
+
+def _search_term(db, term_id: str, ad_group_id: str, text: str, spend: float, icp_score: int = 10) -> str:
+    db.add(SearchTerm(
+        id=term_id, ad_group_id=ad_group_id, text=text, last_seen=TODAY,
+        icp_score=icp_score, icp_confidence=0.9, icp_rationale="Low fit",
+    ))
+    db.add(DailyMetric(
+        level="search_term", ref_id=term_id, date=TODAY,
+        impressions=100, clicks=10, cost_micros=int(spend * 1_000_000), conversions=0.0,
+    ))
+    return term_id
+
+
+@pytest.fixture
+def account(db):
+    _campaign(db, "10", "20", "21")
+    _campaign(db, "11", "30")
+    _search_term(db, "st-a", "20", "free code search", spend=400)
+    _search_term(db, "st-b", "21", "free code search", spend=900)
+    _search_term(db, "st-c", "30", "free code search", spend=350)
+    db.commit()
+    return db
+
+
+def _negatives(db):
+    return {rec.target_id: rec for rec in db.query(Recommendation).filter(Recommendation.type == "negative_keyword")}
+
+
+def test_negative_keywords_target_the_search_terms_campaign(account):
+    result = _generate(account)
+
+    negatives = _negatives(account)
+    assert set(negatives) == {"10", "11"}
+    assert result["recommendations_created"] == 2
+    assert {rec.target_level for rec in negatives.values()} == {"campaign"}
+
+    # One proposal per campaign, from the ad group spending the most
+    details = json.loads(negatives["10"].details_json)
+    assert details["campaign_id"] == "10"
+    assert details["ad_group_id"] == "21"
+    assert details["estimated_spend_7d"] == 900
+
+
+def test_incremental_run_weighs_every_ad_group_of_a_dirty_term(account):
+    _generate(account)
+    full = json.loads(_negatives(account)["10"].details_json)
+
+    # Only the cheaper copy changed; the proposal still comes from the $900 ad group
+    DirtySetService.mark(account, "search_term", ["st-a"])
+    account.commit()
+    _generate(account, incremental=True)
+    account.expire_all()
+
+    details = json.loads(_negatives(account)["10"].details_json)
+    assert (details["ad_group_id"], details["estimated_spend_7d"]) == ("21", 900)
+    assert details == full
+
+
+def test_scoped_snapshot_maps_dirty_search_terms_to_their_campaign(account):
+    DirtySetService.mark(account, "search_term", ["st-c"])
+    account.commit()
+
+    result = _generate(account, incremental=True)
+
+    assert result["incremental"] is True
+    assert set(_negatives(account)) == {"11"}
+
+
+def _random_account(db, seed: int = 7, campaigns: int = 4, ad_groups: int = 3, entities: int = 6):
+    """
+    An account on which every rule fires for some entities.
+
+    Campaign 0's keywords score high and campaign 1's low, so both budget
+    directions come up; metrics land 1, 10 and 20 days back to hit every window.
+    Search term texts repeat across the ad groups of a campaign.
+    """
+    rng = np.random.default_rng(seed)
+    days = [TODAY - timedelta(days=offset) for offset in (1, 10, 20)]
+    rows = []
+
+    def metrics(level: str, ref_id: str, max_cost: int, conversion_odds: float):
+        for day in days:
+            clicks = int(rng.integers(1, 50))
+            rows.append(DailyMetric(
+                level=level, ref_id=ref_id, date=day, impressions=clicks * 10, clicks=clicks,
+                cost_micros=int(rng.integers(0, max_cost)) * 1_000_000,
+                conversions=float(rng.integers(1, 6)) if rng.random() < conversion_odds else 0.0,
+            ))
+
+    for c in range(campaigns):
+        campaign_id = str(c + 1)
+        db.add(Campaign(
+            id=campaign_id, name=f"campaign {c}", status="ENABLED",
+            daily_budget_micros=int(rng.integers(5, 50)) * 1_000_000,
+        ))
+        metrics("campaign", campaign_id, 2000, 1.0)
+        low, high = {0: (80, 101), 1: (0, 40)}.get(c, (0, 101))
+        for g in range(ad_groups):
+            ad_group_id = f"{campaign_id}{g}"
+            db.add(AdGroup(id=ad_group_id, campaign_id=campaign_id, name=f"ad group {g}", status="ENABLED"))
+            for e in range(entities):
+                keyword_id = f"{ad_group_id}{e}"
+                db.add(Keyword(
+                    id=keyword_id, ad_group_id=ad_group_id, text=f"keyword {keyword_id}", match_type="EXACT",
+                    status="ENABLED", icp_score=int(rng.integers(low, high)), icp_confidence=0.8,
+                ))
+                metrics("keyword", keyword_id, 600, 0.5)
+                term_id = f"st-{keyword_id}"
+                db.add(SearchTerm(
+                    id=term_id, ad_group_id=ad_group_id, text=f"term {campaign_id}-{e}", last_seen=TODAY,
+                    icp_score=int(rng.integers(0, 101)), icp_confidence=0.7, icp_rationale="",
+                ))
+                metrics("search_term", term_id, 700, 0.3)
+    db.flush()
+    db.add_all(rows)
+    db.commit()
+
+
+def _stored(db):
+    """Stored recommendations by fingerprint."""
+    return {rec.fingerprint: rec for rec in db.query(Recommendation)}
+
+
+def _comparable(rec: Recommendation):
+    details = {
+        key: round(value, 6) if isinstance(value, float) else value
+        for key, value in json.loads(rec.details_json).items()
+    }
+    return rec.type, rec.target_level, rec.target_id, details, round(rec.projected_impact, 6), rec.risk, rec.priority
+
+
+def test_regenerating_updates_proposals_in_place(db):
+    _random_account(db)
+    first = _generate(db, types="neg,pause,budget")
+    stored = _stored(db)
+    assert first["recommendations_created"] == len(stored) > 0
+    assert {rec.type for rec in stored.values()} == {"negative_keyword", "pause_keyword", "budget_shift"}
+
+    second = _generate(db, types="neg,pause,budget")
+
+    assert second["recommendations_created"] == 0
+    assert second["recommendations_generated"] == first["recommendations_generated"]
+    again = _stored(db)
+    assert {fp: rec.id for fp, rec in again.items()} == {fp: rec.id for fp, rec in stored.items()}
+
+
+def test_regenerating_refreshes_details_and_leaves_decided_rows_alone(db):
+    _random_account(db)
+    _generate(db, types="pause")
+    proposals = sorted(_stored(db).values(), key=lambda rec: rec.target_id)
+    dismissed, refreshed = proposals[0], proposals[1]
+    dismissed.status = "dismissed"
+    db.commit()
+    dismissed_details = dismissed.details_json
+    refreshed_spend = json.loads(refreshed.details_json)["estimated_spend_14d"]
+
+    # More spend yesterday on both keywords changes what a regenerated proposal says
+    db.query(DailyMetric).filter(
+        DailyMetric.level == "keyword",
+        DailyMetric.ref_id.in_([dismissed.target_id, refreshed.target_id]),
+        DailyMetric.date == TODAY - timedelta(days=1),
+    ).update({"cost_micros": DailyMetric.cost_micros + 100_000_000}, synchronize_session=False)
+    db.commit()
+    result = _generate(db, types="pause")
+    db.expire_all()
+
+    assert result["recommendations_created"] == 0
+    stored = _stored(db)
+    assert len(stored) == len(proposals)
+    assert stored[dismissed.fingerprint].status == "dismissed"
+    assert stored[dismissed.fingerprint].details_json == dismissed_details
+    assert stored[refreshed.fingerprint].status == "proposed"
+    assert json.loads(stored[refreshed.fingerprint].details_json)["estimated_spend_14d"] == refreshed_spend + 100
+
+    # force_refresh only replaces open proposals
+    _generate(db, types="pause", force_refresh=True)
+    assert _stored(db)[dismissed.fingerprint].status == "dismissed"
+    assert len(_stored(db)) == len(proposals)
+
+
+def test_incremental_run_matches_a_full_run_on_its_scope(db):
+    _random_account(db)
+    campaigns = {"2"}
+    keywords = {item_id for (item_id,) in db.query(Keyword.id).order_by(Keyword.id)[::5]}
+    terms = {item_id for (item_id,) in db.query(SearchTerm.id).order_by(SearchTerm.id)[::3]}
+    DirtySetService.mark(db, "campaign", campaigns)
+    DirtySetService.mark(db, "keyword", keywords)
+    DirtySetService.mark(db, "search_term", terms)
+    db.commit()
+
+    result = _generate(db, types="neg,pause,budget", incremental=True)
+    assert result["incremental"] is True
+    incremental = {fp: _comparable(rec) for fp, rec in _stored(db).items()}
+    assert DirtySetService.pending(db) == []
+
+    db.query(Recommendation).delete()
+    db.commit()
+    _generate(db, types="neg,pause,budget")
+    keyword_campaigns = {c for (c,) in db.query(AdGroup.campaign_id).join(Keyword).filter(Keyword.id.in_(keywords))}
+    term_campaigns = set(
+        db.query(AdGroup.campaign_id, SearchTerm.text).join(SearchTerm).filter(SearchTerm.id.in_(terms))
+    )
+    in_scope = {
+        "pause_keyword": lambda rec: rec.target_id in keywords,
+        "budget_shift": lambda rec: rec.target_id in campaigns | keyword_campaigns,
+        "negative_keyword": lambda rec: (rec.target_id, json.loads(rec.details_json)["search_term"]) in term_campaigns,
+    }
+    full = {fp: _comparable(rec) for fp, rec in _stored(db).items() if in_scope[rec.type](rec)}
+
+    assert incremental == full
+    assert {rec[0] for rec in incremental.values()} == {"negative_keyword", "pause_keyword", "budget_shift"}
+
+
+
+def _budget_campaign(db, campaign_id: str, icp_scores, budget: int, spend_7d: int = 0, keywords: int = 0):
+    """A campaign with one ad group of keywords (one per score by default) scored in turn from icp_scores."""
+    db.add(Campaign(id=campaign_id, name=f"campaign {campaign_id}", status="ENABLED",
+                    daily_budget_micros=budget * 1_000_000))
+    db.add(AdGroup(id=f"{campaign_id}-ag", campaign_id=campaign_id, name="ad group", status="ENABLED"))
+    for k in range(keywords or len(icp_scores)):
+        db.add(Keyword(
+            id=f"{campaign_id}-kw{k}", ad_group_id=f"{campaign_id}-ag", text=f"keyword {campaign_id} {k}",
+            match_type="EXACT", status="ENABLED", icp_score=icp_scores[k % len(icp_scores)], icp_confidence=0.8,
+        ))
+    if spend_7d:
+        db.add(DailyMetric(
+            level="campaign", ref_id=campaign_id, date=TODAY - timedelta(days=1),
+            impressions=1000, clicks=100, cost_micros=spend_7d * 1_000_000, conversions=0.0,
+        ))
+
+
+def _budget_shifts(db) -> dict:
+    _generate(db, types="budget")
+    return {
+        rec.target_id: json.loads(rec.details_json)
+        for rec in db.query(Recommendation).filter(Recommendation.type == "budget_shift")
+    }
+
+
+@pytest.fixture
+def converting_account(db):
+    """Enough account conversions to pass the budget policy gate, from a campaign with no keywords."""
+    db.add(Campaign(id="gate", name="campaign gate", status="ENABLED"))
+    db.add(DailyMetric(
+        level="campaign", ref_id="gate", date=TODAY, impressions=0, clicks=0, cost_micros=0, conversions=25.0,
+    ))
+    return db
+
+
+def test_budget_shifts_cover_every_campaign(converting_account):
+    db = converting_account
+    # More campaigns than the old first-ten limit, each high-fit and spending past 6 days of budget
+    for c in range(15):
+        _budget_campaign(db, f"hi-{c:02d}", [90], budget=50, spend_7d=320)
+    db.commit()
+
+    shifts = _budget_shifts(db)
+
+    assert set(shifts) == {f"hi-{c:02d}" for c in range(15)}
+    assert {details["recommendation"] for details in shifts.values()} == {"increase"}
+
+
+def test_budget_shift_spend_is_counted_once_per_campaign(converting_account):
+    db = converting_account
+    # $290 against a $50/day budget is under the $300 threshold, however many keywords
+    _budget_campaign(db, "many", [85, 95], budget=50, spend_7d=290, keywords=12)
+    _budget_campaign(db, "constrained", [85, 95], budget=50, spend_7d=310, keywords=12)
+    db.commit()
+
+    shifts = _budget_shifts(db)
+
+    assert set(shifts) == {"constrained"}
+    assert shifts["constrained"]["weekly_spend_micros"] == 310 * 1_000_000
+    assert shifts["constrained"]["avg_icp_score"] == 90
+
+
+def test_budget_shift_decreases_and_skips(converting_account):
+    db = converting_account
+    _budget_campaign(db, "low-fit", [10, 30], budget=150)                   # no spend recorded at all
+    _budget_campaign(db, "low-fit-small", [10, 30], budget=5)               # under the $10/day floor
+    _budget_campaign(db, "zero-icp", [0], budget=150)                       # no fit signal
+    _budget_campaign(db, "unscored", [None], budget=150, spend_7d=5000)     # no scored keywords
+    _budget_campaign(db, "hi-unconstrained", [90], budget=50, spend_7d=100)
+    db.commit()
+
+    shifts = _budget_shifts(db)
+
+    assert set(shifts) == {"low-fit"}
+    assert shifts["low-fit"]["recommendation"] == "decrease"
+    assert shifts["low-fit"]["avg_icp_score"] == 20
+
+
+def test_budget_shifts_need_enough_account_conversions(db):
+    _budget_campaign(db, "hi", [90], budget=50, spend_7d=320)
+    _budget_campaign(db, "low-fit", [10], budget=150)
+    db.add(DailyMetric(
+        level="campaign", ref_id="hi", date=TODAY - timedelta(days=2),
+        impressions=0, clicks=0, cost_micros=0, conversions=19.0,
+    ))
+    db.commit()
+
+    assert _budget_shifts(db) == {}
@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from models import AdGroup, Campaign, DailyMetric, Keyword, ScoreJob, SearchTerm
+from services import score_job_service
+from services.icp_service import DEFAULT_LEXICON, IcpLexicon, fetch_unscored
+from services.job_lease import LEASE_SECONDS
+from services.score_job_service import ScoreJobService, _score_in_worker
+
+TEXTS = ["sourcegraph", "code search tool", "free python course", "enterprise code intelligence", "jobs"]
+
+
+@pytest.fixture
+def keywords(db):
+    db.add(Campaign(id="10", name="campaign", status="ENABLED"))
+    db.add(AdGroup(id="20", campaign_id="10", name="ad group", status="ENABLED"))
+    for i, text in enumerate(TEXTS):
+        db.add(Keyword(id=str(i), ad_group_id="20", text=text, match_type="EXACT", status="ENABLED"))
+    db.commit()
+    return db
+
+
+def _settings(lexicon: IcpLexicon) -> tuple:
+    return lexicon.brand, lexicon.include, lexicon.exclude, lexicon.similarity_weight, lexicon.similarity_threshold
+
+
+def test_workers_compile_each_lexicon_version_once(monkeypatch):
+    built = []
+
+    def counting_lexicon(*settings):
+        built.append(settings)
+        return IcpLexicon(*settings)
+
+    monkeypatch.setattr(score_job_service, "IcpLexicon", counting_lexicon)
+    monkeypatch.setattr(score_job_service, "_worker_lexicons", {})
+    settings = _settings(DEFAULT_LEXICON)
+
+    first = _score_in_worker(TEXTS, [1] * len(TEXTS), settings)
+    again = _score_in_worker(TEXTS, [1] * len(TEXTS), settings)
+    assert len(built) == 1
+    assert list(first.scores) == list(again.scores)
+
+    _score_in_worker(TEXTS, [1] * len(TEXTS), (["acme"], *settings[1:]))
+    assert len(built) == 2
+
+
+def test_job_scores_every_unscored_row_and_releases_its_lease(keywords):
+    job_id = ScoreJobService.create_job(keywords, "keyword").id
+
+    ScoreJobService.run_job(job_id, processes=0)
+    keywords.expire_all()
+
+    job = keywords.get(ScoreJob, job_id)
+    assert (job.status, job.rows_processed, job.lease_owner) == ("succeeded", len(TEXTS), None)
+    assert keywords.query(Keyword).filter(Keyword.icp_score.is_(None)).count() == 0
+
+
+@pytest.mark.parametrize("age_seconds, claimed", [(LEASE_SECONDS + 1, True), (LEASE_SECONDS - 60, False)])
+def test_only_jobs_with_expired_leases_are_claimed(keywords, age_seconds, claimed):
+    job = ScoreJobService.create_job(keywords, "keyword")
+    job.status = "running"
+    job.lease_owner = "other-host:1:abc"
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    keywords.commit()
+
+    assert ScoreJobService.claim_interrupted(keywords) == ([job.id] if claimed else [])
+    assert ScoreJobService.claim_interrupted(keywords) == []
+
+    # Running it is a no-op unless this process holds the claim
+    ScoreJobService.run_job(job.id, processes=0)
+    keywords.expire_all()
+    assert job.status == ("succeeded" if claimed else "running")
+
+
+@pytest.mark.parametrize("model, level", [(Keyword, "keyword"), (SearchTerm, "search_term")])
+def test_unscored_rows_carry_their_own_windowed_metrics(keywords, model, level):
+    if model is SearchTerm:
+        for i, text in enumerate(TEXTS):
+            keywords.add(SearchTerm(id=str(i), ad_group_id="20", text=text, last_seen=date.today()))
+    for i in range(len(TEXTS)):
+        for offset, clicks in ((1, i), (45, 100)):  # The second day is outside a 30-day window
+            keywords.add(DailyMetric(
+                level=level, ref_id=str(i), date=date.today() - timedelta(days=offset),
+                impressions=clicks * 10, clicks=clicks, cost_micros=0, conversions=0.0,
+            ))
+    keywords.commit()
+
+    items, clicks, impressions = fetch_unscored(keywords, model, limit=3, after_id="0", metrics_days=30)
+
+    assert [item.id for item in items] == ["1", "2", "3"]
+    assert (clicks, impressions) == ([1, 2, 3], [10, 20, 30])
+    assert fetch_unscored(keywords, model, limit=1, metrics_days=0)[1] == [100]
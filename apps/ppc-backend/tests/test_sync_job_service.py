@@ -0,0 +1,122 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from ads.client import ads_client
+from conftest import FakeGoogleAds, keyword_row
+from models import DailyMetric, SyncJob, SyncState
+from services import job_lease, sync_job_service
+from services.job_lease import LEASE_SECONDS
+from services.sync_job_service import SyncJobService
+from services.sync_service import SLICE_DAYS
+
+TODAY = date.today()
+
+
+def _keyword_history(days: int) -> FakeGoogleAds:
+    return FakeGoogleAds({
+        "keyword_view": [keyword_row(1, TODAY - timedelta(days=offset), clicks=1) for offset in range(days)]
+    })
+
+
+class FailingOnce:
+    """query_fn failing once on the slice starting at a given date."""
+
+    def __init__(self, ads: FakeGoogleAds, fail_from: date):
+        self.ads = ads
+        self.fail_from = fail_from
+
+    def __call__(self, query: str, customer_id: str):
+        if self.fail_from and f"BETWEEN '{self.fail_from.isoformat()}'" in query:
+            self.fail_from = None
+            raise RuntimeError("connection reset")
+        return self.ads(query, customer_id)
+
+
+def test_failed_job_resumes_after_its_last_committed_slice(db, monkeypatch):
+    days = 2 * SLICE_DAYS
+    ads = _keyword_history(days)
+    second_slice = TODAY - timedelta(days=SLICE_DAYS - 1)
+    monkeypatch.setattr(ads_client, "iter_query", FailingOnce(ads, second_slice))
+    job_id = SyncJobService.create_job(db, "123", {"keywords": days}).id
+
+    SyncJobService.run_job(job_id)
+    db.expire_all()
+    job = db.get(SyncJob, job_id)
+    assert job.status == "failed"
+    checkpoint = json.loads(job.checkpoint_json)
+    assert checkpoint["keywords"] == {"through": (second_slice - timedelta(days=1)).isoformat(), "rows": SLICE_DAYS}
+
+    ads.queries.clear()
+    SyncJobService.run_job(job_id)
+    db.expire_all()
+    job = db.get(SyncJob, job_id)
+
+    assert job.status == "succeeded"
+    assert ads.queried_ranges() == {(second_slice, TODAY)}
+    assert job.rows_processed == days
+    assert db.query(DailyMetric).filter(DailyMetric.level == "keyword").count() == days
+    assert db.query(SyncState).filter(SyncState.report_type == "keywords").one().last_synced_date == TODAY
+
+
+def _lease(db, job: SyncJob, status: str, owner: str = "other-host:1:abc", age_seconds: int = 0):
+    job.status = status
+    job.lease_owner = owner
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    db.commit()
+
+
+@pytest.mark.parametrize("status, claimed", [("queued", True), ("running", True), ("failed", False)])
+def test_jobs_with_expired_leases_are_claimed_once(db, status, claimed):
+    job = SyncJobService.create_job(db, "123", {"keywords": 7})
+    _lease(db, job, status, age_seconds=LEASE_SECONDS + 1)
+
+    assert SyncJobService.claim_interrupted(db) == ([job.id] if claimed else [])
+    assert SyncJobService.claim_interrupted(db) == []
+
+
+@pytest.mark.parametrize("status", ["queued", "running"])
+def test_jobs_under_a_live_lease_are_not_claimed(db, status):
+    job = SyncJobService.create_job(db, "123", {"keywords": 7})
+    assert SyncJobService.claim_interrupted(db) == []  # Queued by this process
+
+    _lease(db, job, status, age_seconds=LEASE_SECONDS - 60)
+    assert SyncJobService.claim_interrupted(db) == []
+
+
+def test_run_skips_a_job_another_process_is_running(db, monkeypatch):
+    ads = _keyword_history(3)
+    monkeypatch.setattr(ads_client, "iter_query", ads)
+    job = SyncJobService.create_job(db, "123", {"keywords": 3})
+    _lease(db, job, "running")
+
+    SyncJobService.run_job(job.id)
+    assert ads.queries == []
+
+    # Taken over once the other process stops heartbeating
+    _lease(db, job, "running", age_seconds=LEASE_SECONDS + 1)
+    SyncJobService.run_job(job.id)
+    db.expire_all()
+    assert (job.status, job.lease_owner, job.rows_processed) == ("succeeded", None, 3)
+
+
+def test_run_stops_without_failing_a_job_taken_over_mid_run(db, monkeypatch):
+    ads = _keyword_history(2 * SLICE_DAYS)
+    monkeypatch.setattr(ads_client, "iter_query", ads)
+    job = SyncJobService.create_job(db, "123", {"keywords": 2 * SLICE_DAYS})
+    real_heartbeat = job_lease.heartbeat
+
+    def stolen(session, model, job_id):
+        # Another process claimed the job after this one's lease lapsed
+        session.query(model).filter(model.id == job_id).update(
+            {"status": "resuming", "lease_owner": "other-host:1:abc"}, synchronize_session=False
+        )
+        session.commit()
+        real_heartbeat(session, model, job_id)
+
+    monkeypatch.setattr(sync_job_service, "heartbeat", stolen)
+    SyncJobService.run_job(job.id)
+    db.expire_all()
+
+    assert (job.status, job.lease_owner, job.error_message) == ("resuming", "other-host:1:abc", None)
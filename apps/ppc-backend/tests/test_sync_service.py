@@ -0,0 +1,122 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import FakeGoogleAds, keyword_row, search_term_row
+from models import DailyMetric, SearchTerm
+from services.bulk_upsert import UpsertBuffer
+from services.sync_service import SyncOrchestrator, create_search_term_id, sum_metric_rows
+from services.sync_state_service import SyncStateService
+
+TODAY = date.today()
+
+
+def _metric(db, level: str, ref_id: str, day: date) -> DailyMetric:
+    return db.query(DailyMetric).filter(
+        DailyMetric.level == level, DailyMetric.ref_id == ref_id, DailyMetric.date == day
+    ).one()
+
+
+def _search_terms_with_split_duplicates():
+    """One term matched by two keywords, with 20 other terms between its rows."""
+    rows = [search_term_row("code search tool", TODAY, keyword_text="code search", clicks=3, impressions=30)]
+    rows += [search_term_row(f"filler {i}", TODAY, clicks=1) for i in range(20)]
+    rows.append(search_term_row("code search tool", TODAY, keyword_text="search tool", clicks=4, impressions=10))
+    return rows
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+def test_duplicate_metric_rows_are_summed_across_chunks(db, chunk_size):
+    ads = FakeGoogleAds({"search_term_view": _search_terms_with_split_duplicates()})
+
+    SyncOrchestrator(db, "123", ads, chunk_size=chunk_size).run(["search_terms"], days={"search_terms": 1})
+
+    metric = _metric(db, "search_term", create_search_term_id("code search tool", "20"), TODAY)
+    assert metric.clicks == 7
+    assert metric.impressions == 40
+    assert metric.ctr == pytest.approx(7 / 40 * 100)
+    assert db.query(SearchTerm).count() == 21
+
+
+def test_resync_replaces_metrics_instead_of_adding(db):
+    ads = FakeGoogleAds({"search_term_view": _search_terms_with_split_duplicates()})
+
+    for _ in range(2):
+        SyncOrchestrator(db, "123", ads, chunk_size=5).run(["search_terms"], days={"search_terms": 1})
+
+    assert _metric(db, "search_term", create_search_term_id("code search tool", "20"), TODAY).clicks == 7
+
+
+def test_forget_written_stops_merging_into_stored_rows(db):
+    row = {
+        "level": "keyword", "ref_id": "k1", "date": TODAY - timedelta(days=1),
+        "impressions": 10, "clicks": 2, "cost_micros": 100, "conversions": 0.0, "conversions_value": 0.0,
+        "ctr": 20.0, "cpc_micros": 50, "conversion_rate": 0.0,
+    }
+    upserts = UpsertBuffer(db).register(DailyMetric, update_columns=["clicks"], merge=sum_metric_rows)
+
+    upserts.add(DailyMetric, dict(row))
+    upserts.flush()
+    upserts.add(DailyMetric, dict(row))
+    upserts.flush()
+    assert _metric(db, "keyword", "k1", row["date"]).clicks == 4
+
+    upserts.forget_written()
+    upserts.add(DailyMetric, dict(row))
+    upserts.flush()
+    db.expire_all()
+    assert _metric(db, "keyword", "k1", row["date"]).clicks == 2
+
+
+def test_later_stages_keep_fetching_while_an_earlier_stage_is_written(db):
+    search_terms_fetched = threading.Event()
+    search_terms = [search_term_row(f"term {i}", TODAY, clicks=1) for i in range(60)]
+
+    def query_fn(query: str, customer_id: str):
+        if "FROM keyword_view" in query:
+            # Keyword rows only arrive once the search term fetch has finished,
+            # which needs far more than PREFETCH_CHUNKS chunks of room
+            assert search_terms_fetched.wait(10), "search term fetch was blocked by the keyword write"
+            yield keyword_row(1, TODAY, clicks=2)
+        elif "FROM search_term_view" in query:
+            yield from search_terms
+            search_terms_fetched.set()
+
+    results = SyncOrchestrator(db, "123", query_fn, chunk_size=2).run(
+        ["keywords", "search_terms"], days={"keywords": 1, "search_terms": 1}
+    )
+
+    assert results["search_terms"]["chunks_spilled"] > 0
+    assert results["search_terms"]["total_rows_processed"] == 60
+    assert db.query(SearchTerm).count() == 60
+    assert _metric(db, "keyword", "1", TODAY).clicks == 2
+
+
+def test_fetch_stops_when_the_writer_fails(db, monkeypatch):
+    stream = {"rows": 0, "closed": False}
+
+    def query_fn(query: str, customer_id: str):
+        if "FROM keyword_view" in query:
+            yield keyword_row(1, TODAY, clicks=2)
+        if "FROM search_term_view" not in query:
+            return
+        try:
+            for i in range(200_000):
+                stream["rows"] += 1
+                yield search_term_row(f"term {i}", TODAY, clicks=1)
+        finally:
+            stream["closed"] = True
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(SyncStateService, "mark_synced", fail)
+
+    with pytest.raises(RuntimeError, match="database went away"):
+        SyncOrchestrator(db, "123", query_fn, chunk_size=50).run(
+            ["keywords", "search_terms"], days={"keywords": 1, "search_terms": 1}
+        )
+
+    assert stream["closed"]
+    assert stream["rows"] < 200_000
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from conftest import FakeGoogleAds, keyword_row
+from models import DailyMetric
+from services.sync_service import SyncOrchestrator
+from services.sync_state_service import SyncStateService
+
+TODAY = date.today()
+LOOKBACK = SyncStateService.LOOKBACK_DAYS
+
+
+def _keyword_history(days: int) -> FakeGoogleAds:
+    return FakeGoogleAds({
+        "keyword_view": [keyword_row(1, TODAY - timedelta(days=offset), clicks=1) for offset in range(days)]
+    })
+
+
+def test_window_backfills_without_a_watermark(db):
+    assert SyncStateService.get_window(db, "123", "keywords", 30) == (TODAY - timedelta(days=29), TODAY)
+
+
+def test_window_restarts_a_lookback_behind_the_watermark(db):
+    SyncStateService.mark_synced(db, "123", "keywords", TODAY - timedelta(days=1), rows_ingested=10)
+
+    start, end = SyncStateService.get_window(db, "123", "keywords", 30)
+    assert (start, end) == (TODAY - timedelta(days=1 + LOOKBACK), TODAY)
+    assert SyncStateService.get_window(db, "123", "keywords", 30, full_refresh=True)[0] == TODAY - timedelta(days=29)
+    # Other accounts and reports keep their own watermarks
+    assert SyncStateService.get_window(db, "456", "keywords", 30)[0] == TODAY - timedelta(days=29)
+
+
+def test_watermark_never_moves_back(db):
+    SyncStateService.mark_synced(db, "123", "keywords", TODAY, rows_ingested=10)
+    state = SyncStateService.mark_synced(db, "123", "keywords", TODAY - timedelta(days=5), rows_ingested=3)
+
+    assert state.last_synced_date == TODAY
+    assert state.rows_ingested == 3
+
+
+def test_second_sync_only_pulls_the_lookback_window(db):
+    ads = _keyword_history(20)
+    SyncOrchestrator(db, "123", ads).run(["keywords"], days={"keywords": 20})
+    ads.queries.clear()
+
+    SyncOrchestrator(db, "123", ads).run(["keywords"], days={"keywords": 20})
+
+    assert ads.queried_ranges() == {(TODAY - timedelta(days=LOOKBACK), TODAY)}
+    assert db.query(DailyMetric).filter(DailyMetric.level == "keyword").count() == 20